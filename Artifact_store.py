@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+from Step_cache import SHAPEFILE_SIDECARS
+
+
+@contextmanager
+def file_lock(lock_path):
+    """
+    Holds an exclusive lock on a file, across the threads and processes of the pipeline.
+
+    Args:
+        lock_path (str): Lock file, created when missing.
+    """
+    with open(lock_path, 'a+b') as lock_file:
+        if os.name == 'nt':
+            import msvcrt
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK gives up after 10 seconds, keep waiting
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class ArtifactStore:
+    """
+    Province-scoped registry of named intermediate layers shared by the pipeline steps.
+
+    Every artifact (e.g. 'land_cover', 'medium_power_line', 'mask_buffer') is a layer of '<province>.gpkg'
+    in the store folder. It is produced once, by the first step that needs it, and every later step looks it
+    up by name. An artifact is produced again when its input files (size or modification time) or its
+    parameters change. Lookups of a province are serialized by a lock file ('<province>.lock'), so steps
+    running at the same time never write its GeoPackage or index together.
+    """
+
+    def __init__(self, store_folder):
+        """
+        Args:
+            store_folder (str): Folder holding one GeoPackage and one index file per province.
+        """
+        self.store_folder = store_folder
+        os.makedirs(store_folder, exist_ok=True)
+
+    def geopackage(self, province):
+        """Returns the GeoPackage holding the artifacts of a province."""
+        return os.path.join(self.store_folder, f"{province}.gpkg")
+
+    def get(self, province, name, inputs, producer, parameters=None):
+        """
+        Returns a named artifact of a province, producing it first when it is missing or out of date.
+
+        Args:
+            province (str): Name of the province.
+            name (str): Artifact name, used as the GeoPackage layer name.
+            inputs (list): Input files of the artifact (paths or '<path>|layername=<name>' layers).
+            producer (callable): Called as producer(output) to write the artifact to the given GeoPackage layer.
+            parameters (dict, optional): Parameters of the producer that change the artifact (e.g. buffer distance).
+
+        Returns:
+            str: The artifact layer ('<province>.gpkg|layername=<name>').
+        """
+        output = f"{self.geopackage(province)}|layername={name}"
+        key = self.key(name, inputs, parameters)
+
+        index_path = os.path.join(self.store_folder, f"{province}_artifacts.json")
+        with file_lock(self._lock_path(province)):
+            index = self._read_json(index_path, {})
+            if index.get(name) == key and os.path.isfile(self.geopackage(province)):
+                print(f"Artifact {name} of {province}: up to date, reused.")
+                return output
+
+            producer(output)
+
+            index[name] = key
+            self._write_json(index_path, index)
+        print(f"Artifact {name} of {province}: produced.")
+        return output
+
+    def key(self, name, inputs, parameters=None):
+        """
+        Computes the key of an artifact from its name, parameters and the signatures (size, modification time)
+        of its input files, including shapefile sidecars.
+
+        Returns:
+            str: Hex digest of the artifact description.
+        """
+        signatures = []
+        for layer in inputs:
+            path = layer.split('|')[0]
+            stem, extension = os.path.splitext(path)
+            files = [path] + ([stem + sidecar for sidecar in SHAPEFILE_SIDECARS] if extension.lower() == '.shp' else [])
+            for file_path in files:
+                if os.path.isfile(file_path):
+                    stat = os.stat(file_path)
+                    signatures.append([os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns])
+                else:
+                    signatures.append([os.path.abspath(file_path), None, None])
+
+        description = {'name': name, 'files': signatures, 'parameters': parameters or {}}
+        return hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def invalidate(self, province, name=None):
+        """
+        Forgets one artifact (or all artifacts) of a province, so it is produced again on the next lookup.
+
+        Returns:
+            None
+        """
+        index_path = os.path.join(self.store_folder, f"{province}_artifacts.json")
+        with file_lock(self._lock_path(province)):
+            index = self._read_json(index_path, {})
+            if name is None:
+                index = {}
+            else:
+                index.pop(name, None)
+            self._write_json(index_path, index)
+
+    def _lock_path(self, province):
+        return os.path.join(self.store_folder, f"{province}.lock")
+
+    @staticmethod
+    def _read_json(path, default):
+        try:
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return default
+
+    @staticmethod
+    def _write_json(path, content):
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            json.dump(content, file)
+        os.replace(temporary_path, path)
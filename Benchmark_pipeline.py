@@ -0,0 +1,356 @@
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+from Parallel_province_runner import init_qgis_worker, MODULE_PATH, QGIS_PREFIX_PATH, QGIS_PLUGINS_PATH
+
+
+MONTHS = [
+    "january", "february", "march", "april",
+    "may", "june", "july", "august",
+    "september", "october", "november", "december"
+]
+
+# Values of the RODZAJ attribute of the synthetic power lines (BDOT10k OT_SULN_L)
+POWER_LINE_TYPES = [
+    'linia elektroenergetyczna średniego napięcia',
+    'linia elektroenergetyczna niskiego napięcia',
+    'linia elektroenergetyczna wysokiego napięcia',
+]
+
+# Lower left corner of the synthetic data (EPSG:2180)
+ORIGIN_X, ORIGIN_Y = 500000.0, 400000.0
+
+# Province name used in the synthetic file names
+PROVINCE = "benchmark"
+
+
+# 1. Sizes
+def scale_parameters(scale):
+    """
+    Returns the sizes of the synthetic data for a scale factor (1 = about one county).
+
+    Feature counts grow linearly with the scale, the extent (and the DEM side in pixels) with its square root,
+    so the feature density stays the same.
+
+    Args:
+        scale (float): Scale factor.
+
+    Returns:
+        dict: Extent in meters, feature counts per layer and raster sizes.
+    """
+    side = math.sqrt(scale)
+    return {
+        'extent_m': 10000.0 * side,
+        'land_cover_polygons': int(2000 * scale),   # per PTGN/PTRK/PTTR layer
+        'buildings': int(5000 * scale),
+        'power_lines': int(100 * scale),
+        'roads': int(200 * scale),
+        'dem_pixels': int(1000 * side),             # 10 m DEM
+        'climate_pixels': max(int(10 * side), 2),   # 1 km climate grid
+    }
+
+
+# 2. Synthetic data
+def _polygon(rng, center_x, center_y, radius, vertices):
+    from qgis.core import QgsGeometry, QgsPointXY
+
+    points = []
+    for index in range(vertices):
+        angle = 2 * math.pi * index / vertices
+        distance = radius * rng.uniform(0.6, 1.0)
+        points.append(QgsPointXY(center_x + distance * math.cos(angle), center_y + distance * math.sin(angle)))
+    return QgsGeometry.fromPolygonXY([points + [points[0]]])
+
+
+def _line(rng, extent, step, vertices):
+    from qgis.core import QgsGeometry, QgsPointXY
+
+    x, y = ORIGIN_X + rng.uniform(0, extent), ORIGIN_Y + rng.uniform(0, extent)
+    direction = rng.uniform(0, 2 * math.pi)
+    points = [QgsPointXY(x, y)]
+    for _ in range(vertices - 1):
+        direction += rng.uniform(-0.5, 0.5)
+        x = min(max(x + step * math.cos(direction), ORIGIN_X), ORIGIN_X + extent)
+        y = min(max(y + step * math.sin(direction), ORIGIN_Y), ORIGIN_Y + extent)
+        points.append(QgsPointXY(x, y))
+    return QgsGeometry.fromPolylineXY(points)
+
+
+def _write_layer(folder, file_name, geometries, wkb_type, attributes):
+    from qgis.core import QgsCoordinateReferenceSystem, QgsFeature, QgsField, QgsFields
+    from qgis.PyQt.QtCore import QVariant
+    from Renewable_energy_optimum_location_function import write_vector_layer
+
+    fields = QgsFields()
+    for name in attributes:
+        fields.append(QgsField(name, QVariant.String, len=80))
+
+    features = []
+    for index, geometry in enumerate(geometries):
+        feature = QgsFeature(fields)
+        feature.setGeometry(geometry)
+        feature.setAttributes([values[index] for values in attributes.values()])
+        features.append(feature)
+
+    return write_vector_layer(folder, file_name, fields, wkb_type, QgsCoordinateReferenceSystem('EPSG:2180'), features)
+
+
+def _write_raster(path, values, pixel_size, nodata=None):
+    from osgeo import gdal, osr
+
+    rows, columns = values.shape
+    dataset = gdal.GetDriverByName('GTiff').Create(path, columns, rows, 1, gdal.GDT_Float32,
+                                                   options=['TILED=YES', 'COMPRESS=DEFLATE'])
+    dataset.SetGeoTransform((ORIGIN_X, pixel_size, 0, ORIGIN_Y + rows * pixel_size, 0, -pixel_size))
+    reference = osr.SpatialReference()
+    reference.ImportFromEPSG(2180)
+    dataset.SetProjection(reference.ExportToWkt())
+    band = dataset.GetRasterBand(1)
+    if nodata is not None:
+        band.SetNoDataValue(nodata)
+    band.WriteArray(values)
+    dataset = None
+    return path
+
+
+def generate_synthetic_data(folder, scale, seed=0):
+    """
+    Generates synthetic BDOT10k-like inputs: PTGN/PTRK/PTTR land cover polygons, SULN power lines with
+    RODZAJ values, SKJZ roads, BUBD buildings, a province mask, a DEM GeoTIFF and monthly map_<month>.tif
+    climate rasters. The same scale and seed always give the same data.
+
+    Args:
+        folder (str): Output folder.
+        scale (float): Scale factor (see scale_parameters).
+        seed (int): Random seed.
+
+    Returns:
+        dict: Paths of the generated layers.
+    """
+    import numpy as np
+    from qgis.core import QgsGeometry, QgsRectangle, QgsWkbTypes
+    from Renewable_energy_optimum_location_function import create_directory_if_not_exists
+
+    create_directory_if_not_exists(folder)
+    sizes = scale_parameters(scale)
+    extent = sizes['extent_m']
+    rng = random.Random(seed)
+
+    def random_point():
+        return ORIGIN_X + rng.uniform(0, extent), ORIGIN_Y + rng.uniform(0, extent)
+
+    paths = {'land_cover': []}
+    for layer_type in ('PTGN', 'PTRK', 'PTTR'):
+        geometries = [_polygon(rng, *random_point(), rng.uniform(50, 400), rng.randint(6, 12))
+                      for _ in range(sizes['land_cover_polygons'])]
+        file_name = f"PL.PZGiK.000.BDOT10k.00__OT_{layer_type}_A.shp"
+        paths['land_cover'].append(_write_layer(folder, file_name, geometries, QgsWkbTypes.Polygon,
+                                                {'X_KOD': [f"{layer_type}01"] * len(geometries)}))
+
+    geometries = [_line(rng, extent, 200, rng.randint(5, 20)) for _ in range(sizes['power_lines'])]
+    paths['power_lines'] = _write_layer(folder, "PL.PZGiK.000.BDOT10k.00__OT_SULN_L.shp", geometries, QgsWkbTypes.LineString,
+                                        {'RODZAJ': [rng.choice(POWER_LINE_TYPES) for _ in geometries]})
+
+    geometries = [_line(rng, extent, 150, rng.randint(5, 30)) for _ in range(sizes['roads'])]
+    paths['roads'] = _write_layer(folder, "PL.PZGiK.000.BDOT10k.00__OT_SKJZ_L.shp", geometries, QgsWkbTypes.LineString,
+                                  {'X_KOD': ['SKJZ01'] * len(geometries)})
+
+    geometries = []
+    for _ in range(sizes['buildings']):
+        x, y = random_point()
+        half = rng.uniform(5, 15)
+        geometries.append(QgsGeometry.fromRect(QgsRectangle(x - half, y - half, x + half, y + half)))
+    paths['buildings'] = _write_layer(folder, "PL.PZGiK.000.BDOT10k.00__OT_BUBD_A.shp", geometries, QgsWkbTypes.Polygon,
+                                      {'X_KOD': ['BUBD01'] * len(geometries)})
+
+    mask = QgsGeometry.fromRect(QgsRectangle(ORIGIN_X, ORIGIN_Y, ORIGIN_X + extent, ORIGIN_Y + extent))
+    paths['mask'] = _write_layer(folder, f"{PROVINCE}.shp", [mask], QgsWkbTypes.Polygon, {'NAME': [PROVINCE]})
+
+    # DEM: smooth hills with noise, so every aspect class occurs
+    numpy_rng = np.random.default_rng(seed)
+    pixels = sizes['dem_pixels']
+    y_grid, x_grid = np.mgrid[0:pixels, 0:pixels] * (extent / pixels)
+    dem = (200 + 30 * np.sin(x_grid / 700.0) * np.cos(y_grid / 900.0) + 10 * np.sin(x_grid / 170.0 + y_grid / 230.0)
+           + numpy_rng.normal(0, 0.5, (pixels, pixels))).astype(np.float32)
+    paths['dem'] = _write_raster(os.path.join(folder, f"{PROVINCE}_geotif.tif"), dem, extent / pixels, nodata=-9999)
+
+    # Monthly climate rasters on a coarse grid
+    paths['climate_folder'] = os.path.join(folder, "CLIMATE")
+    create_directory_if_not_exists(paths['climate_folder'])
+    pixels = sizes['climate_pixels']
+    for index, month in enumerate(MONTHS):
+        seasonal = 100 + 80 * math.sin(math.pi * index / 11)
+        values = (seasonal + numpy_rng.normal(0, 5, (pixels, pixels))).astype(np.float32)
+        _write_raster(os.path.join(paths['climate_folder'], f"map_{month}.tif"), values, extent / pixels, nodata=-9999)
+
+    print(f"Synthetic data for scale {scale} generated in {folder}")
+    return paths
+
+
+# 3. Benchmarks
+def _timed(results, scale, name, repeat, function, **kwargs):
+    durations = []
+    output = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = function(**kwargs)
+        durations.append(time.perf_counter() - start)
+
+    results.append({'scale': scale, 'function': name, 'seconds': min(durations), 'runs': repeat})
+    print(f"scale {scale:>6}  {name:<40} {min(durations):10.3f} s")
+    return output
+
+
+def run_benchmarks(work_folder, scales, repeat=1, seed=0):
+    """
+    Generates synthetic data for every scale and times the pipeline functions on it.
+
+    Args:
+        work_folder (str): Folder for the synthetic data and outputs (one subfolder per scale).
+        scales (list): Scale factors (see scale_parameters).
+        repeat (int): Runs per function, the fastest run is reported.
+        seed (int): Random seed of the synthetic data.
+
+    Returns:
+        list: One result per scale and function: {'scale', 'function', 'seconds', 'runs'}.
+    """
+    import Renewable_energy_optimum_location_function as pipeline
+
+    results = []
+    for scale in scales:
+        data_folder = os.path.join(work_folder, f"scale_{scale}", "data")
+        output_folder = os.path.join(work_folder, f"scale_{scale}", "output")
+        pipeline.create_directory_if_not_exists(output_folder)
+        data = generate_synthetic_data(data_folder, scale, seed=seed)
+
+        merged = _timed(results, scale, "merge_vector_layers", repeat, pipeline.merge_vector_layers,
+                        layer_paths=data['land_cover'], base_output_path=output_folder, output_file_name="merge.shp")
+        pipeline.split_into_single_parts(base_output_path=output_folder, input_file_name=merged, output_file_name="split.shp")
+
+        aspect_folder = os.path.join(output_folder, "ASPECT")
+        aspect = _timed(results, scale, "calculate_terrain_aspect", repeat, pipeline.calculate_terrain_aspect,
+                        input_folder=data_folder, input_file_name=os.path.basename(data['dem']),
+                        output_folder=aspect_folder, output_file_name="aspect.tif")
+        _timed(results, scale, "tiled_terrain_aspect", repeat, pipeline.tiled_terrain_aspect,
+               input_path=data['dem'], output_path=os.path.join(aspect_folder, "aspect_tiled.tif"), tile_size=512)
+        _timed(results, scale, "raster_to_vector_conversion", repeat, pipeline.raster_to_vector_conversion,
+               raster_input=aspect, output_folder_raster=aspect_folder, output_raster_filename="exposure.tif",
+               output_vector_folder=output_folder, output_vector_file="exposure.shp")
+        pipeline.filter_values_condition_1(filter_value='"DN" = 1', base_input_path=output_folder, input_filename="exposure.shp",
+                                           base_output_path=output_folder, output_file="exposure_true.shp")
+
+        _timed(results, scale, "intersection_exposure_bdot", repeat, pipeline.intersection_exposure_bdot,
+               base_output_path=output_folder, base_layer="exposure_true.shp", overlay_layer="split.shp",
+               output_file_name="potencial_area.shp")
+        _timed(results, scale, "partitioned_intersection", repeat, pipeline.partitioned_intersection,
+               base_output_path=output_folder, base_layer="exposure_true.shp", overlay_layer="split.shp",
+               output_file_name="potencial_area_partitioned.shp", cell_size=2000)
+
+        _timed(results, scale, "split_area_filter_id", repeat, pipeline.split_area_filter_id,
+               base_output_path=output_folder, input_file="merge.shp", output_file="sites.shp", min_area=20000)
+        pipeline.select_from_layer(base_output_path=output_folder, input_path=data['power_lines'], output_file_name="medium_power_line.shp")
+
+        _timed(results, scale, "calculate_distance", repeat, pipeline.calculate_distance,
+               base_output_path=output_folder, source_layer="sites.shp", destination_layer="medium_power_line.shp",
+               output_file_name="distance_to_line.shp")
+        _timed(results, scale, "calculate_nearest_distances", repeat, pipeline.calculate_nearest_distances,
+               base_output_path=output_folder, source_layer="sites.shp",
+               destination_layers={'LINE_DIST': "medium_power_line.shp", 'ROAD_DIST': data['roads']},
+               output_file_name="sites_distances.shp")
+        _timed(results, scale, "calculate_nearest_distances (within 500 m)", repeat, pipeline.calculate_nearest_distances,
+               base_output_path=output_folder, source_layer="sites.shp",
+               destination_layers={'LINE_DIST': "medium_power_line.shp", 'ROAD_DIST': data['roads']},
+               output_file_name="sites_within_500.shp", max_distances={'LINE_DIST': 500})
+
+        _timed(results, scale, "buffer", repeat, pipeline.buffer,
+               base_output_path=output_folder, input_path=data['buildings'], output_file="buildings_buffer.shp", distance=800)
+        _timed(results, scale, "tiled_buffer", repeat, pipeline.tiled_buffer,
+               base_output_path=output_folder, input_path=data['buildings'], output_file="buildings_buffer_tiled.shp",
+               distance=800, tile_size=2000)
+        _timed(results, scale, "difference_between_layers", repeat, pipeline.difference_between_layers,
+               base_output_path=output_folder, base_layer="split.shp", overlay_layer="buildings_buffer.shp",
+               output_file_name="difference.shp", variable_to_area='"AREA" > 10000')
+
+        # Monthly climate values: polygonize + 12 intersections/joins against single-pass zonal statistics
+        clip_folder = os.path.join(output_folder, "CLIP")
+        _timed(results, scale, "process_sunlight_data", repeat, pipeline.process_sunlight_data,
+               months=MONTHS, input_folder=data['climate_folder'], output_folder=clip_folder, mask_shapefile=data['mask'])
+        _timed(results, scale, "process_tif_files", repeat, pipeline.process_tif_files,
+               base_input_path=clip_folder, base_output_path=output_folder, output_file_name=f"solar_radiation_vector_{PROVINCE}",
+               field_name="Solar_surface_radiation_[Wm2]", months=MONTHS)
+        _timed(results, scale, "solar_radiation_photovoltaic_area", repeat, pipeline.solar_radiation_photovoltaic_area,
+               base_output_path=output_folder, photovoltaic_area_path=os.path.join(output_folder, "sites.shp"),
+               province=PROVINCE, output_file_name="solar_radiation_sites.shp")
+        _timed(results, scale, "monthly_zonal_statistics", repeat, pipeline.monthly_zonal_statistics,
+               base_output_path=output_folder, site_layer="sites.shp", months=MONTHS, output_file_name="monthly_sites.shp",
+               raster_paths=[os.path.join(clip_folder, f"MAP_{month.upper()}_CLIPPED.tif") for month in MONTHS])
+
+        monthly_stack = _timed(results, scale, "clip_monthly_stack", repeat, pipeline.clip_monthly_stack,
+                               months=MONTHS, input_folder=data['climate_folder'],
+                               output_path=os.path.join(clip_folder, "monthly.tif"), mask_shapefile=data['mask'])
+        _timed(results, scale, "monthly_zonal_statistics (stack)", repeat, pipeline.monthly_zonal_statistics,
+               base_output_path=output_folder, site_layer="sites.shp", months=MONTHS, output_file_name="monthly_sites_stack.shp",
+               raster_paths=monthly_stack)
+
+    return results
+
+
+# 4. Regressions
+def compare_with_baseline(results, baseline, tolerance=0.2):
+    """
+    Lists the functions that became slower than in a baseline run by more than the tolerance.
+
+    Args:
+        results (list): Results of run_benchmarks.
+        baseline (list): Results of an earlier run (e.g. read from its JSON file).
+        tolerance (float): Allowed relative slowdown (0.2 = 20 %).
+
+    Returns:
+        list: (scale, function, baseline seconds, current seconds) of every regression.
+    """
+    previous = {(result['scale'], result['function']): result['seconds'] for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result['scale'], result['function']))
+        if before is not None and result['seconds'] > before * (1 + tolerance):
+            regressions.append((result['scale'], result['function'], before, result['seconds']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline functions on synthetic data.")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10], help="Scale factors (1 = about one county).")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per function, the fastest is reported.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic data.")
+    parser.add_argument("--work-folder", default=os.path.join(tempfile.gettempdir(), "renewable_energy_benchmark"))
+    parser.add_argument("--results", default="benchmark_results.json", help="Output JSON file.")
+    parser.add_argument("--baseline", default=None, help="Results of an earlier run to compare with.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown against the baseline.")
+    parser.add_argument("--qgis-prefix", default=QGIS_PREFIX_PATH, help="QGIS installation prefix.")
+    parser.add_argument("--qgis-plugins", default=QGIS_PLUGINS_PATH, help="Folder containing the processing plugin.")
+    args = parser.parse_args()
+
+    init_qgis_worker(args.qgis_prefix, args.qgis_plugins, [MODULE_PATH, os.path.dirname(os.path.abspath(__file__))],
+                     args.work_folder)
+    results = run_benchmarks(args.work_folder, args.scales, repeat=args.repeat, seed=args.seed)
+
+    with open(args.results, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+    print(f"Results saved to {args.results}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = compare_with_baseline(results, json.load(file), tolerance=args.tolerance)
+        for scale, function, before, after in regressions:
+            print(f"REGRESSION scale {scale}: {function} {before:.3f} s -> {after:.3f} s")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import argparse
+import atexit
+import importlib
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import traceback
+
+from Pipeline_progress import mark_worker_process, run_progress_text
+
+
+# Folder with the project modules (same path the step scripts append)
+MODULE_PATH = 'D:/GEOWORLDLOOK/OZE/Renewable_energy_optimum_location'
+
+# QGIS installation used by the worker processes
+QGIS_PREFIX_PATH = 'C:/OSGeo4W/apps/qgis'
+QGIS_PLUGINS_PATH = 'C:/OSGeo4W/apps/qgis/python/plugins'
+
+# Step number -> (module, per-province function, provinces dictionary)
+STEPS = {
+    "1": ("Step_1_Photovoltaic_farm", "process_photovoltaic_area_for_province", "provinces"),
+    "2": ("Step_2_Wind_farm", "process_wind_farm_for_province", "provinces"),
+    "3": ("Step_3_Solar_surface_radiation", "process_province_data", "PROVINCES"),
+    "4": ("Step_4_Wind_speed", "process_wind_speed_for_province", "PROVINCES"),
+}
+
+# Environment variable with the number of threads the helpers of a worker process may use
+THREAD_BUDGET_VARIABLE = 'PIPELINE_THREADS'
+
+# QgsApplication of the current worker process (one per process, kept for its whole life)
+_qgs_app = None
+
+
+def thread_budget():
+    """
+    Returns the number of threads the parallel helpers of this process may use.
+
+    Worker processes get a share of the cores from init_qgis_worker, so workers times threads stays at the
+    number of cores; other processes use one thread per core.
+
+    Returns:
+        int: Thread budget (at least 1).
+    """
+    try:
+        return max(int(os.environ[THREAD_BUDGET_VARIABLE]), 1)
+    except (KeyError, ValueError):
+        return os.cpu_count() or 1
+
+
+# 1. Worker initialization
+def init_qgis_worker(qgis_prefix_path, qgis_plugins_path, module_paths, scratch_folder, threads=None):
+    """
+    Initializes QgsApplication and the processing framework once per worker process.
+
+    Every worker gets its own scratch folder for temporary files (TEMPORARY_OUTPUT layers,
+    GDAL and processing temp files), so workers never write into each other's files.
+
+    Args:
+        qgis_prefix_path (str): QGIS installation prefix (e.g. 'C:/OSGeo4W/apps/qgis').
+        qgis_plugins_path (str): Folder containing the 'processing' plugin.
+        module_paths (list): Folders added to sys.path (project modules).
+        scratch_folder (str): Folder in which the worker scratch folder is created.
+        threads (int, optional): Thread budget of the worker, read by the parallel helpers through thread_budget
+            (default: one thread per core).
+
+    Returns:
+        None
+    """
+    global _qgs_app
+
+    for path in [qgis_plugins_path] + list(module_paths):
+        if path not in sys.path:
+            sys.path.append(path)
+
+    worker_folder = os.path.join(scratch_folder, f"worker_{os.getpid()}")
+    os.makedirs(worker_folder, exist_ok=True)
+    for variable in ('TMPDIR', 'TEMP', 'TMP'):
+        os.environ[variable] = worker_folder
+    tempfile.tempdir = worker_folder
+    if threads is not None:
+        os.environ[THREAD_BUDGET_VARIABLE] = str(threads)
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    from qgis.core import QgsApplication
+    from qgis.analysis import QgsNativeAlgorithms
+
+    QgsApplication.setPrefixPath(qgis_prefix_path, True)
+    _qgs_app = QgsApplication([], False)
+    _qgs_app.initQgis()
+    atexit.register(_qgs_app.exitQgis)
+
+    from processing.core.Processing import Processing
+    Processing.initialize()
+    QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms())
+
+    # The run progress is reported by the parent process, which sees all provinces
+    mark_worker_process()
+
+    print(f"QGIS worker {os.getpid()} initialized.")
+
+
+# 2. Single province task
+def run_province(province_function, key, province, number, kwargs):
+    """
+    Runs a per-province function and catches its error, so one failing province does not stop the pool.
+
+    Args:
+        province_function (callable): Function called as province_function(key, province, number, **kwargs).
+        key (str): Province key.
+        province (str): Name of the province.
+        number (str): Number associated with the province.
+        kwargs (dict): Additional keyword arguments for the function.
+
+    Returns:
+        tuple: (province, None) on success, (province, traceback text) on error.
+    """
+    try:
+        province_function(key, province, number, **kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        print(f"Province {province} failed:\n{error}")
+        return province, error
+
+    print(f"Province {province} completed.")
+    return province, None
+
+
+def _run_province_task(task):
+    return run_province(*task)
+
+
+# 3. Province pool
+def run_provinces_in_parallel(province_function, provinces, workers=None, qgis_prefix_path=QGIS_PREFIX_PATH,
+                              qgis_plugins_path=QGIS_PLUGINS_PATH, module_paths=(MODULE_PATH,),
+                              scratch_folder=None, **kwargs):
+    """
+    Processes independent provinces in a pool of worker processes, one QGIS instance per worker.
+
+    The function must be importable (defined at module level of a step script), because it is sent
+    to the workers by reference. Per-province output files are kept apart by the step scripts
+    (file and folder names contain the province), per-worker temporary files by init_qgis_worker.
+    Workers report the progress of their province, this process the progress and ETA of the whole run.
+
+    Args:
+        province_function (callable): Per-province function, e.g. process_province_data from Step 3.
+        provinces (dict): Province key -> (province name, number), as in the step scripts.
+        workers (int, optional): Number of worker processes. Defaults to one per core (at most one per province).
+        qgis_prefix_path (str): QGIS installation prefix.
+        qgis_plugins_path (str): Folder containing the 'processing' plugin.
+        module_paths (tuple): Folders with the project modules.
+        scratch_folder (str, optional): Root of the worker scratch folders. Defaults to the system temp folder.
+        **kwargs: Passed to every province_function call.
+
+    Returns:
+        dict: Province name -> traceback text for every province that failed (empty when all succeeded).
+    """
+    if workers is None:
+        workers = min(len(provinces), os.cpu_count() or 1)
+    # Every worker gets its share of the cores, so the helper threads of all workers do not oversubscribe them
+    threads = max((os.cpu_count() or 1) // workers, 1)
+    if scratch_folder is None:
+        scratch_folder = os.path.join(tempfile.gettempdir(), "province_workers")
+    os.makedirs(scratch_folder, exist_ok=True)
+
+    tasks = [(province_function, key, province, number, kwargs) for key, (province, number) in provinces.items()]
+
+    # 'spawn' gives every worker a clean interpreter, QGIS cannot be safely forked
+    context = multiprocessing.get_context('spawn')
+    errors = {}
+    start = time.perf_counter()
+    with context.Pool(processes=workers, initializer=init_qgis_worker,
+                      initargs=(qgis_prefix_path, qgis_plugins_path, list(module_paths), scratch_folder, threads)) as pool:
+        for finished, (province, error) in enumerate(pool.imap_unordered(_run_province_task, tasks, chunksize=1), start=1):
+            if error is not None:
+                errors[province] = error
+            print(f"Run progress: {run_progress_text(finished, len(tasks), time.perf_counter() - start)}")
+
+    print(f"Processed {len(tasks)} provinces with {workers} workers ({threads} threads each), {len(errors)} failed.")
+    for province in errors:
+        print(f"Failed province: {province}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a pipeline step for all provinces in parallel.")
+    parser.add_argument("step", choices=sorted(STEPS), help="Step number (1-4).")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes.")
+    parser.add_argument("--provinces", nargs="*", default=None, help="Province names to process (default: all).")
+    parser.add_argument("--qgis-prefix", default=QGIS_PREFIX_PATH, help="QGIS installation prefix.")
+    parser.add_argument("--qgis-plugins", default=QGIS_PLUGINS_PATH, help="Folder containing the processing plugin.")
+    parser.add_argument("--scratch", default=None, help="Root folder for worker scratch files.")
+    args = parser.parse_args()
+
+    sys.path.extend([args.qgis_plugins, MODULE_PATH])
+    module_name, function_name, provinces_name = STEPS[args.step]
+    module = importlib.import_module(module_name)
+    provinces = getattr(module, provinces_name)
+    if args.provinces:
+        provinces = {key: value for key, value in provinces.items() if value[0] in args.provinces}
+
+    errors = run_provinces_in_parallel(getattr(module, function_name), provinces, workers=args.workers,
+                                       qgis_prefix_path=args.qgis_prefix, qgis_plugins_path=args.qgis_plugins,
+                                       scratch_folder=args.scratch)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import argparse
+import csv
+import itertools
+import os
+import tempfile
+
+import numpy as np
+
+from Parallel_province_runner import init_qgis_worker, MODULE_PATH, QGIS_PREFIX_PATH, QGIS_PLUGINS_PATH
+
+
+# Thresholds of the steps: name -> (metric column, comparison). A site passes a threshold value when
+# '<metric> <comparison> <value>' holds (the comparisons of the step filters).
+THRESHOLDS = {
+    "min_area": ("AREA", '>'),
+    "max_line_distance": ("LINE_DISTANCE", '<'),
+    "max_road_distance": ("ROAD_DISTANCE", '<'),
+    "min_building_distance": ("BUILDING_DISTANCE", '>='),
+}
+
+# Default grid: the Step 1 / Step 2 cut-offs and values around them (None = threshold not applied)
+SWEEP_GRID = {
+    "min_area": [5000, 10000, 20000, 50000],
+    "max_line_distance": [300, 500, 800, 1200],
+    "max_road_distance": [None],
+    "min_building_distance": [0, 500, 800, 1000],
+}
+
+# Unthresholded metrics of every site part
+METRICS = ["AREA", "LINE_DISTANCE", "ROAD_DISTANCE", "BUILDING_DISTANCE"]
+
+
+# 1. Metrics
+def compute_sweep_metrics(base_output_path, parts_layer, power_line_layer, road_layer, building_layer, output_file_name):
+    """
+    Computes the unthresholded metrics of every candidate part once: area and distances to the nearest
+    medium-voltage line, road and building.
+
+    The building distance stands in for the building buffer: a part passes a buffer of d meters when it is
+    at least d meters from every building. The steps subtract the buffer instead (keeping the rest of a part
+    that the buffer overlaps), so the sweep counts of a buffer are a lower bound of the sites the step keeps.
+
+    Parameters:
+    - base_output_path (str): The base directory where the input and output files are located.
+    - parts_layer (str or QgsVectorLayer): Candidate areas before any threshold (e.g. the merged land cover).
+    - power_line_layer (str or QgsVectorLayer): Medium-voltage power lines.
+    - road_layer (str or QgsVectorLayer): Roads (BDOT10k OT_SKJZ_L, the layer of Step 1).
+    - building_layer (str or QgsVectorLayer): Buildings (BDOT10k OT_BUBD_A).
+    - output_file_name (str): The name of the metrics layer, kept to sweep other grids later, or TEMPORARY_OUTPUT.
+
+    Returns:
+    str or QgsVectorLayer: The metrics layer (parts with ID and the METRICS columns).
+    """
+    from Renewable_energy_optimum_location_function import TEMPORARY_OUTPUT, split_area_filter_id, calculate_nearest_distances
+
+    parts = split_area_filter_id(base_output_path=base_output_path, input_file=parts_layer, output_file=TEMPORARY_OUTPUT, min_area=0)
+    return calculate_nearest_distances(base_output_path=base_output_path, source_layer=parts,
+                                       destination_layers={'LINE_DISTANCE': power_line_layer, 'ROAD_DISTANCE': road_layer,
+                                                           'BUILDING_DISTANCE': building_layer},
+                                       output_file_name=output_file_name)
+
+
+def load_sweep_metrics(base_output_path, metrics_layer):
+    """
+    Reads the metrics layer into one array per metric (a missing distance, no feature of that layer, is +inf).
+
+    Parameters:
+    - base_output_path (str): The base directory of the metrics layer.
+    - metrics_layer (str or QgsVectorLayer): The layer written by compute_sweep_metrics.
+
+    Returns:
+    dict: Metric name -> numpy.ndarray of float64, one value per part.
+    """
+    from qgis.core import NULL, QgsFeatureRequest
+    from Renewable_energy_optimum_location_function import open_vector_layer
+
+    layer = open_vector_layer(base_output_path, metrics_layer)
+    indexes = [layer.fields().indexOf(name) for name in METRICS]
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes(indexes)
+    values = [[feature.attributes()[index] for index in indexes] for feature in layer.getFeatures(request)]
+
+    # Missing values come back as NULL QVariants, not None
+    table = np.array([[np.inf if value is None or value == NULL else value for value in row] for row in values],
+                     dtype=np.float64).reshape(-1, len(METRICS))
+    return {name: table[:, column] for column, name in enumerate(METRICS)}
+
+
+# 2. Sweep
+def sweep_thresholds(metrics, grid=SWEEP_GRID):
+    """
+    Evaluates every combination of threshold values on the metrics with vectorized masks.
+
+    The mask of every threshold value is computed once; a combination is the AND of its masks, so each
+    combination costs two array operations over the parts, however many combinations the grid has.
+
+    Args:
+        metrics (dict): Metric name -> array (see load_sweep_metrics).
+        grid (dict): Threshold name (see THRESHOLDS) -> list of values (None = not applied).
+
+    Returns:
+        list: One dict per combination with the threshold values, SITES (number of parts kept) and
+        TOTAL_AREA (their total area).
+    """
+    comparisons = {'>': np.greater, '<': np.less, '>=': np.greater_equal}
+    names = list(grid)
+    masks = {}
+    for name in names:
+        column, comparison = THRESHOLDS[name]
+        for value in grid[name]:
+            if value is not None:
+                masks[(name, value)] = comparisons[comparison](metrics[column], value)
+
+    area = metrics["AREA"]
+    everything = np.ones(len(area), dtype=bool)
+    rows = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        kept = everything
+        for name, value in zip(names, values):
+            if value is not None:
+                kept = kept & masks[(name, value)]
+        row = dict(zip(names, values))
+        row["SITES"] = int(np.count_nonzero(kept))
+        row["TOTAL_AREA"] = float(area[kept].sum())
+        rows.append(row)
+
+    print(f"Threshold sweep completed: {len(rows)} combinations over {len(area)} parts.")
+    return rows
+
+
+def write_sweep_report(rows, report_path):
+    """
+    Writes the sweep results as a CSV file (one row per combination).
+
+    Args:
+        rows (list): Results of sweep_thresholds.
+        report_path (str): Path of the CSV file.
+
+    Returns:
+        str: The report path.
+    """
+    with open(report_path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]) if rows else ["SITES", "TOTAL_AREA"])
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Sweep report saved to {report_path}")
+    return report_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a grid of Step 1 / Step 2 thresholds from metrics computed once.")
+    parser.add_argument("key", help="Province TERYT code (e.g. 14).")
+    parser.add_argument("province", help="Province name (e.g. mazowieckie).")
+    parser.add_argument("number", help="BDOT10k package number of the province (e.g. 330).")
+    parser.add_argument("--input", default="D:/GEOWORLDLOOK/OZE/PILOT/Data", help="Folder with the input data.")
+    parser.add_argument("--output", default="D:/GEOWORLDLOOK/OZE/PILOT/SWEEP", help="Folder of the metrics and reports.")
+    parser.add_argument("--parts", default=None, help="Candidate areas layer (default: the merged land cover artifact, "
+                                                      "without the terrain exposure intersection of Step 1).")
+    parser.add_argument("--min-area", type=float, nargs="+", default=SWEEP_GRID["min_area"])
+    parser.add_argument("--max-line-distance", type=float, nargs="+", default=SWEEP_GRID["max_line_distance"])
+    parser.add_argument("--max-road-distance", type=float, nargs="+", default=SWEEP_GRID["max_road_distance"])
+    parser.add_argument("--min-building-distance", type=float, nargs="+", default=SWEEP_GRID["min_building_distance"])
+    parser.add_argument("--recompute", action="store_true", help="Recompute the metrics even if they exist.")
+    parser.add_argument("--qgis-prefix", default=QGIS_PREFIX_PATH, help="QGIS installation prefix.")
+    parser.add_argument("--qgis-plugins", default=QGIS_PLUGINS_PATH, help="Folder containing the processing plugin.")
+    args = parser.parse_args()
+
+    init_qgis_worker(args.qgis_prefix, args.qgis_plugins, [MODULE_PATH], os.path.join(tempfile.gettempdir(), "parameter_sweep"))
+    from Renewable_energy_optimum_location_function import create_directory_if_not_exists, geopackage_layer, \
+        land_cover_artifact, medium_power_line_artifact
+
+    create_directory_if_not_exists(args.output)
+    bdot = os.path.join(args.input, "BDOT", f"PL.PZGiK.{args.number}.BDOT10k.{args.key}__OT_")
+    metrics_layer = geopackage_layer(os.path.join(args.output, f"{args.province}.gpkg"), "sweep_metrics")
+
+    if args.recompute or not os.path.exists(os.path.join(args.output, f"{args.province}.gpkg")):
+        # Default parts: the merged land cover, not the parts Step 1 thresholds. Step 1 first intersects it with
+        # the south-facing terrain exposure, which is left out here, so the counts are an upper bound of the Step 1
+        # sites; --parts with a layer of the intersected parts sweeps exactly the Step 1 candidates
+        parts = args.parts or land_cover_artifact(args.province, [f"{bdot}PTGN_A.shp", f"{bdot}PTRK_A.shp",
+                                                                  f"{bdot}PTTR_A_ROSLINOSC_TRAWIASTA.shp"])
+        compute_sweep_metrics(base_output_path=args.output, parts_layer=parts,
+                              power_line_layer=medium_power_line_artifact(args.province, f"{bdot}SULN_L.shp"),
+                              road_layer=f"{bdot}SKJZ_L.shp", building_layer=f"{bdot}BUBD_A.shp",
+                              output_file_name=metrics_layer)
+
+    grid = {
+        "min_area": args.min_area,
+        "max_line_distance": args.max_line_distance,
+        "max_road_distance": args.max_road_distance,
+        "min_building_distance": args.min_building_distance,
+    }
+    rows = sweep_thresholds(load_sweep_metrics(args.output, metrics_layer), grid)
+    write_sweep_report(rows, os.path.join(args.output, f"{args.province}_sweep.csv"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Progress tracker of this process, None while progress reporting is disabled
+progress = None
+
+# True in the worker processes of a province pool, whose parent reports the run progress (see mark_worker_process)
+_worker_process = False
+
+
+class PipelineCanceled(Exception):
+    """Raised inside the running helper when the pipeline is canceled (see cancel_pipeline)."""
+
+
+# 1. Tracker
+class ProgressTracker:
+    """
+    Aggregates the progress of the running province from its steps (traced helpers and processing algorithms).
+
+    Every processing algorithm gets its own QgsProcessingFeedback; its percentage, and the fractions reported
+    by the Python helpers (report_step_progress), count as a part of a step. The number of steps and the
+    duration of every step function are learned from earlier provinces (kept in the history file between
+    runs), which gives the province progress and its ETA; with the number of provinces, also the ETA of the
+    whole run. Cancellation cancels the feedback of the running algorithms and raises PipelineCanceled at the
+    next check in the Python helpers.
+    """
+
+    def __init__(self, total_provinces=None, history_path=None, report_interval=10, stop_file=None):
+        """
+        Args:
+            total_provinces (int, optional): Provinces of the run, for the run ETA.
+            history_path (str, optional): JSON file of the step counts and durations of earlier province runs.
+            report_interval (float): Seconds between progress lines.
+            stop_file (str, optional): The run is canceled as soon as this file exists (e.g. created from another shell).
+        """
+        self.total_provinces = total_provinces
+        self.history_path = history_path
+        self.report_interval = report_interval
+        self.stop_file = stop_file
+        self.history = self._read_history()
+        self.canceled = False
+        self.finished_seconds = []
+
+        self.function_name = self.province = None
+        self.province_start = None
+        self.completed_steps = 0
+        self.running = {}  # step token -> [name, fraction, feedback]
+        self._tokens = itertools.count()
+        self._lock = threading.RLock()
+        self._last_report = self._last_stop_check = 0.0
+
+    # Province
+    def province_started(self, function_name, province):
+        with self._lock:
+            self.function_name, self.province = function_name, province
+            self.province_start = time.perf_counter()
+            self.completed_steps = 0
+            self.running.clear()
+        print(f"[{province}] started{self._expected_text()}")
+
+    def province_finished(self, succeeded):
+        with self._lock:
+            seconds = time.perf_counter() - self.province_start
+            if succeeded:
+                self.finished_seconds.append(seconds)
+                entry = self.history.setdefault(self.function_name, {'steps': [], 'seconds': []})
+                entry['steps'] = (entry['steps'] + [self.completed_steps])[-20:]
+                entry['seconds'] = (entry['seconds'] + [seconds])[-20:]
+                self._write_history()
+            province, self.province = self.province, None
+            print(f"[{province}] {'completed' if succeeded else 'stopped'} after {_duration(seconds)}, "
+                  f"{self.completed_steps} steps{self._run_eta_text(0.0)}")
+
+    # Steps
+    def step_started(self, name, feedback=None):
+        with self._lock:
+            self.check_canceled()
+            token = next(self._tokens)
+            self.running[token] = [name, 0.0, feedback]
+            if feedback is not None and self.canceled:
+                feedback.cancel()
+            return token
+
+    def step_progress(self, token, fraction):
+        with self._lock:
+            if token in self.running:
+                self.running[token][1] = min(max(fraction, 0.0), 1.0)
+            self._report()
+
+    def step_finished(self, token):
+        with self._lock:
+            self.running.pop(token, None)
+            self.completed_steps += 1
+            self._report()
+
+    # Cancellation
+    def cancel(self):
+        with self._lock:
+            if not self.canceled:
+                print(f"Pipeline canceled{f' ({self.province})' if self.province else ''}.")
+            self.canceled = True
+            for _, _, feedback in self.running.values():
+                if feedback is not None:
+                    feedback.cancel()
+
+    def check_canceled(self):
+        self._poll_stop_file()
+        if self.canceled:
+            raise PipelineCanceled("Pipeline canceled")
+
+    def _poll_stop_file(self):
+        now = time.perf_counter()
+        if self.stop_file is not None and not self.canceled and now - self._last_stop_check >= 1:
+            self._last_stop_check = now
+            if os.path.exists(self.stop_file):
+                self.cancel()
+
+    # Estimates
+    def fraction(self):
+        """Progress of the running province between 0 and 1, or None without an expected step count."""
+        expected = self._expected('steps')
+        if not expected:
+            return None
+        done = self.completed_steps + sum(fraction for _, fraction, _ in self.running.values())
+        return min(done / expected, 0.99)
+
+    def _expected(self, key):
+        values = sorted(self.history.get(self.function_name, {}).get(key, []))
+        return values[len(values) // 2] if values else None
+
+    def _expected_text(self):
+        steps, seconds = self._expected('steps'), self._expected('seconds')
+        return f" (about {steps} steps, {_duration(seconds)})" if steps and seconds else ""
+
+    def _run_eta_text(self, province_remaining):
+        if not self.total_provinces:
+            return ""
+        remaining_provinces = self.total_provinces - len(self.finished_seconds) - (1 if self.province else 0)
+        province_seconds = (sum(self.finished_seconds) / len(self.finished_seconds) if self.finished_seconds
+                            else self._expected('seconds'))
+        if province_seconds is None:
+            return f", {len(self.finished_seconds)}/{self.total_provinces} provinces"
+        eta = province_remaining + max(remaining_provinces, 0) * province_seconds
+        return f", {len(self.finished_seconds)}/{self.total_provinces} provinces, run ETA {_duration(eta)}"
+
+    def _report(self):
+        # Also called from feedback signals, so it cancels but never raises
+        self._poll_stop_file()
+        now = time.perf_counter()
+        if self.province is None or now - self._last_report < self.report_interval:
+            return
+        self._last_report = now
+
+        elapsed = now - self.province_start
+        running = ", ".join(f"{name} {fraction:.0%}" for name, fraction, _ in self.running.values())
+        fraction = self.fraction()
+        if fraction:
+            remaining = elapsed * (1 - fraction) / fraction
+            status = f"{fraction:.0%}, ETA {_duration(remaining)}"
+        else:
+            remaining = 0.0
+            status = f"{self.completed_steps} steps, {_duration(elapsed)}"
+        print(f"[{self.province}] {status}{f' ({running})' if running else ''}{self._run_eta_text(remaining)}")
+
+    # History
+    def _read_history(self):
+        if self.history_path is None:
+            return {}
+        try:
+            with open(self.history_path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_history(self):
+        if self.history_path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.history_path)), exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.history_path)), suffix='.tmp')
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            json.dump(self.history, file, indent=1)
+        os.replace(temporary_path, self.history_path)
+
+
+def _duration(seconds):
+    seconds = int(seconds or 0)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+# 2. Enable progress reporting
+def enable_progress(total_provinces=None, history_path=None, report_interval=10, stop_file=None):
+    """
+    Enables progress, ETA and cancellation of the pipeline steps in this process.
+
+    Args:
+        total_provinces (int, optional): Provinces of the run, for the run ETA.
+        history_path (str, optional): JSON file of step counts and durations, kept between runs for the ETA.
+        report_interval (float): Seconds between progress lines.
+        stop_file (str, optional): Creating this file cancels the run cleanly.
+
+    Returns:
+        ProgressTracker: The enabled tracker.
+    """
+    global progress
+    if _worker_process:
+        # A worker sees only its share of the provinces, the parent process reports the run ETA
+        total_provinces = None
+    progress = ProgressTracker(total_provinces, history_path, report_interval, stop_file)
+    print(f"Pipeline progress enabled{f', stop file: {stop_file}' if stop_file else ''}")
+    return progress
+
+
+def mark_worker_process():
+    """Marks this process as a worker of a province pool: its trackers report province progress only."""
+    global _worker_process
+    _worker_process = True
+
+
+def run_progress_text(finished, total, elapsed):
+    """
+    Returns the run progress of a province pool, with the run ETA from the province throughput so far.
+
+    Args:
+        finished (int): Provinces finished (completed or failed).
+        total (int): Provinces of the run.
+        elapsed (float): Seconds since the run started.
+
+    Returns:
+        str: e.g. '5/16 provinces, run ETA 1:10:00'.
+    """
+    if not finished:
+        return f"0/{total} provinces"
+    return f"{finished}/{total} provinces, run ETA {_duration(elapsed * (total - finished) / finished)}"
+
+
+def cancel_pipeline():
+    """Cancels the running pipeline (e.g. from another thread): running algorithms stop, helpers raise PipelineCanceled."""
+    if progress is not None:
+        progress.cancel()
+
+
+def check_canceled():
+    """Raises PipelineCanceled when the pipeline was canceled (a no-op while progress is disabled)."""
+    if progress is not None:
+        progress.check_canceled()
+
+
+# 3. Hooks of the helpers
+_local = threading.local()
+
+
+@contextmanager
+def progress_step(name, algorithm=False):
+    """
+    Counts one step of the running province (a no-op while progress is disabled).
+
+    Args:
+        name (str): Helper name or algorithm id.
+        algorithm (bool): Create a QgsProcessingFeedback reporting the algorithm percentage.
+
+    Yields:
+        QgsProcessingFeedback or None: The feedback to pass to processing.run (None for helpers or when disabled).
+    """
+    if progress is None or progress.province is None:
+        yield None
+        return
+
+    feedback = None
+    if algorithm:
+        from qgis.core import QgsProcessingFeedback
+        feedback = QgsProcessingFeedback()
+
+    token = progress.step_started(name, feedback)
+    if feedback is not None:
+        feedback.progressChanged.connect(lambda percent: progress.step_progress(token, percent / 100))
+
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(token)
+    try:
+        yield feedback
+    except PipelineCanceled:
+        raise
+    except Exception as error:
+        if progress.canceled:
+            raise PipelineCanceled(f"{name} canceled") from error
+        raise
+    finally:
+        stack.pop()
+        progress.step_finished(token)
+    if feedback is not None and feedback.isCanceled():
+        raise PipelineCanceled(f"{name} canceled")
+
+
+def report_step_progress(done, total):
+    """
+    Reports the progress of the innermost running step from a Python helper loop and checks for cancellation.
+
+    Args:
+        done (int): Items processed (features, cells, tiles...).
+        total (int): Items in total.
+    """
+    if progress is None:
+        return
+    stack = getattr(_local, 'stack', None)
+    if stack and total:
+        progress.step_progress(stack[-1], done / total)
+    progress.check_canceled()
+
+
+@contextmanager
+def province_progress(function_name, province):
+    """Tracks one province run of a step function (a no-op while progress is disabled)."""
+    if progress is None:
+        yield
+        return
+    progress.province_started(function_name, province)
+    succeeded = False
+    try:
+        yield
+        succeeded = True
+    finally:
+        progress.province_finished(succeeded)
@@ -0,0 +1,402 @@
+import argparse
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from Parallel_province_runner import init_qgis_worker, thread_budget, MODULE_PATH, QGIS_PREFIX_PATH, QGIS_PLUGINS_PATH, STEPS
+from Pipeline_trace import propagate_span
+from Step_cache import SHAPEFILE_SIDECARS
+
+
+# Steps each step depends on (Step 3 reads Step 1 results, Step 4 reads Step 2 results,
+# Step 2 reuses the artifacts produced by Step 1)
+STEP_DEPENDENCIES = {
+    "1": (),
+    "2": ("1",),
+    "3": ("1",),
+    "4": ("2",),
+}
+
+# Estimated peak memory of one province run of each step, in GB
+STEP_MEMORY_GB = {
+    "1": 8,
+    "2": 6,
+    "3": 2,
+    "4": 2,
+}
+
+
+# 1. Tasks
+class TaskResult:
+    """Placeholder for the result of another task, replaced by that result when the task runs."""
+
+    def __init__(self, name):
+        self.name = name
+
+
+class Task:
+    """
+    Node of a pipeline DAG: a function call whose arguments may contain TaskResult placeholders.
+
+    Dependencies are the tasks named by the placeholders plus the tasks listed in after (for tasks that
+    only need another task to have run, e.g. because it writes a shared file).
+    """
+
+    def __init__(self, name, function, args=(), kwargs=None, after=(), cores=1, memory_gb=1, thread_safe=False):
+        """
+        Args:
+            name (str): Unique task name.
+            function (callable): Function to call; module-level for process execution.
+            args (tuple): Positional arguments (may contain TaskResult placeholders).
+            kwargs (dict): Keyword arguments (may contain TaskResult placeholders).
+            after (iterable): Names of additional tasks that must complete first.
+            cores (int): Cores used by the task, counted against the scheduler budget.
+            memory_gb (float): Peak memory of the task in GB, counted against the scheduler budget.
+            thread_safe (bool): The task may run in a worker thread (GDAL/NumPy work only). Tasks using QGIS
+                (processing.run, memory layers) are not thread-safe and run on the scheduler thread.
+        """
+        self.name = name
+        self.function = function
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs or {})
+        self.cores = cores
+        self.memory_gb = memory_gb
+        self.thread_safe = thread_safe
+        self.dependencies = set(after) | _placeholders(self.args) | _placeholders(self.kwargs)
+
+
+def _placeholders(value):
+    if isinstance(value, TaskResult):
+        return {value.name}
+    if isinstance(value, (list, tuple)):
+        return set().union(*(_placeholders(item) for item in value)) if value else set()
+    if isinstance(value, dict):
+        return set().union(*(_placeholders(item) for item in value.values())) if value else set()
+    return set()
+
+
+def _resolve(value, results):
+    if isinstance(value, TaskResult):
+        return results[value.name]
+    if isinstance(value, list):
+        return [_resolve(item, results) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_resolve(item, results) for item in value)
+    if isinstance(value, dict):
+        return {key: _resolve(item, results) for key, item in value.items()}
+    return value
+
+
+def _persisted(result):
+    """True when a task result survives the process: nothing (side effects only) or an existing file or layer."""
+    if result is None:
+        return True
+    if not isinstance(result, str):
+        return False
+    path, _, options = result.partition('|')
+    if not os.path.exists(path):
+        return False
+    layer_name = options.split('layername=', 1)[1].split('|')[0] if 'layername=' in options else None
+    if layer_name is None or not path.lower().endswith('.gpkg'):
+        return True
+    # A GeoPackage is an SQLite database listing its layers in gpkg_contents
+    try:
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            return connection.execute("SELECT 1 FROM gpkg_contents WHERE table_name = ?", (layer_name,)).fetchone() is not None
+        finally:
+            connection.close()
+    except sqlite3.Error:
+        return False
+
+
+def _describe(value, signatures):
+    """JSON description of a task argument: results of other tasks by their signature, input files by size and mtime."""
+    if isinstance(value, TaskResult):
+        return ['result', signatures[value.name]]
+    if isinstance(value, (list, tuple)):
+        return [_describe(item, signatures) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _describe(item, signatures) for key, item in value.items()}
+    if isinstance(value, str):
+        path = value.split('|')[0]
+        if os.path.isfile(path):
+            stem, extension = os.path.splitext(path)
+            files = [path] + ([stem + sidecar for sidecar in SHAPEFILE_SIDECARS] if extension.lower() == '.shp' else [])
+            return [value] + [[os.stat(file_path).st_size, os.stat(file_path).st_mtime_ns] for file_path in files
+                              if os.path.isfile(file_path)]
+    return repr(value)
+
+
+def task_signatures(tasks, order):
+    """
+    Computes the signature of every task: its function, its arguments (with the size and modification time of
+    the input files they name) and the signatures of the tasks it depends on. A task whose inputs, parameters
+    or upstream tasks change gets a new signature. Keyword arguments naming outputs (containing 'output') are
+    taken as given, so writing the output does not change the signature.
+
+    Args:
+        tasks (dict): Task name -> Task.
+        order (list): Task names in dependency order (see topological_order).
+
+    Returns:
+        dict: Task name -> hex digest.
+    """
+    signatures = {}
+    for name in order:
+        task = tasks[name]
+        description = {
+            'function': f"{getattr(task.function, '__module__', '')}.{getattr(task.function, '__qualname__', repr(task.function))}",
+            'args': _describe(task.args, signatures),
+            'kwargs': {key: repr(value) if 'output' in key else _describe(value, signatures) for key, value in task.kwargs.items()},
+            'dependencies': sorted(signatures[dependency] for dependency in task.dependencies),
+        }
+        signatures[name] = hashlib.sha256(json.dumps(description, sort_keys=True).encode('utf-8')).hexdigest()
+    return signatures
+
+
+def _run_task(function, args, kwargs):
+    return function(*args, **kwargs)
+
+
+def topological_order(tasks):
+    """
+    Orders tasks so that every task comes after its dependencies.
+
+    Args:
+        tasks (dict): Task name -> Task.
+
+    Returns:
+        list: Task names in dependency order (ties keep the given order).
+    """
+    for task in tasks.values():
+        missing = task.dependencies - set(tasks)
+        if missing:
+            raise ValueError(f"Task {task.name} depends on unknown tasks: {', '.join(sorted(missing))}")
+
+    order, visiting, visited = [], set(), set()
+
+    def visit(name):
+        if name in visited:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle through task {name}")
+        visiting.add(name)
+        for dependency in sorted(tasks[name].dependencies):
+            visit(dependency)
+        visiting.discard(name)
+        visited.add(name)
+        order.append(name)
+
+    for name in tasks:
+        visit(name)
+    return order
+
+
+# 2. Scheduler
+def run_dag(tasks, max_cores=None, max_memory_gb=None, state_path=None, keep_state=True, processes=False, initializer=None,
+            initargs=()):
+    """
+    Runs a DAG of tasks, starting every task whose dependencies are complete as long as it fits the budget.
+
+    A task starts when its cores and memory fit next to the running tasks (a task larger than the budget
+    runs alone). Tasks depending on a failed task are not run. With threads, only thread-safe tasks run in the
+    pool; the others run one at a time on the calling thread, overlapping the thread-safe tasks in flight
+    (QGIS is not thread-safe). With processes, every task runs in its own process. With state_path, completed tasks are recorded
+    with their signature (see task_signatures) and a later run resumes: tasks with an unchanged signature whose
+    result was persisted (a file or layer that still exists, or no result) are skipped, in-memory results are
+    recomputed only when a task that needs them runs again. A task whose function arguments, input files or
+    upstream tasks changed runs again. Delete the state file to run everything again.
+
+    Args:
+        tasks (list): Task objects.
+        max_cores (int, optional): Core budget (default: the thread budget of the process, see thread_budget).
+        max_memory_gb (float, optional): Memory budget in GB (default: unlimited).
+        state_path (str, optional): JSON file recording completed tasks, for resuming.
+        keep_state (bool): Keep the state file after a successful run (resume until deleted); when False it is
+            removed once every task succeeded, so only an interrupted or failed run is resumed.
+        processes (bool): Run tasks in worker processes (one fresh process per task, Python 3.11+) instead of threads.
+        initializer (callable, optional): Called in every worker process before its task (e.g. init_qgis_worker).
+        initargs (tuple): Arguments of the initializer.
+
+    Returns:
+        dict: Task name -> traceback text for every failed task (empty when all succeeded).
+    """
+    tasks = {task.name: task for task in tasks}
+    order = topological_order(tasks)
+    max_cores = max_cores or thread_budget()
+
+    state = {}
+    if state_path is not None:
+        try:
+            with open(state_path, encoding='utf-8') as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            state = {}
+
+    # Decide what runs, dependents before their dependencies
+    signatures = task_signatures(tasks, order)
+    dependents = {name: [other for other in order if name in tasks[other].dependencies] for name in order}
+    runs, results = {}, {}
+    for name in reversed(order):
+        entry = state.get(name, {})
+        completed = entry.get('status') == 'done' and entry.get('signature') == signatures[name]
+        if completed and entry.get('persisted') and _persisted(entry.get('result')):
+            runs[name] = False
+            results[name] = entry.get('result')
+        elif completed and not entry.get('persisted'):
+            # In-memory result: recomputed only for dependents that run again
+            runs[name] = any(runs[dependent] for dependent in dependents[name])
+        else:
+            runs[name] = True
+
+    skipped = [name for name in order if not runs[name]]
+    if skipped:
+        print(f"Resuming: {len(skipped)} completed tasks skipped.")
+
+    def save_state():
+        if state_path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(state_path)), suffix='.tmp')
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            json.dump(state, file, indent=1)
+        os.replace(temporary_path, state_path)
+
+    if processes:
+        executor = ProcessPoolExecutor(max_workers=max_cores, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=initializer, initargs=initargs, max_tasks_per_child=1)
+    else:
+        executor = ThreadPoolExecutor(max_workers=max_cores)
+
+    pending = [name for name in order if runs[name]]
+    running = {}
+    failed, blocked = {}, set()
+    used_cores = used_memory = 0
+    with executor:
+        while pending or running:
+            inline = None
+            for name in list(pending):
+                task = tasks[name]
+                if task.dependencies & (set(failed) | blocked):
+                    pending.remove(name)
+                    blocked.add(name)
+                    print(f"Task {name} not run: a dependency failed.")
+                    continue
+                if not task.dependencies <= set(results):
+                    continue
+                in_pool = processes or task.thread_safe
+                if not in_pool and inline is not None:
+                    continue
+                fits = used_cores + task.cores <= max_cores and (max_memory_gb is None or used_memory + task.memory_gb <= max_memory_gb)
+                if not fits and (running or inline is not None):
+                    continue
+
+                pending.remove(name)
+                used_cores += task.cores
+                used_memory += task.memory_gb
+                print(f"Task {name} started.")
+                if in_pool:
+                    # Worker threads record their trace events under the span of the caller
+                    function = _run_task if processes else propagate_span(_run_task)
+                    future = executor.submit(function, task.function, _resolve(task.args, results), _resolve(task.kwargs, results))
+                else:
+                    future = inline = Future()
+                    inline_task = task
+                running[future] = name
+
+            # The QGIS task runs here while the pool tasks started above keep running
+            if inline is not None:
+                try:
+                    inline.set_result(_run_task(inline_task.function, _resolve(inline_task.args, results),
+                                                _resolve(inline_task.kwargs, results)))
+                except Exception as error:
+                    inline.set_exception(error)
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                task = tasks[name]
+                used_cores -= task.cores
+                used_memory -= task.memory_gb
+                try:
+                    result = future.result()
+                except Exception:
+                    failed[name] = traceback.format_exc()
+                    state[name] = {'status': 'failed', 'signature': signatures[name]}
+                    print(f"Task {name} failed:\n{failed[name]}")
+                else:
+                    results[name] = result
+                    persisted = _persisted(result)
+                    state[name] = {'status': 'done', 'persisted': persisted, 'result': result if persisted else None,
+                                   'signature': signatures[name]}
+                    print(f"Task {name} completed.")
+                save_state()
+
+    if state_path is not None and not keep_state and not failed and os.path.exists(state_path):
+        os.remove(state_path)
+
+    completed = len(order) - len(skipped) - len(failed) - len(blocked)
+    print(f"DAG finished: {completed} tasks run, {len(skipped)} resumed, {len(failed)} failed, "
+          f"{len(blocked)} not run (dependency failed).")
+    return failed
+
+
+# 3. Pipeline of all steps and provinces
+def pipeline_tasks(steps, provinces_filter=None):
+    """
+    Builds the DAG of the per-province step runs: Step 1 -> Step 2 -> Step 4 and Step 1 -> Step 3,
+    independently for every province.
+
+    Args:
+        steps (list): Step numbers to include (e.g. ["1", "2", "3", "4"]).
+        provinces_filter (list, optional): Province names to include (default: all).
+
+    Returns:
+        list: Task objects named '<province>:step<number>'.
+    """
+    tasks = []
+    for step in steps:
+        module_name, function_name, provinces_name = STEPS[step]
+        module = importlib.import_module(module_name)
+        function = getattr(module, function_name)
+        for key, (province, number) in getattr(module, provinces_name).items():
+            if provinces_filter and province not in provinces_filter:
+                continue
+            after = [f"{province}:step{dependency}" for dependency in STEP_DEPENDENCIES[step] if dependency in steps]
+            tasks.append(Task(f"{province}:step{step}", function, args=(key, province, number), after=after,
+                              memory_gb=STEP_MEMORY_GB[step]))
+    return tasks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the pipeline steps of all provinces as a dependency graph.")
+    parser.add_argument("--steps", nargs="+", default=sorted(STEPS), choices=sorted(STEPS), help="Steps to run.")
+    parser.add_argument("--provinces", nargs="*", default=None, help="Province names to process (default: all).")
+    parser.add_argument("--cores", type=int, default=None, help="Number of step runs at the same time (default: cores).")
+    parser.add_argument("--memory-gb", type=float, default=None, help="Memory budget in GB (default: unlimited).")
+    parser.add_argument("--state", default="pipeline_state.json", help="State file used to resume an interrupted run.")
+    parser.add_argument("--qgis-prefix", default=QGIS_PREFIX_PATH, help="QGIS installation prefix.")
+    parser.add_argument("--qgis-plugins", default=QGIS_PLUGINS_PATH, help="Folder containing the processing plugin.")
+    parser.add_argument("--scratch", default=os.path.join(tempfile.gettempdir(), "pipeline_workers"), help="Root folder for worker scratch files.")
+    args = parser.parse_args()
+
+    sys.path.extend([args.qgis_plugins, MODULE_PATH])
+    tasks = pipeline_tasks(args.steps, args.provinces)
+    failed = run_dag(tasks, max_cores=args.cores, max_memory_gb=args.memory_gb, state_path=args.state, processes=True,
+                     initializer=init_qgis_worker,
+                     initargs=(args.qgis_prefix, args.qgis_plugins, [MODULE_PATH], args.scratch))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+import functools
+import glob
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from Pipeline_progress import progress_step, province_progress
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# Processing parameters holding input layers (counted for algorithm events)
+INPUT_PARAMETERS = ('INPUT', 'INPUT_2', 'OVERLAY', 'SOURCE', 'DESTINATION', 'LAYERS', 'MASK')
+
+# File extensions counted in pixels instead of features
+RASTER_EXTENSIONS = ('.tif', '.tiff', '.vrt', '.img', '.asc')
+
+# Seconds between two samples of the resident memory of the process (peak memory of the open events)
+RSS_SAMPLE_INTERVAL = 0.05
+
+# Folder of the trace files, None while tracing is disabled
+trace_folder = None
+
+# Province of the events recorded by this process
+current_province = None
+
+_local = threading.local()
+_lock = threading.Lock()
+
+# Events being recorded in this process (their peak memory is updated by the sampler thread)
+_open_events = set()
+_sampler = None
+
+
+# 1. Enable tracing
+def enable_trace(folder):
+    """
+    Enables the pipeline trace. Every traced helper and processing algorithm appends one JSON line to
+    '<folder>/trace_<pid>.jsonl' (one file per process, so parallel province workers never share a file).
+
+    Each line holds: name, kind ('province', 'helper' or 'algorithm'), parent, province, start (epoch seconds),
+    wall_s, cpu_s (CPU time of the calling thread, plus the worker threads running work submitted through
+    propagate_span), peak_rss_bytes (highest resident memory of the process while the event ran, sampled every
+    RSS_SAMPLE_INTERVAL seconds), rss_delta_bytes, read_bytes, written_bytes, input_counts, output_count (features
+    of vector layers, pixels of rasters), status, pid and thread (id of the recording thread).
+
+    Args:
+        folder (str): Folder where the trace files are written.
+
+    Returns:
+        str: Path of the trace file of this process.
+    """
+    global trace_folder
+    os.makedirs(folder, exist_ok=True)
+    trace_folder = folder
+    print(f"Pipeline trace enabled: {trace_file()}")
+    return trace_file()
+
+
+def trace_file():
+    """Returns the trace file of the current process."""
+    return os.path.join(trace_folder, f"trace_{os.getpid()}.jsonl")
+
+
+# 2. Measurements
+def _current_rss():
+    """Returns the resident memory of the current process in bytes, None when it cannot be read."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    if os.path.exists('/proc/self/statm'):
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    return None
+
+
+def _process_snapshot():
+    """Returns (rss, bytes read, bytes written) of the current process; unknown values are None."""
+    rss = _current_rss()
+    read_bytes = written_bytes = None
+    if psutil is not None:
+        try:
+            io = psutil.Process().io_counters()
+            read_bytes, written_bytes = io.read_bytes, io.write_bytes
+        except (AttributeError, psutil.Error):
+            pass
+    if read_bytes is None and os.path.exists('/proc/self/io'):
+        with open('/proc/self/io') as file:
+            io = dict(line.split(': ') for line in file.read().splitlines())
+        read_bytes, written_bytes = int(io['read_bytes']), int(io['write_bytes'])
+    return rss, read_bytes, written_bytes
+
+
+def _sample_rss():
+    """Sampler thread: raises the peak memory of every open event to the current resident memory."""
+    while True:
+        time.sleep(RSS_SAMPLE_INTERVAL)
+        rss = _current_rss()
+        with _lock:
+            for event in _open_events:
+                event.peak_rss = max(event.peak_rss, rss)
+
+
+def _watch_peak_rss(event, rss):
+    """Starts tracking the peak memory of an event (and the sampler thread of the process, once)."""
+    global _sampler
+    event.peak_rss = rss
+    with _lock:
+        _open_events.add(event)
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_rss, name='trace_rss_sampler', daemon=True)
+            _sampler.start()
+
+
+def count_elements(layer):
+    """
+    Counts the features of a vector layer or the pixels of a raster.
+
+    Args:
+        layer (str or QgsMapLayer): Path, layer name ('<path>|layername=<name>') or layer handle.
+
+    Returns:
+        int or None: Number of features or pixels, None when the layer cannot be opened.
+    """
+    if layer is None:
+        return None
+
+    from qgis.core import QgsMapLayer, QgsVectorLayer, QgsRasterLayer
+
+    if isinstance(layer, QgsMapLayer):
+        if isinstance(layer, QgsVectorLayer):
+            return layer.featureCount()
+        if isinstance(layer, QgsRasterLayer):
+            return layer.width() * layer.height() * layer.bandCount()
+        return None
+    if not isinstance(layer, str):
+        return None
+
+    path = layer.split('|')[0]
+    if not os.path.isfile(path):
+        return None
+    if path.lower().endswith(RASTER_EXTENSIONS):
+        from osgeo import gdal
+        dataset = gdal.Open(path)
+        return None if dataset is None else dataset.RasterXSize * dataset.RasterYSize * dataset.RasterCount
+    vector_layer = QgsVectorLayer(layer, 'count', 'ogr')
+    return vector_layer.featureCount() if vector_layer.isValid() else None
+
+
+def _input_counts(inputs):
+    counts = {}
+    for name, value in inputs:
+        values = value if isinstance(value, (list, tuple)) else list(value.values()) if isinstance(value, dict) else [value]
+        for index, item in enumerate(values):
+            count = count_elements(item)
+            if count is not None:
+                counts[name if len(values) == 1 else f"{name}[{index}]"] = count
+    return counts
+
+
+# 3. Events
+class TraceEvent:
+    """Measurements of one traced call; the caller sets output (and optionally status) before the event ends."""
+
+    def __init__(self, name, kind, inputs):
+        self.name = name
+        self.kind = kind
+        self.inputs = inputs
+        self.output = None
+        self.status = 'ok'
+        self.child_cpu = 0.0  # CPU seconds of worker threads running under this event
+        self.peak_rss = None  # Highest resident memory sampled while the event runs
+
+
+@contextmanager
+def trace_event(name, kind, inputs=()):
+    """
+    Records one traced call (a no-op while tracing is disabled).
+
+    Args:
+        name (str): Helper name or algorithm id.
+        kind (str): 'province', 'helper' or 'algorithm'.
+        inputs (iterable): (name, layer) pairs whose features or pixels are counted.
+
+    Yields:
+        TraceEvent: Event whose output is counted when the call ends.
+    """
+    event = TraceEvent(name, kind, inputs)
+    if trace_folder is None:
+        yield event
+        return
+
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    parent = stack[-1].name if stack else None
+    stack.append(event)
+
+    input_counts = _input_counts(inputs)
+    rss_before, read_before, written_before = _process_snapshot()
+    if rss_before is not None:
+        _watch_peak_rss(event, rss_before)
+    start = time.time()
+    # Thread CPU time: process CPU time would count the other threads running at the same time
+    wall_start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield event
+    except BaseException as error:
+        event.status = f"error: {type(error).__name__}"
+        raise
+    finally:
+        wall = time.perf_counter() - wall_start
+        rss_after, read_after, written_after = _process_snapshot()
+        with _lock:
+            cpu = time.thread_time() - cpu_start + event.child_cpu
+            _open_events.discard(event)
+            peak_rss = None if rss_after is None else max(event.peak_rss, rss_after)
+        stack.pop()
+
+        record = {
+            'name': name,
+            'kind': kind,
+            'parent': parent,
+            'province': current_province,
+            'pid': os.getpid(),
+            'thread': threading.get_ident(),
+            'start': start,
+            'wall_s': round(wall, 6),
+            'cpu_s': round(cpu, 6),
+            'peak_rss_bytes': peak_rss,
+            'rss_delta_bytes': None if rss_before is None else rss_after - rss_before,
+            'read_bytes': None if read_before is None else read_after - read_before,
+            'written_bytes': None if written_before is None else written_after - written_before,
+            'input_counts': input_counts,
+            'output_count': count_elements(event.output) if event.status in ('ok', 'cached') else None,
+            'status': event.status,
+        }
+        with _lock:
+            with open(trace_file(), 'a', encoding='utf-8') as file:
+                file.write(json.dumps(record) + '\n')
+
+
+def propagate_span(function):
+    """
+    Wraps a function submitted to a worker thread so that it runs under the innermost event of the submitting
+    thread: events recorded by the function get it as parent, and the thread CPU time of the function is added
+    to its cpu_s. Returns the function unchanged while tracing is disabled or outside any event.
+
+    Args:
+        function (callable): Function about to be submitted (e.g. to a ThreadPoolExecutor).
+
+    Returns:
+        callable: The wrapped function.
+    """
+    stack = getattr(_local, 'stack', None)
+    if trace_folder is None or not stack:
+        return function
+    parent = stack[-1]
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_local, 'stack', None)
+        _local.stack = [parent]
+        cpu_start = time.thread_time()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            with _lock:
+                parent.child_cpu += time.thread_time() - cpu_start
+            _local.stack = previous
+
+    return wrapper
+
+
+# 4. Decorators
+def traced(function):
+    """
+    Traces a helper: layer arguments are counted as inputs, the returned layer (or path) as output.
+
+    Arguments are counted when they are layer handles or files, either as given or relative to
+    a folder argument of the helper (e.g. base_output_path). Output name arguments are skipped.
+    Every call is also a step of the province progress (see Pipeline_progress).
+    """
+    signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with progress_step(function.__name__):
+            return _traced_call(*args, **kwargs)
+
+    def _traced_call(*args, **kwargs):
+        if trace_folder is None:
+            return function(*args, **kwargs)
+
+        arguments = signature.bind(*args, **kwargs).arguments
+        folders = [value for value in arguments.values() if isinstance(value, str) and os.path.isdir(value)]
+        inputs = []
+        for name, value in arguments.items():
+            if 'output' in name:
+                continue
+            if isinstance(value, str) and not os.path.isfile(value.split('|')[0]):
+                value = next((os.path.join(folder, value) for folder in folders
+                              if os.path.isfile(os.path.join(folder, value).split('|')[0])), None)
+            if value is not None and not isinstance(value, (int, float, bool)):
+                inputs.append((name, value))
+
+        with trace_event(function.__name__, 'helper', inputs) as event:
+            event.output = function(*args, **kwargs)
+        return event.output
+
+    return wrapper
+
+
+def traced_province(function):
+    """
+    Traces a per-province step function called as function(key, province, number, ...).
+
+    The province is attached to every event recorded during the call, and its progress is reported
+    when progress is enabled (see Pipeline_progress.enable_progress).
+    """
+    @functools.wraps(function)
+    def wrapper(key, province, number, *args, **kwargs):
+        global current_province
+        current_province = province
+        try:
+            with province_progress(function.__name__, province), trace_event(function.__name__, 'province'):
+                return function(key, province, number, *args, **kwargs)
+        finally:
+            current_province = None
+
+    return wrapper
+
+
+# 5. Chrome trace
+def export_chrome_trace(folder, output_path):
+    """
+    Merges the JSON-lines trace files of a folder into one Chrome trace (chrome://tracing, Perfetto).
+
+    Args:
+        folder (str): Folder with the trace_<pid>.jsonl files.
+        output_path (str): Path of the output .json file.
+
+    Returns:
+        int: Number of exported events.
+    """
+    events = []
+    threads = {}  # (pid, recording thread) -> thread id, one timeline row per thread
+    for path in sorted(glob.glob(os.path.join(folder, "trace_*.jsonl"))):
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                record = json.loads(line)
+                # Traces written before the thread was recorded get one row per province
+                thread = (record['pid'], record.get('thread', record['province'] or 'main'))
+                if thread not in threads:
+                    threads[thread] = len(threads) + 1
+                    events.append({'name': 'thread_name', 'ph': 'M', 'pid': record['pid'], 'tid': threads[thread],
+                                   'args': {'name': f"thread {threads[thread]}" if 'thread' in record else thread[1]}})
+                events.append({
+                    'name': record['name'],
+                    'cat': record['kind'],
+                    'ph': 'X',
+                    'ts': record['start'] * 1e6,
+                    'dur': record['wall_s'] * 1e6,
+                    'pid': record['pid'],
+                    'tid': threads[thread],
+                    'args': {key: value for key, value in record.items() if key not in ('name', 'kind', 'start', 'pid', 'thread')},
+                })
+
+    with open(output_path, 'w', encoding='utf-8') as file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+    print(f"Exported {len(events)} trace events to {output_path}")
+    return len(events)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert pipeline trace files to a Chrome trace.")
+    parser.add_argument("trace_folder", help="Folder with the trace_<pid>.jsonl files.")
+    parser.add_argument("output", help="Output Chrome trace (.json).")
+    args = parser.parse_args()
+    export_chrome_trace(args.trace_folder, args.output)
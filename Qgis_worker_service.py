@@ -0,0 +1,261 @@
+import argparse
+import importlib
+import os
+import queue
+import secrets
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client, answer_challenge, deliver_challenge
+
+from Parallel_province_runner import init_qgis_worker, MODULE_PATH, QGIS_PREFIX_PATH, QGIS_PLUGINS_PATH, STEPS
+
+
+# Local address of the worker service
+SERVICE_ADDRESS = ('127.0.0.1', 6011)
+
+# Environment variable holding the shared secret of the service connections
+AUTHKEY_VARIABLE = 'QGIS_WORKER_AUTHKEY'
+
+# File of the per-session secret, readable by the current user only, used when the variable is not set
+AUTHKEY_FILE = os.path.join(os.path.expanduser('~'), '.qgis_worker_service.key')
+
+# Seconds a client may take to send its job once connected
+JOB_RECEIVE_TIMEOUT = 60
+
+# GDAL block cache kept warm between jobs
+GDAL_CACHE_BYTES = 2 * 1024 ** 3
+
+# Module of the helpers called by name
+HELPER_MODULE = "Renewable_energy_optimum_location_function"
+
+# Prefix of the handles of in-memory layers kept by the service between jobs
+LAYER_HANDLE_PREFIX = "worker-layer:"
+
+# Modules whose functions jobs may call as '<module>:<function>' (the step scripts)
+STEP_MODULES = {module_name for module_name, _, _ in STEPS.values()}
+
+
+# 1. Shared secret
+def create_session_authkey(key_file=AUTHKEY_FILE):
+    """
+    Returns the secret of a service session: the QGIS_WORKER_AUTHKEY variable, or a new random secret written
+    to a file only the current user can read (replacing the secret of an earlier session).
+
+    Args:
+        key_file (str): File of the per-session secret.
+
+    Returns:
+        bytes: The secret.
+    """
+    if os.environ.get(AUTHKEY_VARIABLE):
+        return os.environ[AUTHKEY_VARIABLE].encode('utf-8')
+
+    authkey = secrets.token_hex(32)
+    if os.path.exists(key_file):
+        os.remove(key_file)
+    descriptor = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+        file.write(authkey)
+    print(f"Worker service secret written to {key_file}")
+    return authkey.encode('utf-8')
+
+
+def service_authkey(key_file=AUTHKEY_FILE):
+    """
+    Returns the secret of the running service: the QGIS_WORKER_AUTHKEY variable or the per-session secret file.
+
+    Args:
+        key_file (str): File of the per-session secret.
+
+    Returns:
+        bytes: The secret.
+    """
+    if os.environ.get(AUTHKEY_VARIABLE):
+        return os.environ[AUTHKEY_VARIABLE].encode('utf-8')
+    try:
+        with open(key_file, encoding='utf-8') as file:
+            authkey = file.read().strip()
+    except OSError:
+        authkey = ''
+    if not authkey:
+        raise RuntimeError(f"No worker service secret: set {AUTHKEY_VARIABLE} or start the service to create {key_file}")
+    return authkey.encode('utf-8')
+
+
+# 2. Service
+class QgisWorkerService:
+    """
+    Headless QGIS process that runs pipeline jobs sent by clients.
+
+    QgsApplication, the processing providers and the helper module are initialized once; jobs (a helper name,
+    or '<module>:<function>' for a step function, with its arguments) are queued and run one after the other
+    on the main thread, as QGIS requires. In-memory layers returned by a job are kept by the service and
+    returned as handles ('worker-layer:<n>') that later jobs can pass as arguments. Only clients knowing the
+    secret connect, and only helpers and the functions of the step scripts can be called.
+    """
+
+    def __init__(self, authkey, address=SERVICE_ADDRESS):
+        """
+        Args:
+            authkey (bytes): Shared secret of the connections (see create_session_authkey).
+            address (tuple): (host, port) the service listens on.
+        """
+        if not authkey:
+            raise ValueError("The worker service needs a secret")
+        self.address = address
+        self.authkey = authkey
+        self.jobs = queue.Queue()
+        self.layers = {}
+        self._next_handle = 1
+        self._running = True
+
+    def serve(self):
+        """Accepts connections in a background thread and runs the queued jobs until a 'shutdown' job arrives."""
+        from osgeo import gdal
+        gdal.SetCacheMax(GDAL_CACHE_BYTES)
+        helpers = importlib.import_module(HELPER_MODULE)
+
+        # The handshake is done per connection (see _receive), so a slow or wrong client never blocks the others
+        listener = Listener(self.address)
+        threading.Thread(target=self._accept, args=(listener,), daemon=True).start()
+        print(f"QGIS worker service listening on {self.address[0]}:{self.address[1]}")
+
+        while self._running:
+            connection, job = self.jobs.get()
+            start = time.perf_counter()
+            try:
+                response = {'status': 'ok', 'result': self._run(helpers, job)}
+            except Exception:
+                response = {'status': 'error', 'traceback': traceback.format_exc()}
+            response['seconds'] = time.perf_counter() - start
+            print(f"Job {job.get('function')}: {response['status']} in {response['seconds']:.1f} s")
+            try:
+                connection.send(response)
+            except (OSError, EOFError):
+                pass  # client gave up waiting
+            connection.close()
+
+        listener.close()
+        print("QGIS worker service stopped.")
+
+    def _accept(self, listener):
+        while self._running:
+            try:
+                connection = listener.accept()
+            except Exception as error:
+                print(f"Worker service: connection not accepted ({type(error).__name__}: {error})")
+                continue
+            threading.Thread(target=self._receive, args=(connection,), daemon=True).start()
+
+    def _receive(self, connection):
+        """Authenticates one connection and queues its job; failing clients are logged and dropped."""
+        try:
+            deliver_challenge(connection, self.authkey)
+            answer_challenge(connection, self.authkey)
+            if not connection.poll(JOB_RECEIVE_TIMEOUT):
+                raise TimeoutError(f"no job within {JOB_RECEIVE_TIMEOUT} s")
+            self.jobs.put((connection, connection.recv()))
+        except (AuthenticationError, OSError, EOFError) as error:
+            print(f"Worker service: connection dropped ({type(error).__name__}: {error})")
+            connection.close()
+
+    def _run(self, helpers, job):
+        function_name = job['function']
+        if function_name == 'shutdown':
+            self._running = False
+            return None
+        if function_name == 'release':
+            # Drops the kept in-memory layers
+            released = len(self.layers)
+            self.layers.clear()
+            return released
+
+        module_name, _, name = function_name.rpartition(':')
+        if name.startswith('_') or (module_name and module_name not in STEP_MODULES):
+            raise ValueError(f"Job function not allowed: {function_name}")
+        function = getattr(importlib.import_module(module_name) if module_name else helpers, name)
+
+        args = [self._resolve(value) for value in job.get('args', ())]
+        kwargs = {key: self._resolve(value) for key, value in job.get('kwargs', {}).items()}
+        return self._handle(function(*args, **kwargs))
+
+    def _resolve(self, value):
+        if isinstance(value, str) and value.startswith(LAYER_HANDLE_PREFIX):
+            return self.layers[value]
+        if isinstance(value, list):
+            return [self._resolve(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self._resolve(item) for key, item in value.items()}
+        return value
+
+    def _handle(self, result):
+        """Keeps results that cannot leave the process (layers) and returns their handle."""
+        if result is None or isinstance(result, (str, int, float, bool, list, tuple, dict)):
+            return result
+        handle = f"{LAYER_HANDLE_PREFIX}{self._next_handle}"
+        self._next_handle += 1
+        self.layers[handle] = result
+        return handle
+
+
+# 3. Client
+def submit_job(function, *args, address=SERVICE_ADDRESS, authkey=None, **kwargs):
+    """
+    Runs a helper (or '<module>:<function>') in the worker service and waits for its result.
+
+    Args:
+        function (str): Helper name (e.g. 'buffer'), '<module>:<function>', 'release' or 'shutdown'.
+        *args: Positional arguments of the function (layer handles returned by earlier jobs are accepted).
+        address (tuple): (host, port) of the service.
+        authkey (bytes, optional): Shared secret of the service (default: see service_authkey).
+        **kwargs: Keyword arguments of the function.
+
+    Returns:
+        The function result; in-memory layers are returned as 'worker-layer:<n>' handles.
+    """
+    connection = Client(address, authkey=authkey or service_authkey())
+    try:
+        connection.send({'function': function, 'args': list(args), 'kwargs': kwargs})
+        response = connection.recv()
+    finally:
+        connection.close()
+
+    if response['status'] != 'ok':
+        raise RuntimeError(f"Job {function} failed in the worker service:\n{response['traceback']}")
+    return response['result']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless QGIS worker service running pipeline jobs.")
+    parser.add_argument("--port", type=int, default=SERVICE_ADDRESS[1], help="Local port of the service.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Start the service.")
+    serve_parser.add_argument("--qgis-prefix", default=QGIS_PREFIX_PATH, help="QGIS installation prefix.")
+    serve_parser.add_argument("--qgis-plugins", default=QGIS_PLUGINS_PATH, help="Folder containing the processing plugin.")
+    serve_parser.add_argument("--scratch", default=os.path.join(tempfile.gettempdir(), "qgis_worker_service"))
+
+    run_parser = subparsers.add_parser("run", help="Run a job, e.g. 'Step_3_Solar_surface_radiation:process_province_data 14 mazowieckie 330'.")
+    run_parser.add_argument("function", help="Helper name or <module>:<function>.")
+    run_parser.add_argument("args", nargs="*", help="Positional arguments (strings).")
+
+    subparsers.add_parser("shutdown", help="Stop the service.")
+    args = parser.parse_args()
+
+    address = (SERVICE_ADDRESS[0], args.port)
+    if args.command == "serve":
+        authkey = create_session_authkey()
+        init_qgis_worker(args.qgis_prefix, args.qgis_plugins, [MODULE_PATH], args.scratch)
+        QgisWorkerService(authkey, address).serve()
+    elif args.command == "run":
+        print(submit_job(args.function, *args.args, address=address))
+    else:
+        submit_job("shutdown", address=address)
+
+
+if __name__ == "__main__":
+    main()
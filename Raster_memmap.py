@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from osgeo import gdal
+
+from Artifact_store import file_lock
+
+
+class RasterMemmapStore:
+    """
+    Store of raster band stacks as uncompressed .npy sidecars opened as NumPy memmaps.
+
+    A raster (or a list of single-band rasters on one grid) is decoded once, block by block, into a float32
+    (bands, rows, columns) array with nodata as NaN, next to a JSON file holding its geotransform and
+    projection. Later readers, in this or any other process, map the same file read-only: only the pages
+    they touch are read, and the operating system page cache is shared between processes instead of every
+    worker decoding its own copy. A sidecar is rebuilt when a source file changes (size or modification time);
+    it is built by one process while the others wait on its lock file ('<key>.lock').
+
+    Sidecars are meant for the national rasters, mapped once and read by window for every province. After a
+    build, sidecars superseded by a newer build of the same sources, sidecars not opened for max_age_days and
+    the least recently opened ones beyond max_bytes are removed.
+    """
+
+    def __init__(self, store_folder, block_rows=1024, max_bytes=50 * 1024 ** 3, max_age_days=30):
+        """
+        Args:
+            store_folder (str): Folder of the sidecar files.
+            block_rows (int): Rows decoded at a time when a sidecar is built.
+            max_bytes (int): Disk budget of the sidecars in bytes (default: 50 GB).
+            max_age_days (float): Sidecars not opened for this many days are removed (default: 30).
+        """
+        self.store_folder = store_folder
+        self.block_rows = block_rows
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        os.makedirs(store_folder, exist_ok=True)
+
+    def open(self, raster_paths):
+        """
+        Returns the memmap of a raster or of a stack of single-band rasters, building its sidecar if needed.
+
+        Args:
+            raster_paths (str or list): One raster (all its bands) or single-band rasters on one grid.
+
+        Returns:
+            tuple: (read-only float32 memmap of shape (bands, rows, columns), geotransform, projection WKT).
+        """
+        paths = [raster_paths] if isinstance(raster_paths, str) else list(raster_paths)
+        key = self.key(paths)
+        array_path = os.path.join(self.store_folder, f"{key}.npy")
+        metadata_path = os.path.join(self.store_folder, f"{key}.json")
+
+        if not (os.path.exists(array_path) and os.path.exists(metadata_path)):
+            # One process builds the sidecar, the others wait for it instead of building their own copy
+            with file_lock(os.path.join(self.store_folder, f"{key}.lock")):
+                built = not (os.path.exists(array_path) and os.path.exists(metadata_path))
+                if built:
+                    self._build(paths, array_path, metadata_path)
+            if built:
+                self.evict(keep=key)
+        else:
+            # The modification time of the metadata file is the last use of the sidecar
+            os.utime(metadata_path)
+
+        with open(metadata_path, encoding='utf-8') as file:
+            metadata = json.load(file)
+        return np.load(array_path, mmap_mode='r'), tuple(metadata['geotransform']), metadata['projection']
+
+    def key(self, paths):
+        """Content signature of the sources (absolute path, size and modification time of every file)."""
+        signatures = []
+        for path in paths:
+            stat = os.stat(path)
+            signatures.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+        return hashlib.sha256(json.dumps(signatures).encode('utf-8')).hexdigest()
+
+    def evict(self, keep=None):
+        """
+        Removes superseded sidecars, sidecars older than max_age_days, then least recently used sidecars until
+        the store fits max_bytes. Sidecars still mapped by a process that cannot be removed (Windows) are kept
+        until a later eviction.
+
+        Args:
+            keep (str, optional): Key of a sidecar never removed (the one being opened).
+
+        Returns:
+            int: Number of removed sidecars.
+        """
+        sidecars = []
+        for name in os.listdir(self.store_folder):
+            key, extension = os.path.splitext(name)
+            metadata_path = os.path.join(self.store_folder, name)
+            array_path = os.path.join(self.store_folder, f"{key}.npy")
+            if extension != '.json' or not os.path.exists(array_path):
+                continue
+            try:
+                with open(metadata_path, encoding='utf-8') as file:
+                    sources = json.load(file).get('sources')
+                sidecars.append((os.path.getmtime(metadata_path), os.path.getsize(array_path), key, json.dumps(sources)))
+            except (OSError, ValueError):
+                continue
+
+        # Most recently used first: a sidecar is superseded by a more recent one of the same sources
+        newest_of_sources = {}
+        removed = 0
+        oldest_allowed = time.time() - self.max_age_days * 24 * 3600
+        total_size = sum(size for _, size, _, _ in sidecars)
+        for last_used, size, key, sources in sorted(sidecars, reverse=True):
+            newest_of_sources.setdefault(sources, key)
+        for last_used, size, key, sources in sorted(sidecars):
+            superseded = newest_of_sources[sources] != key
+            if key == keep or not (superseded or last_used < oldest_allowed or total_size > self.max_bytes):
+                continue
+            try:
+                os.remove(os.path.join(self.store_folder, f"{key}.npy"))
+            except OSError:
+                continue
+            for extension in ('.json', '.lock'):
+                try:
+                    os.remove(os.path.join(self.store_folder, f"{key}{extension}"))
+                except OSError:
+                    pass
+            total_size -= size
+            removed += 1
+
+        if removed:
+            print(f"Raster memmap store: removed {removed} sidecars, {total_size / 1024 ** 3:.1f} GB in use.")
+        return removed
+
+    def _build(self, paths, array_path, metadata_path):
+        sources = []
+        for path in paths:
+            dataset = gdal.Open(path)
+            if dataset is None:
+                raise ValueError(f"Cannot open raster: {path}")
+            if sources and dataset.GetGeoTransform() != sources[0][0].GetGeoTransform():
+                raise ValueError(f"Raster {path} is not on the grid of {paths[0]}")
+            bands = range(1, dataset.RasterCount + 1) if len(paths) == 1 else [1]
+            sources.extend((dataset, band_number) for band_number in bands)
+
+        first = sources[0][0]
+        rows, columns = first.RasterYSize, first.RasterXSize
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.store_folder, suffix='.tmp.npy')
+        os.close(descriptor)
+        array = np.lib.format.open_memmap(temporary_path, mode='w+', dtype=np.float32, shape=(len(sources), rows, columns))
+        for band_index, (dataset, band_number) in enumerate(sources):
+            band = dataset.GetRasterBand(band_number)
+            nodata = band.GetNoDataValue()
+            for row in range(0, rows, self.block_rows):
+                block_rows = min(self.block_rows, rows - row)
+                block = band.ReadAsArray(0, row, columns, block_rows).astype(np.float32)
+                if nodata is not None:
+                    block[block == nodata] = np.nan
+                array[band_index, row:row + block_rows] = block
+        array.flush()
+        del array
+
+        metadata = {'geotransform': list(first.GetGeoTransform()), 'projection': first.GetProjection(), 'sources': [os.path.abspath(path) for path in paths]}
+        sources = first = dataset = None
+
+        # Readers in other processes only ever see complete files
+        os.replace(temporary_path, array_path)
+        descriptor, temporary_metadata = tempfile.mkstemp(dir=self.store_folder, suffix='.tmp')
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            json.dump(metadata, file)
+        os.replace(temporary_metadata, metadata_path)
+        print(f"Raster memmap built: {array_path}")
@@ -1,6 +1,54 @@
-from qgis.core import QgsApplication, QgsProcessingFeedback, QgsCoordinateReferenceSystem
+from qgis.core import QgsApplication, QgsProcessingFeedback, QgsCoordinateReferenceSystem, QgsProcessing, QgsMapLayer, \
+    QgsVectorLayer, QgsVectorFileWriter, QgsCoordinateTransform, QgsCoordinateTransformContext, QgsProject, QgsFeature, \
+    QgsField, QgsFields, QgsGeometry, QgsRectangle, QgsWkbTypes, QgsFeatureRequest, QgsSpatialIndex, QgsFeatureSource, \
+    QgsVectorLayerFeatureSource, QgsGeometryParameters
+from qgis.PyQt.QtCore import QVariant
+from osgeo import gdal, ogr
+import numpy as np
 import processing
 import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from Step_cache import StepCache
+from Artifact_store import ArtifactStore
+from Window_index import WindowIndex, pixel_window
+from Raster_memmap import RasterMemmapStore
+from Pipeline_trace import traced, traced_province, trace_event, enable_trace, propagate_span, INPUT_PARAMETERS
+from Parallel_province_runner import thread_budget
+from Pipeline_progress import progress_step, report_step_progress, check_canceled, enable_progress, cancel_pipeline, \
+    PipelineCanceled
+
+
+# Output value that keeps a helper result in memory instead of writing it to disk
+TEMPORARY_OUTPUT = QgsProcessing.TEMPORARY_OUTPUT
+
+
+# Aspect classes (degrees, exclusive bounds) of southern, southeast and southwest terrain exposures
+ASPECT_RANGES = ((215, 315),)
+
+# Nodata value of the uint8 aspect class mask (classes are 0 and 1)
+ASPECT_MASK_NODATA = 255
+
+# Subpixels per raster pixel side used to measure the area of a pixel covered by a site (zonal statistics)
+COVERAGE_SUBPIXELS = 8
+
+
+# Content-hash cache of processing steps, disabled until enable_step_cache is called
+step_cache = None
+
+# Named intermediate layers shared by the steps, disabled until enable_artifact_store is called
+artifact_store = None
+
+# Persisted province windows of raster grids, disabled until enable_window_index is called
+window_index = None
+
+# Memory-mapped .npy sidecars of raster band stacks, disabled until enable_raster_memmap is called
+raster_memmap_store = None
+
+# Precision grid (layer units) of the overlay operations, disabled (full precision) until enable_precision_grid is called
+overlay_grid_size = None
 
 
 # create a folder
@@ -20,32 +68,373 @@ def create_directory_if_not_exists(directory_path):
 
 
 
+# Resolve a layer argument
+def resolve_layer(base_path, layer):
+    """
+    Resolves a layer argument of a helper into a value accepted by processing.run.
+
+    File names are joined with base_path. In-memory layer handles (QgsMapLayer objects and 'memory:' URIs)
+    and TEMPORARY_OUTPUT are returned unchanged, so helpers can be chained without a shapefile round-trip.
+
+    Args:
+        base_path (str): Directory used for file names.
+        layer (str or QgsMapLayer): File name, path, layer handle or TEMPORARY_OUTPUT.
+
+    Returns:
+        str or QgsMapLayer: The value to pass as an INPUT or OUTPUT parameter.
+    """
+    if isinstance(layer, QgsMapLayer):
+        return layer
+    if layer == TEMPORARY_OUTPUT or layer.startswith('memory:'):
+        return layer
+    return os.path.join(base_path, layer)
+
+
+
+# Layers inside a GeoPackage
+def geopackage_layer(geopackage_path, layer_name):
+    """
+    Returns the name of a layer inside a GeoPackage, usable as input and output name of every vector helper.
+
+    Writing several layers of a province into one GeoPackage avoids dozens of shapefiles with sidecar files,
+    the 10-character field name limit and the 2 GB size limit. Layers are written with a spatial index.
+
+    Args:
+        geopackage_path (str): Path (or file name relative to base_output_path) of the GeoPackage, e.g. 'mazowieckie.gpkg'.
+        layer_name (str): Name of the layer inside the GeoPackage.
+
+    Returns:
+        str: Layer name in the form '<geopackage_path>|layername=<layer_name>'.
+    """
+    return f"{geopackage_path}|layername={layer_name}"
+
+
+
+def split_layer_uri(layer):
+    """
+    Splits a layer name of the form '<path>|layername=<name>' into the file path and the layer name.
+
+    Args:
+        layer (str): Layer name or file path.
+
+    Returns:
+        tuple: (file path, layer name), the layer name is None for plain file paths.
+    """
+    path, separator, options = layer.partition('|')
+    if not separator:
+        return layer, None
+    for option in options.split('|'):
+        if option.startswith('layername='):
+            return path, option[len('layername='):]
+    return path, None
+
+
+
+def processing_output(output):
+    """
+    Converts an output layer name into the OUTPUT value expected by processing.run.
+
+    Layers inside a GeoPackage are passed as an 'ogr:' destination, so processing adds (or replaces) the layer
+    in an existing GeoPackage instead of overwriting the file.
+
+    Args:
+        output (str or QgsMapLayer): Output path, GeoPackage layer name or TEMPORARY_OUTPUT.
+
+    Returns:
+        str: The value to pass as OUTPUT parameter.
+    """
+    if not isinstance(output, str):
+        return output
+    path, layer_name = split_layer_uri(output)
+    if layer_name is None:
+        return output
+    return f"ogr:dbname='{path}' table=\"{layer_name}\" (geom)"
+
+
+
+# Open a layer argument
+def open_vector_layer(base_path, layer):
+    """
+    Returns a QgsVectorLayer for a helper layer argument (file name, path or layer handle).
+
+    Parameters:
+    - base_path (str): Directory used for file names.
+    - layer (str or QgsVectorLayer): File name, path or layer handle.
+
+    Returns:
+    QgsVectorLayer: The opened layer.
+    """
+    if isinstance(layer, QgsVectorLayer):
+        return layer
+    path = resolve_layer(base_path, layer)
+    vector_layer = QgsVectorLayer(path, os.path.splitext(os.path.basename(path))[0], "ogr")
+    if not vector_layer.isValid():
+        raise ValueError(f"Cannot open vector layer: {path}")
+    return vector_layer
+
+
+
+# Write features to a new layer
+def write_vector_layer(base_output_path, output_file_name, fields, wkb_type, crs, features):
+    """
+    Writes features to a new vector file, a GeoPackage layer or a memory layer for TEMPORARY_OUTPUT.
+
+    Parameters:
+    - base_output_path (str): The base directory of the output file.
+    - output_file_name (str): The name of the output file, a GeoPackage layer (see geopackage_layer) or TEMPORARY_OUTPUT.
+    - fields (QgsFields): Fields of the output layer.
+    - wkb_type (QgsWkbTypes.Type): Geometry type of the output layer.
+    - crs (QgsCoordinateReferenceSystem): CRS of the output layer.
+    - features (iterable): QgsFeature objects with the given fields.
+
+    Returns:
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
+    """
+    output_path = resolve_layer(base_output_path, output_file_name)
+
+    if output_path == TEMPORARY_OUTPUT:
+        output_layer = QgsVectorLayer(f"{QgsWkbTypes.displayString(wkb_type)}?crs={crs.authid()}", "output", "memory")
+        output_layer.dataProvider().addAttributes(fields.toList())
+        output_layer.updateFields()
+        output_layer.dataProvider().addFeatures(list(features))
+        return output_layer
+
+    file_path, layer_name = split_layer_uri(output_path)
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = QgsVectorFileWriter.driverForExtension(os.path.splitext(file_path)[1])
+    if layer_name is not None:
+        # Add (or replace) one layer of a GeoPackage, keeping the other layers
+        options.layerName = layer_name
+        options.layerOptions = ['SPATIAL_INDEX=YES']
+        if os.path.exists(file_path):
+            options.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteLayer
+    writer = QgsVectorFileWriter.create(file_path, fields, wkb_type, crs, QgsCoordinateTransformContext(), options)
+    if writer.hasError() != QgsVectorFileWriter.NoError:
+        raise IOError(f"Cannot write {output_path}: {writer.errorMessage()}")
+    for feature in features:
+        writer.addFeature(feature)
+    del writer  # flushes and closes the file
+    return output_path
+
+
+
+# Enable the step cache
+def enable_step_cache(cache_folder, max_bytes=50 * 1024 ** 3, max_age_days=30):
+    """
+    Enables reuse of unchanged processing steps between runs.
+
+    Every helper runs its algorithms through run_algorithm. With the cache enabled, a step whose algorithm id,
+    parameters and input file contents match a previous run restores the stored output instead of running again.
+
+    Args:
+        cache_folder (str): Folder where cached outputs are stored.
+        max_bytes (int): Disk budget of the cache in bytes (default: 50 GB).
+        max_age_days (float): Entries not used for this many days are removed (default: 30).
+
+    Returns:
+        StepCache: The enabled cache.
+    """
+    global step_cache
+    step_cache = StepCache(cache_folder, max_bytes=max_bytes, max_age_days=max_age_days)
+    print(f"Step cache enabled: {cache_folder}")
+    return step_cache
+
+
+
+# Enable the shared artifact store
+def enable_artifact_store(store_folder):
+    """
+    Enables sharing of named intermediate layers (merged land cover, medium-voltage lines, buffered mask)
+    between the steps: each artifact is produced once per province and reused until its inputs change.
+
+    Args:
+        store_folder (str): Folder holding one artifact GeoPackage per province (the same for all steps).
+
+    Returns:
+        ArtifactStore: The enabled store.
+    """
+    global artifact_store
+    artifact_store = ArtifactStore(store_folder)
+    print(f"Artifact store enabled: {store_folder}")
+    return artifact_store
+
+
+
+# Enable the province window index
+def enable_window_index(index_path):
+    """
+    Enables windowed reads of national rasters: monthly_zonal_statistics with a window_mask (Steps 3 and 4)
+    reads only the pixel window covering the province mask, looked up in (or added to) a persisted index of
+    province bounding boxes and windows. clip_monthly_stack uses the same windows.
+
+    Args:
+        index_path (str): Path of the JSON index file (shared by the steps and kept between runs).
+
+    Returns:
+        WindowIndex: The enabled index.
+    """
+    global window_index
+    window_index = WindowIndex(index_path)
+    print(f"Province window index enabled: {index_path}")
+    return window_index
+
+
+
+# Enable memory-mapped raster reads
+def enable_raster_memmap(store_folder, max_bytes=50 * 1024 ** 3, max_age_days=30):
+    """
+    Enables memory-mapped raster reads: read_band_stack decodes a raster stack once into an uncompressed .npy
+    sidecar and maps it read-only, so repeated readers (and other worker processes) page in only the pixels
+    they use instead of decoding whole rasters into memory. Pass the national rasters with a window mask to
+    share one sidecar between all provinces.
+
+    Args:
+        store_folder (str): Folder of the sidecar files (shared by the workers).
+        max_bytes (int): Disk budget of the sidecars in bytes (default: 50 GB).
+        max_age_days (float): Sidecars not opened for this many days are removed (default: 30).
+
+    Returns:
+        RasterMemmapStore: The enabled store.
+    """
+    global raster_memmap_store
+    raster_memmap_store = RasterMemmapStore(store_folder, max_bytes=max_bytes, max_age_days=max_age_days)
+    print(f"Raster memmap store enabled: {store_folder}")
+    return raster_memmap_store
+
+
+
+# Enable the precision grid of overlays
+def enable_precision_grid(grid_size=0.01):
+    """
+    Enables a pipeline-wide precision model for the overlay helpers (intersection, difference and the
+    monthly joins): vertices are snapped to a grid of this size and parts collapsing on the grid (slivers of
+    polygonized rasters) are dropped, so the overlays run faster and produce no degenerate geometries.
+
+    Args:
+        grid_size (float): Grid size in layer units, e.g. 0.01 (1 cm) or 0.1 (10 cm) in EPSG:2180.
+
+    Returns:
+        float: The enabled grid size.
+    """
+    global overlay_grid_size
+    overlay_grid_size = grid_size
+    print(f"Overlay precision grid enabled: {grid_size}")
+    return overlay_grid_size
+
+
+
+# Snap a geometry to the precision grid
+def snap_to_precision_grid(geometry):
+    """
+    Snaps the vertices of a polygon geometry to the overlay precision grid (see enable_precision_grid).
+
+    Args:
+        geometry (QgsGeometry): Polygon geometry.
+
+    Returns:
+        QgsGeometry or None: The snapped geometry (unchanged without a grid), or None when it collapses
+        to less than one grid cell.
+    """
+    if overlay_grid_size is None:
+        return geometry
+    snapped = geometry.snappedToGrid(overlay_grid_size, overlay_grid_size)
+    if snapped.isEmpty() or snapped.area() < overlay_grid_size ** 2:
+        return None
+    return snapped
+
+
+
+# Bounding box of a mask layer
+def mask_bounding_box(mask_layer, projection):
+    """
+    Returns the bounding box of a mask layer in the CRS given as WKT.
+
+    Args:
+        mask_layer (str or QgsVectorLayer): Mask file, GeoPackage layer or layer handle.
+        projection (str): WKT of the target CRS.
+
+    Returns:
+        list: [xmin, ymin, xmax, ymax].
+    """
+    layer = open_vector_layer("", mask_layer)
+    extent = layer.extent()
+    target_crs = QgsCoordinateReferenceSystem.fromWkt(projection)
+    if target_crs.isValid() and target_crs != layer.crs():
+        extent = QgsCoordinateTransform(layer.crs(), target_crs, QgsProject.instance()).transformBoundingBox(extent)
+    return [extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()]
+
+
+
+# Run a processing algorithm
+def run_algorithm(algorithm_id, parameters):
+    """
+    Runs a processing algorithm, reusing the cached output of an unchanged step when the step cache is enabled.
+    The run is recorded in the pipeline trace when tracing is enabled (see Pipeline_trace.enable_trace).
+    With progress enabled (see Pipeline_progress.enable_progress) the algorithm reports its progress through
+    a QgsProcessingFeedback and stops when the pipeline is canceled (raising PipelineCanceled).
+
+    An OUTPUT given as a GeoPackage layer (see geopackage_layer) is written as a layer of that GeoPackage.
+
+    Args:
+        algorithm_id (str): Processing algorithm id (e.g. 'native:buffer').
+        parameters (dict): Algorithm parameters.
+
+    Returns:
+        dict: The algorithm results, as returned by processing.run.
+    """
+    inputs = [(name, parameters[name]) for name in INPUT_PARAMETERS if name in parameters]
+    with progress_step(algorithm_id, algorithm=True) as feedback, trace_event(algorithm_id, 'algorithm', inputs) as event:
+        key = step_cache.key(algorithm_id, parameters) if step_cache is not None else None
+        if key is not None and step_cache.restore(key, parameters['OUTPUT']):
+            print(f"{algorithm_id}: unchanged, reused cached output {parameters['OUTPUT']}")
+            event.status, event.output = 'cached', parameters['OUTPUT']
+            return {'OUTPUT': parameters['OUTPUT']}
+
+        output = parameters.get('OUTPUT')
+        result = processing.run(algorithm_id, dict(parameters, OUTPUT=processing_output(output)) if 'OUTPUT' in parameters else parameters,
+                                feedback=feedback)
+        if feedback is not None and feedback.isCanceled():
+            raise PipelineCanceled(f"{algorithm_id} canceled")
+
+        if isinstance(output, str) and split_layer_uri(output)[1] is not None:
+            # Return the GeoPackage layer name, so the result can be passed straight to the next helper
+            result['OUTPUT'] = output
+        if key is not None:
+            step_cache.store(key, result['OUTPUT'], algorithm_id=algorithm_id)
+        event.output = result.get('OUTPUT')
+        return result
+
+
+
 # 1. Merge data
+@traced
 def merge_vector_layers(layer_paths, base_output_path, output_file_name, crs='EPSG:2180'):
     """
     Merges multiple vector layers into a single layer.
 
     Args:
-        layer_paths (list): A list of paths to the vector layers to merge.
+        layer_paths (list): A list of paths (or layer handles) of the vector layers to merge.
         base_output_path (str): Directory where the merged file will be saved.
-        output_file_name (str): The name of the output merged file.
+        output_file_name (str): The name of the output merged file, or TEMPORARY_OUTPUT.
         crs (str): The Coordinate Reference System (default: 'EPSG:2180').
 
     Returns:
-        None: Prints a message indicating the success of the merge operation.
+        str or QgsVectorLayer: The merged file path, or the in-memory layer for TEMPORARY_OUTPUT.
     """
-    output_path_1 = os.path.join(base_output_path, output_file_name)
-    processing.run("native:mergevectorlayers", {
-        'LAYERS': [layer_paths],
+    output_path_1 = resolve_layer(base_output_path, output_file_name)
+    result = run_algorithm("native:mergevectorlayers", {
+        'LAYERS': layer_paths,
         'CRS': QgsCoordinateReferenceSystem(crs),
         'OUTPUT': output_path_1
     })
 
     print(f'Layers successfully merged. Resulting file saved at: {output_path_1}')
+    return result['OUTPUT']
 
 
 
 # 2. Mask of sunlight data
+@traced
 def process_sunlight_data(months, input_folder, output_folder, mask_shapefile):
     """
     Processes monthly sunlight data by clipping raster files using a shapefile mask.
@@ -54,7 +443,7 @@ def process_sunlight_data(months, input_folder, output_folder, mask_shapefile):
         months (list): A list of month identifiers (e.g., ['jan', 'feb']).
         input_folder (str): The folder where input raster files are located.
         output_folder (str): The folder where output clipped raster files will be saved.
-        mask_shapefile (str): Path to the shapefile used for clipping the rasters.
+        mask_shapefile (str or QgsVectorLayer): Path to the shapefile (or layer handle) used for clipping the rasters.
 
     Returns:
         None: Prints a message indicating the completion of the processing.
@@ -64,7 +453,7 @@ def process_sunlight_data(months, input_folder, output_folder, mask_shapefile):
         input_file = f"{input_folder}/map_{month}.tif"
         output_file = f"{output_folder}/MAP_{month.upper()}_CLIPPED.tif"
 
-        processing.run("gdal:cliprasterbymasklayer", {
+        run_algorithm("gdal:cliprasterbymasklayer", {
             'INPUT': input_file,
             'MASK': mask_shapefile,
             'OUTPUT': output_file
@@ -73,9 +462,76 @@ def process_sunlight_data(months, input_folder, output_folder, mask_shapefile):
     print("Process_sunlight_data completed.")
 
 
+# 2a. Mask of the monthly stack
+@traced
+def clip_monthly_stack(months, input_folder, output_path, mask_shapefile, exact_mask=True):
+    """
+    Clips the monthly rasters of one variable with a mask in a single pass, into one multi-band raster.
+
+    Not used by the steps, which read the national rasters by window instead (monthly_zonal_statistics with a
+    window_mask); kept for writing a clipped stack to disk and measured by Benchmark_pipeline.py.
+
+    The map_{month}.tif files are stacked into a VRT (one band per month, in the order of months, band
+    descriptions set to the month names) and the stack is clipped once, so the mask is rasterized and the
+    sources are scanned once instead of once per month. Band n of the output holds months[n - 1].
+
+    With the window index enabled (see enable_window_index), only the pixel window around the mask is read.
+    Without exact_mask the window is written as is (pixels outside the polygon keep their values), which is
+    enough for consumers that overlay their own polygons, such as monthly_zonal_statistics.
+
+    Args:
+        months (list): A list of month identifiers (e.g., ['january', 'february']).
+        input_folder (str): The folder where the map_{month}.tif rasters are located.
+        output_path (str): Path of the clipped multi-band raster (e.g., '.../CLIP_RADIATION/mazowieckie_monthly.tif').
+        mask_shapefile (str or QgsVectorLayer): Path to the shapefile (or layer handle) used for clipping.
+        exact_mask (bool): Set the pixels outside the mask polygon to nodata (default: True).
+
+    Returns:
+        str: The path of the clipped multi-band raster.
+    """
+    create_directory_if_not_exists(os.path.dirname(output_path))
+    source_paths = [f"{input_folder}/map_{month}.tif" for month in months]
+
+    stack_path = os.path.splitext(output_path)[0] + "_stack.vrt"
+    stack = gdal.BuildVRT(stack_path, source_paths, separate=True)
+    if stack is None:
+        raise ValueError(f"Cannot stack the monthly rasters of {input_folder}")
+    for band_number, month in enumerate(months, start=1):
+        stack.GetRasterBand(band_number).SetDescription(month)
+    # The VRT only references its sources; their signatures make the step cache see changed sources
+    source_signatures = ';'.join(f"{os.path.getsize(path)}:{os.path.getmtime(path)}" for path in source_paths)
+    stack.SetMetadataItem('SOURCE_SIGNATURES', source_signatures)
+    stack = None
+
+    if window_index is not None:
+        # Read only the window of the province (plus one pixel) instead of the whole national raster
+        window = raster_window(stack_path, mask_shapefile)
+        window_path = os.path.splitext(output_path)[0] + "_window.vrt"
+        windowed = gdal.Translate(window_path, stack_path, format='VRT', srcWin=window)
+        windowed.SetMetadataItem('SOURCE_SIGNATURES', source_signatures)
+        windowed = None
+        stack_path = window_path
+
+    if exact_mask:
+        result = run_algorithm("gdal:cliprasterbymasklayer", {
+            'INPUT': stack_path,
+            'MASK': mask_shapefile,
+            'OUTPUT': output_path
+        })
+    else:
+        result = run_algorithm("gdal:translate", {
+            'INPUT': stack_path,
+            'OUTPUT': output_path
+        })
+
+    print(f"Monthly stack of {len(months)} bands clipped: {output_path}")
+    return result['OUTPUT']
+
+
 
 # 3 Terrain aspect
-def calculate_terrain_aspect(input_folder, input_file_name, output_folder, output_file_name):
+@traced
+def calculate_terrain_aspect(input_folder, input_file_name, output_folder, output_file_name, tile_size=None, workers=None):
     """
     Calculates the aspect (orientation) of terrain from a raster file and saves the result.
 
@@ -84,25 +540,182 @@ def calculate_terrain_aspect(input_folder, input_file_name, output_folder, outpu
         input_file_name (str): The name of the input raster file.
         output_folder (str): The folder where the output aspect file will be saved.
         output_file_name (str): The name of the output aspect file.
+        tile_size (int, optional): Compute the aspect in tiles of tile_size x tile_size pixels in parallel
+            (see tiled_terrain_aspect). By default the whole raster is passed to gdal:aspect.
+        workers (int, optional): Number of parallel tiles in tiled mode (default: the thread budget of the process).
 
     Returns:
-        None: Prints a message indicating the completion of the aspect calculation.
+        str: The path of the output aspect file.
     """
     input_path = os.path.join(input_folder, input_file_name)
     create_directory_if_not_exists(output_folder)
     output_path = os.path.join(output_folder, output_file_name)
 
-    processing.run("gdal:aspect", {
+    if tile_size is not None:
+        return tiled_terrain_aspect(input_path, output_path, tile_size=tile_size, workers=workers)
+
+    result = run_algorithm("gdal:aspect", {
         'INPUT': input_path,
         'OUTPUT': output_path
     })
 
     print("Terrain aspect calculation completed.")
+    return result['OUTPUT']
+
+
+def _aspect_tile(input_path, window, core):
+    """Computes the aspect of one DEM window (tile with its halo) and returns the core pixels and their nodata value."""
+    source = gdal.Translate('', input_path, format='VRT', srcWin=list(window))
+    aspect = gdal.DEMProcessing('', source, 'aspect', format='MEM')
+    band = aspect.GetRasterBand(1)
+    values = band.ReadAsArray(*core)
+    nodata = band.GetNoDataValue()
+    aspect = None
+    source = None
+    return values, nodata
+
+
+# 3a Tiled terrain aspect
+@traced
+def tiled_terrain_aspect(input_path, output_path, tile_size=4096, workers=None):
+    """
+    Calculates the terrain aspect of a large DEM tile by tile, in parallel.
+
+    Every tile is read with a one-pixel halo, so the 3x3 aspect kernel sees the same neighbours as in a single
+    gdal:aspect run and the stitched result has no seams; the halo is cropped before writing. Tiles are computed
+    by gdal.DEMProcessing (same algorithm as gdal:aspect) in worker threads and written to a tiled, compressed
+    GeoTIFF. At most two tiles per worker are held in memory, whatever the size of the DEM.
+
+    Args:
+        input_path (str): The path to the DEM.
+        output_path (str): The path of the output aspect raster.
+        tile_size (int): Tile size in pixels, without the halo.
+        workers (int, optional): Number of worker threads (default: the thread budget of the process).
+
+    Returns:
+        str: The path of the output aspect raster.
+    """
+    source = gdal.Open(input_path)
+    if source is None:
+        raise ValueError(f"Cannot open raster: {input_path}")
+    columns, rows = source.RasterXSize, source.RasterYSize
+
+    target = gdal.GetDriverByName('GTiff').Create(output_path, columns, rows, 1, gdal.GDT_Float32,
+                                                  options=['TILED=YES', 'COMPRESS=DEFLATE', 'PREDICTOR=3', 'BIGTIFF=IF_SAFER'])
+    target.SetGeoTransform(source.GetGeoTransform())
+    target.SetProjection(source.GetProjection())
+    target_band = target.GetRasterBand(1)
+    source = None
+
+    # (window with halo, core pixels inside the window, position of the core in the output)
+    tiles = []
+    for row in range(0, rows, tile_size):
+        for column in range(0, columns, tile_size):
+            core_columns, core_rows = min(tile_size, columns - column), min(tile_size, rows - row)
+            window_column, window_row = max(column - 1, 0), max(row - 1, 0)
+            window_columns = min(column + core_columns + 1, columns) - window_column
+            window_rows = min(row + core_rows + 1, rows) - window_row
+            tiles.append(((window_column, window_row, window_columns, window_rows),
+                          (column - window_column, row - window_row, core_columns, core_rows),
+                          (column, row)))
+
+    workers = workers or thread_budget()
+    pending = {}
+
+    def write_tile(future):
+        # Only this thread writes to the output, GDAL datasets are not thread-safe
+        values, nodata = future.result()
+        if nodata is not None and target_band.GetNoDataValue() is None:
+            target_band.SetNoDataValue(nodata)
+        target_band.WriteArray(values, *pending.pop(future))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for tile_number, (window, core, position) in enumerate(tiles):
+            report_step_progress(tile_number, len(tiles))
+            # Bounded number of tiles in flight keeps the memory use independent of the DEM size
+            if len(pending) >= 2 * workers:
+                completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    write_tile(future)
+            pending[executor.submit(propagate_span(_aspect_tile), input_path, window, core)] = position
+
+        for future in list(pending):
+            write_tile(future)
+
+    target_band.FlushCache()
+    target = None
+
+    print(f"Tiled terrain aspect calculation completed ({len(tiles)} tiles, {workers} workers).")
+    return output_path
+
+
+
+# 4a Classify terrain aspect
+@traced
+def classify_aspect(raster_input, output_raster, aspect_ranges=ASPECT_RANGES, block_size=2048):
+    """
+    Classifies an aspect raster into a compact uint8 mask (1 inside the aspect ranges, 0 outside), block by block.
+
+    The aspect raster is read in windows of block_size x block_size pixels, so memory use does not depend on
+    the raster size. Nodata pixels of the aspect raster stay nodata (ASPECT_MASK_NODATA) in the mask.
+
+    Args:
+        raster_input (str): The path to the aspect raster (e.g. the gdal:aspect output).
+        output_raster (str): The path of the output mask (GeoTIFF, tiled and compressed).
+        aspect_ranges (tuple): (low, high) aspect ranges in degrees, bounds excluded. A range with low > high
+            wraps through north, e.g. (315, 45).
+        block_size (int): Window size in pixels.
+
+    Returns:
+        str: The path of the output mask.
+    """
+    source = gdal.Open(raster_input)
+    if source is None:
+        raise ValueError(f"Cannot open raster: {raster_input}")
+    source_band = source.GetRasterBand(1)
+    nodata = source_band.GetNoDataValue()
+    columns, rows = source.RasterXSize, source.RasterYSize
+
+    target = gdal.GetDriverByName('GTiff').Create(output_raster, columns, rows, 1, gdal.GDT_Byte,
+                                                  options=['TILED=YES', 'COMPRESS=DEFLATE', 'BIGTIFF=IF_SAFER'])
+    target.SetGeoTransform(source.GetGeoTransform())
+    target.SetProjection(source.GetProjection())
+    target_band = target.GetRasterBand(1)
+    target_band.SetNoDataValue(ASPECT_MASK_NODATA)
+
+    for row in range(0, rows, block_size):
+        report_step_progress(row, rows)
+        window_rows = min(block_size, rows - row)
+        for column in range(0, columns, block_size):
+            window_columns = min(block_size, columns - column)
+            aspect = source_band.ReadAsArray(column, row, window_columns, window_rows)
+
+            inside = np.zeros(aspect.shape, dtype=bool)
+            for low, high in aspect_ranges:
+                if low <= high:
+                    inside |= (aspect > low) & (aspect < high)
+                else:
+                    inside |= (aspect > low) | (aspect < high)
+
+            mask = inside.astype(np.uint8)
+            missing = np.isnan(aspect) if np.issubdtype(aspect.dtype, np.floating) else np.zeros(aspect.shape, dtype=bool)
+            if nodata is not None:
+                missing |= aspect == nodata
+            mask[missing] = ASPECT_MASK_NODATA
+
+            target_band.WriteArray(mask, column, row)
+
+    target_band.FlushCache()
+    target = None
+    source = None
+    return output_raster
 
 
 
 # 4 Convert terrain aspect to vector data
-def raster_to_vector_conversion(raster_input, output_folder_raster, output_raster_filename, output_vector_folder, output_vector_file):
+@traced
+def raster_to_vector_conversion(raster_input, output_folder_raster, output_raster_filename, output_vector_folder, output_vector_file,
+                                aspect_ranges=ASPECT_RANGES):
     """
     Converts a raster file, based on specific terrain exposure conditions, into a vector file.
 
@@ -111,10 +724,11 @@ def raster_to_vector_conversion(raster_input, output_folder_raster, output_raste
         output_folder_raster (str): Directory to save the processed raster file.
         output_raster_filename (str): Name of the output raster file.
         output_vector_folder (str): Directory to save the output vector file.
-        output_vector_file (str): Name of the output vector file.
+        output_vector_file (str): Name of the output vector file, or TEMPORARY_OUTPUT.
+        aspect_ranges (tuple): (low, high) aspect ranges in degrees classified as 1 (default: ASPECT_RANGES).
 
     Returns:
-        None: Prints a message when the conversion is complete.
+        str: The path of the output vector file.
     """
     # Ensure output directories exist
     for folder in [output_folder_raster, output_vector_folder]:
@@ -123,30 +737,25 @@ def raster_to_vector_conversion(raster_input, output_folder_raster, output_raste
     # Full path to the output raster file
     output_raster = os.path.join(output_folder_raster, output_raster_filename)
 
-    # Condition for southern, southeast, and southwest terrain exposures
-    expression = '(\"{0}@1\" > 215 AND \"{0}@1\" < 315) * 1 + (\"{0}@1\" <= 215 OR \"{0}@1\" >= 315) * 0'.format(raster_input)
-
-    # Execute raster calculator
-    processing.run("qgis:rastercalculator", {
-        'EXPRESSION': expression,
-        'LAYERS': [raster_input],
-        'OUTPUT': output_raster
-    })
+    # Classify the exposures into a uint8 mask (1 = exposure in aspect_ranges, 0 = other, nodata preserved)
+    classify_aspect(raster_input, output_raster, aspect_ranges=aspect_ranges)
 
     # Full path to the output vector file
-    output_vector = os.path.join(output_vector_folder, output_vector_file)
+    output_vector = resolve_layer(output_vector_folder, output_vector_file)
 
     # Convert TIF to vector
-    processing.run("gdal:polygonize", {
+    result = run_algorithm("gdal:polygonize", {
         'INPUT': output_raster,
         'OUTPUT': output_vector
     })
 
     print("Raster to vector conversion completed.")
+    return result['OUTPUT']
 
 
 
 # 5. Filter by balue
+@traced
 def filter_values_condition_1(filter_value, base_input_path, input_filename, base_output_path, output_file):
     """
     Filters raster data based on a specific condition and saves the result.
@@ -154,121 +763,44 @@ def filter_values_condition_1(filter_value, base_input_path, input_filename, bas
     Args:
         filter_value (str): Expression to filter values by.
         base_input_path (str): Directory containing the input file.
-        input_filename (str): Name of the input raster file.
+        input_filename (str or QgsVectorLayer): Name of the input file, or a layer handle.
         base_output_path (str): Directory to save the output file.
-        output_file (str): Name of the output file.
+        output_file (str): Name of the output file, or TEMPORARY_OUTPUT.
 
     Returns:
-        None: Prints a message when filtering is complete.
+        str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
     """
-    input_path_5 = os.path.join(base_input_path, input_filename)
-    output_path_5 = os.path.join(base_output_path, output_file)
+    input_path_5 = resolve_layer(base_input_path, input_filename)
+    output_path_5 = resolve_layer(base_output_path, output_file)
 
-    processing.run("native:extractbyexpression", {
+    result = run_algorithm("native:extractbyexpression", {
         'INPUT': input_path_5,
         'EXPRESSION': filter_value,
         'OUTPUT': output_path_5
     })
 
     print("Filtering for values that meet condition 1 is complete.")
-
-
-# 6 Intersection 2 layers
-def intersection_exposure_bdot(base_output_path, base_layer, overlay_layer, output_file_name):
-    """
-    Performs an intersection of two vector layers, producing a new layer with overlapping areas.
-
-    Args:
-        base_output_path (str): Directory containing the base and overlay layers.
-        base_layer (str): File name of the base vector layer.
-        overlay_layer (str): File name of the overlay vector layer.
-        output_file_name (str): File name for the output intersection layer.
-
-    Returns:
-        None: Prints a message indicating the intersection operation is complete.
-    """
-    input_path_6 = os.path.join(base_output_path, base_layer)
-    overlay_path_6 = os.path.join(base_output_path, overlay_layer)
-    output_path_6 = os.path.join(base_output_path, output_file_name)
-
-    processing.run("native:intersection", {
-        'INPUT': input_path_6,
-        'OVERLAY': overlay_path_6,
-        'OUTPUT': output_path_6
-    })
-
-    print("Intersection of exposure and BDOT completed.")
-
-
-
-# 8. Calculate area
-def split_into_single_parts(base_output_path, input_file_name, output_file_name):
-    """
-    Splits multipart geometries in a vector layer into single-part geometries.
-
-    Args:
-        base_output_path (str): Directory containing the input file.
-        input_file_name (str): Name of the input vector file.
-        output_file_name (str): Name of the output vector file with single-part geometries.
-
-    Returns:
-        None: Prints a message when the splitting operation is complete.
-    """
-    input_path_7 = os.path.join(base_output_path, input_file_name)
-    output_path_7 = os.path.join(base_output_path, output_file_name)
-
-    processing.run("native:multiparttosingleparts", {
-        'INPUT': input_path_7,
-        'OUTPUT': output_path_7
-    })
-
-    print("Splitting into single parts completed.")
-
-
-
-# 9. Select by area
-def filter_areas(base_output_path, input_file, output_file, variable):
-    """
-    Filters areas based on a given condition (expression) and saves the results to a new file.
-
-    Parameters:
-    - base_output_path (str): The base directory where the input and output files are located.
-    - input_file (str): The name of the input file containing area data.
-    - output_file (str): The name of the output file that will contain the filtered areas.
-    - variable (str): The expression used to filter areas.
-
-    Returns:
-    None: The filtered data is saved to a new file.
-    """
-    input_path = os.path.join(base_output_path, input_file)
-    output_path = os.path.join(base_output_path, output_file)
-
-    processing.run("native:extractbyexpression", {
-        'INPUT': input_path,
-        'EXPRESSION': variable,
-        'OUTPUT': output_path
-    })
-
-    print("Area filtering based on the specified condition is complete.")
+    return result['OUTPUT']
 
 
 # 10. Add ID column
+@traced
 def add_id(base_output_path, input_file, output_file):
     """
     Adds an 'ID' column to a layer with a unique identifier for each feature.
 
     Parameters:
     - base_output_path (str): The base directory where the input and output files are located.
-    - input_file (str): The name of the input file.
-    - output_file (str): The name of the output file with the added 'ID' column.
+    - input_file (str or QgsVectorLayer): The name of the input file, or a layer handle.
+    - output_file (str): The name of the output file with the added 'ID' column, or TEMPORARY_OUTPUT.
 
     Returns:
-    None: The updated file is saved with the 'ID' column.
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
     """
-    input_path = os.path.join(base_output_path, input_file)
-    output_path = os.path.join(base_output_path, output_file)
+    input_path = resolve_layer(base_output_path, input_file)
+    output_path = resolve_layer(base_output_path, output_file)
 
-    processing.run("native:fieldcalculator", {
+    result = run_algorithm("native:fieldcalculator", {
         'INPUT': input_path,
         'FIELD_NAME': 'ID',
         'FIELD_TYPE': 1,  # Integer type for ID
@@ -279,60 +811,150 @@ def add_id(base_output_path, input_file, output_file):
     })
 
     print("ID column added successfully.")
+    return result['OUTPUT']
 
 
 # 11. Select medium voltage lines
+@traced
 def select_from_layer(base_output_path, input_path, output_file_name):
     """
     Selects features from a layer where the 'RODZAJ' attribute indicates medium-voltage power lines.
 
     Parameters:
     - base_output_path (str): The base directory for the output file.
-    - input_path (str): The path to the input file containing the power line data.
-    - output_file_name (str): The name of the output file to store the filtered features.
+    - input_path (str or QgsVectorLayer): The path to the input file containing the power line data.
+    - output_file_name (str): The name of the output file to store the filtered features, or TEMPORARY_OUTPUT.
 
     Returns:
-    None: The filtered file is saved to the specified location.
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
     """
-    output_path = os.path.join(base_output_path, output_file_name)
+    output_path = resolve_layer(base_output_path, output_file_name)
 
-    processing.run("native:extractbyexpression", {
+    result = run_algorithm("native:extractbyexpression", {
         'INPUT': input_path,
         'EXPRESSION': '"RODZAJ" = \'linia elektroenergetyczna średniego napięcia\'',
         'OUTPUT': output_path
     })
 
     print("Selection of medium-voltage power lines is complete.")
+    return result['OUTPUT']
 
 
 # 12. Calculate distance to voltage lines
+@traced
 def calculate_distance(base_output_path, source_layer, destination_layer, output_file_name):
     """
     Calculates the shortest distance between two layers, such as from a source layer to voltage lines.
 
     Parameters:
     - base_output_path (str): The base directory where the input and output files are located.
-    - source_layer (str): The name of the source layer file.
-    - destination_layer (str): The name of the destination layer file (e.g., voltage lines).
-    - output_file_name (str): The name of the output file containing the distance data.
+    - source_layer (str or QgsVectorLayer): The name of the source layer file, or a layer handle.
+    - destination_layer (str or QgsVectorLayer): The name of the destination layer file (e.g., voltage lines), or a layer handle.
+    - output_file_name (str): The name of the output file containing the distance data, or TEMPORARY_OUTPUT.
 
     Returns:
-    None: The distance calculations are saved to the output file.
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
     """
-    output_path = os.path.join(base_output_path, source_layer)
-    destination_path = os.path.join(base_output_path, destination_layer)
-    output_file = os.path.join(base_output_path, output_file_name)
+    output_path = resolve_layer(base_output_path, source_layer)
+    destination_path = resolve_layer(base_output_path, destination_layer)
+    output_file = resolve_layer(base_output_path, output_file_name)
 
-    processing.run("native:shortestline", {
+    result = run_algorithm("native:shortestline", {
         'SOURCE': output_path,
         'DESTINATION': destination_path,
         'OUTPUT': output_file
     })
 
     print("Distance calculation completed successfully.")
+    return result['OUTPUT']
+
+
+# 12a. Nearest distances with a spatial index
+@traced
+def calculate_nearest_distances(base_output_path, source_layer, destination_layers, output_file_name, max_distances=None):
+    """
+    Adds the distance to the nearest feature of one or more destination layers as columns of the source layer.
+
+    Replaces native:shortestline followed by a join and a rename: every destination layer is indexed once
+    (QgsSpatialIndex storing the geometries), the nearest feature of each source feature is looked up in the
+    index and the exact distance is written straight into the output, without materializing a line layer.
+
+    With max_distances, source features are kept only when they are closer than the threshold to the given
+    destination layers (as a later filter '"LINE_DISTANCE" < 500' would). Those columns are checked first with
+    a within-distance query (bounding box expanded by the threshold); features without candidates are rejected
+    without any exact distance, and exact distances are computed only for the candidates.
+
+    Parameters:
+    - base_output_path (str): The base directory where the input and output files are located.
+    - source_layer (str or QgsVectorLayer): The name of the source layer file (e.g., areas), or a layer handle.
+    - destination_layers (dict): Column name -> destination layer (name, path or layer handle),
+      e.g. {'LINE_DISTANCE': medium_power_line, 'ROAD_DISTANCE': road_file_path}.
+    - output_file_name (str): The name of the output file, or TEMPORARY_OUTPUT.
+    - max_distances (dict, optional): Column name -> distance threshold (exclusive), e.g. {'LINE_DISTANCE': 500}.
+
+    Returns:
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
+    """
+    sources = open_vector_layer(base_output_path, source_layer)
+    max_distances = max_distances or {}
+
+    # One index per destination layer, with geometries in the CRS of the source layer
+    indexes = {}
+    for field_name, destination_layer in destination_layers.items():
+        destinations = open_vector_layer(base_output_path, destination_layer)
+        request = QgsFeatureRequest().setNoAttributes()
+        if destinations.crs() != sources.crs():
+            request.setDestinationCrs(sources.crs(), QgsProject.instance().transformContext())
+        indexes[field_name] = QgsSpatialIndex(destinations.getFeatures(request), flags=QgsSpatialIndex.FlagStoreFeatureGeometries)
+
+    fields = QgsFields(sources.fields())
+    for field_name in destination_layers:
+        fields.append(QgsField(field_name, QVariant.Double, len=20, prec=6))
+
+    # Thresholded columns first, so rejected features skip the other columns
+    ordered_fields = sorted(destination_layers, key=lambda field_name: field_name not in max_distances)
+
+    output_features = []
+    rejected = 0
+    source_count = sources.featureCount()
+    for done, source in enumerate(sources.getFeatures()):
+        report_step_progress(done, source_count)
+        geometry = source.geometry()
+        distances = {}
+        kept = True
+        for field_name in ordered_fields:
+            index = indexes[field_name]
+            if field_name in max_distances:
+                # Within-distance query: only destinations whose envelope is within the threshold are candidates
+                candidates = index.intersects(geometry.boundingBox().buffered(max_distances[field_name]))
+            else:
+                # Ties (equally near bounding boxes) can return several candidates, the exact distance decides
+                candidates = index.nearestNeighbor(geometry, 1)
+            candidate_distances = [geometry.distance(index.geometry(feature_id)) for feature_id in candidates]
+            distances[field_name] = min(candidate_distances) if candidate_distances else None
+
+            if field_name in max_distances and (distances[field_name] is None or distances[field_name] >= max_distances[field_name]):
+                kept = False
+                break
+
+        if not kept:
+            rejected += 1
+            continue
+
+        output_feature = QgsFeature(fields)
+        output_feature.setGeometry(geometry)
+        output_feature.setAttributes(list(source.attributes()) + [distances[field_name] for field_name in destination_layers])
+        output_features.append(output_feature)
+
+    output = write_vector_layer(base_output_path, output_file_name, fields, sources.wkbType(), sources.crs(), output_features)
+
+    print(f"Nearest distances ({', '.join(destination_layers)}) calculated for {len(output_features)} features"
+          f"{f', {rejected} rejected by the distance thresholds' if max_distances else ''}.")
+    return output
 
 
 # 13. Join attributes by distance
+@traced
 def join_attributes_with_distances(field_1, field_2, field_to_copy, base_output_path, base_file, file_from_copy,
                                    output_file_name):
     """
@@ -343,18 +965,18 @@ def join_attributes_with_distances(field_1, field_2, field_to_copy, base_output_
     - field_2 (str): The field name in the layer with the distances.
     - field_to_copy (str): The attribute field to copy from the second layer.
     - base_output_path (str): The base directory for input and output files.
-    - base_file (str): The name of the base file (first layer).
-    - file_from_copy (str): The name of the file containing distances (second layer).
-    - output_file_name (str): The name of the output file with joined attributes.
+    - base_file (str or QgsVectorLayer): The name of the base file (first layer), or a layer handle.
+    - file_from_copy (str or QgsVectorLayer): The name of the file containing distances (second layer), or a layer handle.
+    - output_file_name (str): The name of the output file with joined attributes, or TEMPORARY_OUTPUT.
 
     Returns:
-    None: The attributes are joined and saved to the output file.
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
     """
-    input_path = os.path.join(base_output_path, base_file)
-    distances_path = os.path.join(base_output_path, file_from_copy)
-    output_path = os.path.join(base_output_path, output_file_name)
+    input_path = resolve_layer(base_output_path, base_file)
+    distances_path = resolve_layer(base_output_path, file_from_copy)
+    output_path = resolve_layer(base_output_path, output_file_name)
 
-    processing.run("native:joinattributestable", {
+    result = run_algorithm("native:joinattributestable", {
         'INPUT': input_path,
         'FIELD': field_1,
         'INPUT_2': distances_path,
@@ -364,9 +986,11 @@ def join_attributes_with_distances(field_1, field_2, field_to_copy, base_output_
     })
 
     print("Attributes joined based on distance successfully.")
+    return result['OUTPUT']
 
 
 # 14. Filter area by distance to lines
+@traced
 def filter_area_distance(base_output_path, variable, column_distance_name, layer_to_filter, output_file_name):
     """
     Filters areas based on their distance from power lines and renames the distance column.
@@ -375,47 +999,84 @@ def filter_area_distance(base_output_path, variable, column_distance_name, layer
     - base_output_path (str): The base directory where the input and output files are located.
     - variable (str): The condition/expression to filter the areas by distance.
     - column_distance_name (str): The new name for the distance column.
-    - layer_to_filter (str): The name of the layer to apply the filter to.
-    - output_file_name (str): The name of the output file with the filtered data.
+    - layer_to_filter (str or QgsVectorLayer): The name of the layer to apply the filter to, or a layer handle.
+    - output_file_name (str): The name of the output file with the filtered data, or TEMPORARY_OUTPUT.
 
     Returns:
-    None: The filtered data is saved and the distance column is renamed.
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
     """
-    input_path = os.path.join(base_output_path, layer_to_filter)
-    output_filter = os.path.join(base_output_path, "filtered_layer")
-    output_path = os.path.join(base_output_path, output_file_name)
+    input_path = resolve_layer(base_output_path, layer_to_filter)
 
-    # Filtering areas based on distance
-    processing.run("native:extractbyexpression", {
+    # Filtering areas based on distance (kept in memory until the renamed result is written)
+    filtered_layer = run_algorithm("native:extractbyexpression", {
         'INPUT': input_path,
         'EXPRESSION': variable,
-        'OUTPUT': output_filter
-    })
+        'OUTPUT': TEMPORARY_OUTPUT
+    })['OUTPUT']
 
     print("Filtering areas by distance is complete.")
 
     # Renaming the distance column
-    rename_column(base_output_path=base_output_path, file_to_rename="filtered_layer", new_name=column_distance_name,
-                  field_to_rename='distance', output_file_name=output_path)
+    return rename_column(base_output_path=base_output_path, file_to_rename=filtered_layer, new_name=column_distance_name,
+                         field_to_rename='distance', output_file_name=output_file_name)
+
+
+# 15. Rename column
+@traced
+def rename_column(base_output_path, file_to_rename, field_to_rename, new_name, output_file_name):
+    """
+    Renames a field of a vector layer.
+
+    Parameters:
+    - base_output_path (str): The base directory where the input and output files are located.
+    - file_to_rename (str or QgsVectorLayer): The name of the input file, or a layer handle.
+    - field_to_rename (str): The current name of the field.
+    - new_name (str): The new name of the field.
+    - output_file_name (str): The name of the output file, or TEMPORARY_OUTPUT.
+
+    Returns:
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
+    """
+    input_path = resolve_layer(base_output_path, file_to_rename)
+    output_path = resolve_layer(base_output_path, output_file_name)
+
+    result = run_algorithm("native:renametablefield", {
+        'INPUT': input_path,
+        'FIELD': field_to_rename,
+        'NEW_NAME': new_name,
+        'OUTPUT': output_path
+    })
+
+    print(f"Column {field_to_rename} renamed to {new_name}.")
+    return result['OUTPUT']
 
 
 # 18. Create a buffer around features
-def buffer(base_output_path, input_path, output_file, distance):
+@traced
+def buffer(base_output_path, input_path, output_file, distance, tile_size=None, workers=None, merge=False):
     """
     Creates a buffer around features in the input layer with a specified distance.
 
     Parameters:
     - base_output_path (str): The base directory where the input and output files are located.
-    - input_path (str): The path to the input file.
-    - output_file (str): The name of the output file that will contain the buffered features.
+    - input_path (str or QgsVectorLayer): The path to the input file, or a layer handle.
+    - output_file (str): The name of the output file that will contain the buffered features, or TEMPORARY_OUTPUT.
     - distance (float): The distance to buffer around the features.
+    - tile_size (float, optional): Buffer and dissolve tiles of this size (layer units) in parallel (see tiled_buffer).
+      By default the whole layer is buffered and dissolved by native:buffer.
+    - workers (int, optional): Number of tiles buffered in parallel (default: the thread budget of the process).
+    - merge (bool): With tile_size, dissolve the tiles into one feature.
 
     Returns:
-    None: The buffered features are saved to the output file.
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
     """
-    output_path = os.path.join(base_output_path, output_file)
+    if tile_size is not None:
+        return tiled_buffer(base_output_path, input_path, output_file, distance, tile_size=tile_size,
+                            workers=workers, merge=merge)
 
-    processing.run("native:buffer", {
+    output_path = resolve_layer(base_output_path, output_file)
+
+    result = run_algorithm("native:buffer", {
         'INPUT': input_path,
         'DISTANCE': distance,
         'SEGMENTS': 5,
@@ -427,49 +1088,156 @@ def buffer(base_output_path, input_path, output_file, distance):
     })
 
     print("Buffer creation completed.")
+    return result['OUTPUT']
+
+
+def _thread_feature_sources(layer, workers):
+    """
+    Returns a function giving every pool thread a feature source of its own.
+
+    A QgsVectorLayerFeatureSource must not be shared between threads, and it is created from the layer, so the
+    sources (one per worker) are created here on the calling thread and handed out on first use in each thread.
+    """
+    sources = queue.Queue()
+    for _ in range(workers):
+        sources.put(QgsVectorLayerFeatureSource(layer))
+    local = threading.local()
+
+    def thread_source():
+        if not hasattr(local, 'source'):
+            local.source = sources.get_nowait()
+        return local.source
+
+    return thread_source
+
+
+def _buffer_tile(source, tile, distance, segments):
+    """Buffers the features within distance of a tile and dissolves them, clipped to the tile; None when the tile stays empty."""
+    buffers = [feature.geometry().buffer(distance, segments)
+               for feature in source.getFeatures(QgsFeatureRequest().setFilterRect(tile.buffered(distance)).setNoAttributes())
+               if feature.hasGeometry()]
+    if not buffers:
+        return None
+    dissolved = QgsGeometry.unaryUnion(buffers).intersection(QgsGeometry.fromRect(tile))
+    return _polygon_parts(dissolved)
+
+
+# 18a. Tiled buffer
+@traced
+def tiled_buffer(base_output_path, input_path, output_file, distance, tile_size=10000, workers=None, merge=False, segments=5):
+    """
+    Buffers and dissolves the features of a layer tile by tile over a grid, with the tiles processed in parallel.
+
+    Every tile reads the features whose bounding box lies within the buffer distance of the tile (the overlap
+    margin), buffers them, dissolves the buffers with a cascaded union and keeps the part inside the tile. The
+    tiles cover exactly the dissolved buffer of the whole layer, one feature per tile (field TILE), so
+    difference_between_layers subtracts only the tiles overlapping each feature (native:difference indexes the
+    overlay) instead of one province-wide polygon. With merge the tiles are dissolved into one feature, as
+    written by native:buffer with DISSOLVE.
+
+    Parameters:
+    - base_output_path (str): The base directory where the input and output files are located.
+    - input_path (str or QgsVectorLayer): The path to the input file, or a layer handle.
+    - output_file (str): The name of the output file that will contain the buffer, or TEMPORARY_OUTPUT.
+    - distance (float): The distance to buffer around the features.
+    - tile_size (float): Size of the tiles in layer units (meters for EPSG:2180).
+    - workers (int, optional): Number of tiles buffered in parallel (default: the thread budget of the process).
+    - merge (bool): Dissolve the tiles into one feature.
+    - segments (int): Segments of the quarter circles (as SEGMENTS of native:buffer).
+
+    Returns:
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
+    """
+    layer = open_vector_layer(base_output_path, input_path)
+    if layer.hasSpatialIndex() == QgsFeatureSource.SpatialIndexNotPresent:
+        layer.dataProvider().createSpatialIndex()
+
+    extent = layer.extent().buffered(distance)
+    tiles = []
+    y = extent.yMinimum()
+    while y <= extent.yMaximum():
+        x = extent.xMinimum()
+        while x <= extent.xMaximum():
+            tiles.append(QgsRectangle(x, y, x + tile_size, y + tile_size))
+            x += tile_size
+        y += tile_size
+
+    # Feature sources can be read from worker threads, layers cannot
+    workers = workers or thread_budget()
+    thread_source = _thread_feature_sources(layer, workers)
+    fields = QgsFields()
+    fields.append(QgsField('TILE', QVariant.Int, len=10))
+
+    def buffered_tiles():
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                pieces = executor.map(propagate_span(lambda tile: _buffer_tile(thread_source(), tile, distance, segments)), tiles)
+                if merge:
+                    pieces = [QgsGeometry.unaryUnion([piece for piece in pieces if piece is not None])]
+                for number, piece in enumerate(pieces, start=1):
+                    report_step_progress(number, len(tiles))
+                    if piece is None or piece.isEmpty():
+                        continue
+                    piece.convertToMultiType()
+                    feature = QgsFeature(fields)
+                    feature.setGeometry(piece)
+                    feature.setAttributes([number])
+                    yield feature
+            except PipelineCanceled:
+                # Queued tiles are dropped instead of waited for
+                executor.shutdown(cancel_futures=True)
+                raise
+
+    output = write_vector_layer(base_output_path, output_file, fields, QgsWkbTypes.MultiPolygon, layer.crs(), buffered_tiles())
+
+    print(f"Tiled buffer completed ({len(tiles)} tiles, {workers} workers).")
+    return output
 
 
 # 19. Split layer into single parts
+@traced
 def split_into_single_parts(base_output_path, input_file_name, output_file_name):
     """
     Splits a multipart layer into single parts, each saved as an individual feature.
 
     Parameters:
     - base_output_path (str): The base directory where the input and output files are located.
-    - input_file_name (str): The name of the input file containing multipart features.
-    - output_file_name (str): The name of the output file that will contain the single part features.
+    - input_file_name (str or QgsVectorLayer): The name of the input file containing multipart features, or a layer handle.
+    - output_file_name (str): The name of the output file that will contain the single part features, or TEMPORARY_OUTPUT.
 
     Returns:
-    None: The multipart features are split and saved as single parts in the output file.
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
     """
-    input_path = os.path.join(base_output_path, input_file_name)
-    output_path = os.path.join(base_output_path, output_file_name)
+    input_path = resolve_layer(base_output_path, input_file_name)
+    output_path = resolve_layer(base_output_path, output_file_name)
 
-    processing.run("native:multiparttosingleparts", {
+    result = run_algorithm("native:multiparttosingleparts", {
         'INPUT': input_path,
         'OUTPUT': output_path
     })
 
     print("Splitting into single parts completed.")
+    return result['OUTPUT']
 
 
 
+@traced
 def calculate_area(base_output_path, input_file, output_file):
     """
     Calculates the area for each feature in a vector layer and stores the result in a new field.
 
     Parameters:
     - base_output_path (str): The base directory where the input and output files are located.
-    - input_file (str): The name of the input vector file.
-    - output_file (str): The name of the output file that will contain the features with calculated areas.
+    - input_file (str or QgsVectorLayer): The name of the input vector file, or a layer handle.
+    - output_file (str): The name of the output file that will contain the features with calculated areas, or TEMPORARY_OUTPUT.
 
     Returns:
-    None: The areas are calculated and saved in the 'AREA' field of the output file.
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
     """
-    input_path_8 = os.path.join(base_output_path, input_file)
-    output_path_8 = os.path.join(base_output_path, output_file)
+    input_path_8 = resolve_layer(base_output_path, input_file)
+    output_path_8 = resolve_layer(base_output_path, output_file)
 
-    processing.run("native:fieldcalculator", {
+    result = run_algorithm("native:fieldcalculator", {
         'INPUT': input_path_8,
         'FIELD_NAME': 'AREA',
         'FIELD_TYPE': 0,  # Numeric field
@@ -480,136 +1248,357 @@ def calculate_area(base_output_path, input_file, output_file):
     })
 
     print("Area calculation completed.")
+    return result['OUTPUT']
 
 
+@traced
 def filter_areas(base_output_path, input_file, output_file, variable):
     """
     Filters features from a vector layer based on a given expression.
 
     Parameters:
     - base_output_path (str): The base directory where the input and output files are located.
-    - input_file (str): The name of the input vector file containing calculated areas.
-    - output_file (str): The name of the output file that will contain the filtered features.
+    - input_file (str or QgsVectorLayer): The name of the input vector file containing calculated areas, or a layer handle.
+    - output_file (str): The name of the output file that will contain the filtered features, or TEMPORARY_OUTPUT.
     - variable (str): The expression used for filtering (e.g., "AREA > 20000").
 
     Returns:
-    None: The filtered features are saved in the output file.
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
     """
-    input_path = os.path.join(base_output_path, input_file)
-    output_path = os.path.join(base_output_path, output_file)
+    input_path = resolve_layer(base_output_path, input_file)
+    output_path = resolve_layer(base_output_path, output_file)
 
-    processing.run("native:extractbyexpression", {
+    result = run_algorithm("native:extractbyexpression", {
         'INPUT': input_path,
         'EXPRESSION': variable,
         'OUTPUT': output_path
     })
 
     print("Filtering areas based on the expression completed.")
+    return result['OUTPUT']
+
+
+@traced
+def split_area_filter_id(base_output_path, input_file, output_file, min_area, id_field='ID'):
+    """
+    Splits multipart features into single parts, computes their area, keeps the parts larger than min_area
+    and numbers them, in one pass over the features.
+
+    Replaces split_into_single_parts -> calculate_area -> filter_areas('"AREA" > min_area') -> add_id: the parts
+    are streamed to the output and only the kept parts are written. Areas are planimetric (in layer units,
+    m² for EPSG:2180), as $area of the field calculator without a project ellipsoid.
 
+    Parameters:
+    - base_output_path (str): The base directory where the input and output files are located.
+    - input_file (str or QgsVectorLayer): The name of the input vector file, or a layer handle.
+    - output_file (str): The name of the output file, or TEMPORARY_OUTPUT.
+    - min_area (float): Parts with an area not larger than this value are dropped (e.g., 20000).
+    - id_field (str): Name of the sequential ID column (1, 2, ... in output order), or None to skip it.
 
-def intersection_exposure_bdot(base_output_path, base_layer, overlay_layer, output_file_name):
+    Returns:
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
+    """
+    layer = open_vector_layer(base_output_path, input_file)
+
+    # AREA and ID replace columns of the same name, as in the field calculator
+    fields = QgsFields(layer.fields())
+    if fields.indexOf('AREA') == -1:
+        fields.append(QgsField('AREA', QVariant.Double, len=10, prec=2))
+    if id_field is not None and fields.indexOf(id_field) == -1:
+        fields.append(QgsField(id_field, QVariant.Int, len=10))
+    area_index = fields.indexOf('AREA')
+    id_index = fields.indexOf(id_field) if id_field is not None else -1
+
+    kept = [0]
+
+    feature_count = layer.featureCount()
+
+    def kept_parts():
+        for done, feature in enumerate(layer.getFeatures()):
+            report_step_progress(done, feature_count)
+            geometry = feature.geometry()
+            if geometry.isNull():
+                continue
+            attributes = list(feature.attributes()) + [None] * (fields.count() - len(feature.attributes()))
+            for part in geometry.asGeometryCollection():
+                area = part.area()
+                if area <= min_area:
+                    continue
+                kept[0] += 1
+                attributes[area_index] = round(area, 2)
+                if id_index != -1:
+                    attributes[id_index] = kept[0]
+                output_feature = QgsFeature(fields)
+                output_feature.setGeometry(part)
+                output_feature.setAttributes(list(attributes))
+                yield output_feature
+
+    output = write_vector_layer(base_output_path, output_file, fields, QgsWkbTypes.singleType(layer.wkbType()),
+                                layer.crs(), kept_parts())
+
+    print(f"Split, area and filter (AREA > {min_area}) completed, {kept[0]} parts kept.")
+    return output
+
+
+@traced
+def intersection_exposure_bdot(base_output_path, base_layer, overlay_layer, output_file_name, cell_size=None, workers=None):
     """
     Computes the intersection between two vector layers.
 
     Parameters:
     - base_output_path (str): The base directory where the input and output files are located.
-    - base_layer (str): The name of the base layer containing the features to intersect.
-    - overlay_layer (str): The name of the overlay layer.
-    - output_file_name (str): The name of the output file that will contain the intersection result.
+    - base_layer (str or QgsVectorLayer): The name of the base layer containing the features to intersect, or a layer handle.
+    - overlay_layer (str or QgsVectorLayer): The name of the overlay layer, or a layer handle.
+    - output_file_name (str): The name of the output file that will contain the intersection result, or TEMPORARY_OUTPUT.
+    - cell_size (float, optional): Intersect grid cells of this size (layer units) in parallel (see partitioned_intersection).
+      By default the layers are passed to native:intersection.
+    - workers (int, optional): Number of cells intersected in parallel (default: the thread budget of the process).
 
     Returns:
-    None: The intersection result is saved in the output file.
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
     """
-    input_path_6 = os.path.join(base_output_path, base_layer)
-    overlay_path_6 = os.path.join(base_output_path, overlay_layer)
-    output_path_6 = os.path.join(base_output_path, output_file_name)
+    if cell_size is not None:
+        return partitioned_intersection(base_output_path, base_layer, overlay_layer, output_file_name,
+                                        cell_size=cell_size, workers=workers)
 
-    processing.run("native:intersection", {
+    input_path_6 = resolve_layer(base_output_path, base_layer)
+    overlay_path_6 = resolve_layer(base_output_path, overlay_layer)
+    output_path_6 = resolve_layer(base_output_path, output_file_name)
+
+    result = run_algorithm("native:intersection", {
         'INPUT': input_path_6,
         'OVERLAY': overlay_path_6,
         'INPUT_FIELDS': [],
         'OVERLAY_FIELDS': [],
         'OVERLAY_FIELDS_PREFIX': '',
-        'OUTPUT': output_path_6
+        'OUTPUT': output_path_6,
+        'GRID_SIZE': overlay_grid_size
     })
 
     print("Intersection between exposure and BDOT layers completed.")
+    return result['OUTPUT']
+
+
+def _polygon_parts(geometry):
+    """Returns the polygon parts of an intersection result as a multipolygon, or None when there are none."""
+    if geometry.isEmpty():
+        return None
+    if QgsWkbTypes.flatType(geometry.wkbType()) == QgsWkbTypes.GeometryCollection:
+        parts = [part for part in geometry.asGeometryCollection()
+                 if part.type() == QgsWkbTypes.PolygonGeometry and not part.isEmpty()]
+        if not parts:
+            return None
+        geometry = QgsGeometry.collectGeometry(parts)
+    elif geometry.type() != QgsWkbTypes.PolygonGeometry:
+        return None
+    geometry.convertToMultiType()
+    return geometry
+
+
+def _intersect_cell(base_source, cell, overlay_index, overlay_attributes, fields):
+    """Intersects the base features owned by one grid cell (bounding box center inside the cell) with their overlay candidates."""
+    parameters = QgsGeometryParameters()
+    if overlay_grid_size is not None:
+        parameters.setGridSize(overlay_grid_size)
+
+    output_features = []
+    for feature in base_source.getFeatures(QgsFeatureRequest().setFilterRect(cell)):
+        geometry = feature.geometry()
+        box = geometry.boundingBox()
+        center = box.center()
+        # Features crossing cell borders are returned for several cells, only the owner cell intersects them
+        if not (cell.xMinimum() <= center.x() < cell.xMaximum() and cell.yMinimum() <= center.y() < cell.yMaximum()):
+            continue
+        geometry = snap_to_precision_grid(geometry)
+        if geometry is None:
+            continue
+
+        engine = None
+        for overlay_id in overlay_index.intersects(box):
+            overlay_geometry = overlay_index.geometry(overlay_id)
+            if engine is None:
+                engine = QgsGeometry.createGeometryEngine(geometry.constGet())
+                engine.prepareGeometry()
+            if not engine.intersects(overlay_geometry.constGet()):
+                continue
+            intersection = _polygon_parts(geometry.intersection(overlay_geometry, parameters))
+            if intersection is None:
+                continue
+            output_feature = QgsFeature(fields)
+            output_feature.setGeometry(intersection)
+            output_feature.setAttributes(list(feature.attributes()) + overlay_attributes[overlay_id])
+            output_features.append(output_feature)
+    return output_features
+
+
+@traced
+def partitioned_intersection(base_output_path, base_layer, overlay_layer, output_file_name, cell_size=5000, workers=None):
+    """
+    Intersects two polygon layers cell by cell over a grid, with the cells processed in parallel.
 
+    The overlay layer is loaded into a spatial index (with its geometries) and the base layer gets a provider
+    spatial index when it has none. Every cell reads only the base features whose bounding box overlaps it,
+    keeps those whose bounding box center lies in the cell (so each feature is intersected exactly once) and
+    intersects them only with the overlay features whose envelopes overlap. With a precision grid (see
+    enable_precision_grid) both sides are snapped to it first and intersected on it. The output matches
+    native:intersection: multipolygons with the base fields followed by the overlay fields (name clashes get
+    a '_2' suffix), written in cell order.
 
+    Parameters:
+    - base_output_path (str): The base directory where the input and output files are located.
+    - base_layer (str or QgsVectorLayer): The base layer (e.g., the polygonized exposure), or a layer handle.
+    - overlay_layer (str or QgsVectorLayer): The overlay layer (e.g., the split BDOT land cover), or a layer handle.
+    - output_file_name (str): The name of the output file, or TEMPORARY_OUTPUT.
+    - cell_size (float): Size of the grid cells in layer units (meters for EPSG:2180).
+    - workers (int, optional): Number of cells intersected in parallel (default: the thread budget of the process).
+
+    Returns:
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
+    """
+    base = open_vector_layer(base_output_path, base_layer)
+    overlay = open_vector_layer(base_output_path, overlay_layer)
+
+    if base.hasSpatialIndex() == QgsFeatureSource.SpatialIndexNotPresent:
+        base.dataProvider().createSpatialIndex()
+
+    # Output fields: base fields, then overlay fields (renamed on clashes as in native:intersection)
+    fields = QgsFields(base.fields())
+    for field in overlay.fields():
+        name, suffix = field.name(), 2
+        while fields.indexOf(name) != -1:
+            name, suffix = f"{field.name()}_{suffix}", suffix + 1
+        overlay_field = QgsField(field)
+        overlay_field.setName(name)
+        fields.append(overlay_field)
+
+    # Overlay index in the CRS of the base layer
+    request = QgsFeatureRequest()
+    if overlay.crs() != base.crs():
+        request.setDestinationCrs(base.crs(), QgsProject.instance().transformContext())
+    overlay_index = QgsSpatialIndex(flags=QgsSpatialIndex.FlagStoreFeatureGeometries)
+    overlay_attributes = {}
+    for feature in overlay.getFeatures(request):
+        geometry = snap_to_precision_grid(feature.geometry())
+        if geometry is None:
+            continue
+        feature.setGeometry(geometry)
+        overlay_index.addFeature(feature)
+        overlay_attributes[feature.id()] = list(feature.attributes())
+
+    extent = base.extent()
+    cells = []
+    y = extent.yMinimum()
+    while y <= extent.yMaximum():
+        x = extent.xMinimum()
+        while x <= extent.xMaximum():
+            cells.append(QgsRectangle(x, y, x + cell_size, y + cell_size))
+            x += cell_size
+        y += cell_size
+
+    # Feature sources can be read from worker threads, layers cannot
+    workers = workers or thread_budget()
+    thread_source = _thread_feature_sources(base, workers)
+
+    def intersected_features():
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                cell_results = executor.map(propagate_span(lambda cell: _intersect_cell(thread_source(), cell, overlay_index,
+                                                                                       overlay_attributes, fields)), cells)
+                for done, cell_features in enumerate(cell_results, start=1):
+                    yield from cell_features
+                    report_step_progress(done, len(cells))
+            except PipelineCanceled:
+                # Queued cells are dropped instead of waited for
+                executor.shutdown(cancel_futures=True)
+                raise
+
+    output = write_vector_layer(base_output_path, output_file_name, fields, QgsWkbTypes.MultiPolygon, base.crs(), intersected_features())
+
+    print(f"Partitioned intersection completed ({len(cells)} cells, {workers} workers).")
+    return output
+
+
+@traced
 def group_layer(base_output_path, base_layer, output_layer_group):
     """
     Groups multiple features in a vector layer into a single group.
 
     Parameters:
     - base_output_path (str): The base directory where the input and output files are located.
-    - base_layer (str): The name of the input layer to be grouped.
-    - output_layer_group (str): The name of the output file that will contain the grouped features.
+    - base_layer (str or QgsVectorLayer): The name of the input layer to be grouped, or a layer handle.
+    - output_layer_group (str): The name of the output file that will contain the grouped features, or TEMPORARY_OUTPUT.
 
     Returns:
-    None: The grouped features are saved in the output file.
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
     """
-    input_path_6 = os.path.join(base_output_path, base_layer)
-    output_path_6 = os.path.join(base_output_path, output_layer_group)
+    input_path_6 = resolve_layer(base_output_path, base_layer)
+    output_path_6 = resolve_layer(base_output_path, output_layer_group)
 
-    processing.run("native:collect", {
+    result = run_algorithm("native:collect", {
         'INPUT': input_path_6,
         'FIELD': [],
         'OUTPUT': output_path_6
     })
+    return result['OUTPUT']
 
 
+@traced
 def repair_geometry(base_output_path, base_layer, output_layer_name_repair):
     """
     Repairs any invalid geometries in a vector layer.
 
     Parameters:
     - base_output_path (str): The base directory where the input and output files are located.
-    - base_layer (str): The name of the input layer with potentially invalid geometries.
-    - output_layer_name_repair (str): The name of the output file that will contain the repaired geometries.
+    - base_layer (str or QgsVectorLayer): The name of the input layer with potentially invalid geometries, or a layer handle.
+    - output_layer_name_repair (str): The name of the output file that will contain the repaired geometries, or TEMPORARY_OUTPUT.
 
     Returns:
-    None: The repaired geometries are saved in the output file.
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
     """
-    input_path_6 = os.path.join(base_output_path, base_layer)
-    output_path_6 = os.path.join(base_output_path, output_layer_name_repair)
+    input_path_6 = resolve_layer(base_output_path, base_layer)
+    output_path_6 = resolve_layer(base_output_path, output_layer_name_repair)
 
-    processing.run("native:fixgeometries", {
+    result = run_algorithm("native:fixgeometries", {
         'INPUT': input_path_6,
         'METHOD': 1,
         'OUTPUT': output_path_6
     })
+    return result['OUTPUT']
 
 
+@traced
 def difference_between_layers(base_output_path, base_layer, overlay_layer, output_file_name, variable_to_area):
     """
     Computes the difference between two vector layers.
 
     Parameters:
     - base_output_path (str): The base directory where the input and output files are located.
-    - base_layer (str): The name of the base vector layer.
-    - overlay_layer (str): The name of the overlay vector layer.
-    - output_file_name (str): The name of the output file that will contain the difference result.
+    - base_layer (str or QgsVectorLayer): The name of the base vector layer, or a layer handle.
+    - overlay_layer (str or QgsVectorLayer): The name of the overlay vector layer, or a layer handle.
+    - output_file_name (str): The name of the output file that will contain the difference result, or TEMPORARY_OUTPUT.
     - variable_to_area (str): A variable related to the area calculation.
 
     Returns:
-    None: The difference between the layers is saved in the output file.
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
     """
-    input_path = os.path.join(base_output_path, base_layer)
-    output_path = os.path.join(base_output_path, output_file_name)
-    overlay_layer = os.path.join(base_output_path, overlay_layer)
+    input_path = resolve_layer(base_output_path, base_layer)
+    output_path = resolve_layer(base_output_path, output_file_name)
+    overlay_layer = resolve_layer(base_output_path, overlay_layer)
 
-    processing.run("native:difference", {
+    result = run_algorithm("native:difference", {
         'INPUT': input_path,
         'OVERLAY': overlay_layer,
         'OUTPUT': output_path,
-        'GRID_SIZE': None
+        'GRID_SIZE': overlay_grid_size
     })
+    return result['OUTPUT']
 
 ##STEP 3##
 
 #1 raster to vector
 
 
+@traced
 def process_tif_files(base_input_path, base_output_path, output_file_name, field_name, months):
     """
     Processes .tif files for each month by converting them into vector polygons and saving the output.
@@ -640,7 +1629,7 @@ def process_tif_files(base_input_path, base_output_path, output_file_name, field
                 output_shapefile_path = os.path.join(base_output_path, f"{output_file_name}_{month}.shp")
 
                 # Convert the .tif raster to vector polygons
-                processing.run("gdal:polygonize", {
+                run_algorithm("gdal:polygonize", {
                     'INPUT': input_file_path,
                     'BAND': 1,
                     'FIELD': field_name,
@@ -651,6 +1640,7 @@ def process_tif_files(base_input_path, base_output_path, output_file_name, field
                 print(f"Processed {file} for {month}.")
 
 
+@traced
 def solar_radiation_photovoltaic_area(base_output_path, photovoltaic_area_path, province, output_file_name):
     """
     Performs an intersection between solar radiation data and photovoltaic area vectors for a given province.
@@ -705,14 +1695,14 @@ def solar_radiation_photovoltaic_area(base_output_path, photovoltaic_area_path,
         output_support_file = os.path.join(support_folder, f"solar_radiation_vector_{province}_{month}.shp")
 
         # Perform the intersection between the photovoltaic area and the solar radiation data
-        processing.run("native:intersection", {
+        run_algorithm("native:intersection", {
             'INPUT': photovoltaic_area_path,
             'OVERLAY': input_support_file,
             'INPUT_FIELDS': [],
             'OVERLAY_FIELDS': ['Solar_surf'],
             'OVERLAY_FIELDS_PREFIX': '',
             'OUTPUT': output_support_file,
-            'GRID_SIZE': None
+            'GRID_SIZE': overlay_grid_size
         })
 
         # Rename the field in the output file to match the current month
@@ -734,7 +1724,7 @@ def solar_radiation_photovoltaic_area(base_output_path, photovoltaic_area_path,
         # Conditionally join attributes to create a cumulative file across months
         if index == 1:
             # First month: join attributes between the photovoltaic area and solar radiation for the current month
-            processing.run("native:joinattributestable", {
+            run_algorithm("native:joinattributestable", {
                 'INPUT': photovoltaic_area_path,
                 'FIELD': 'ID',
                 'INPUT_2': output,
@@ -748,7 +1738,7 @@ def solar_radiation_photovoltaic_area(base_output_path, photovoltaic_area_path,
 
         elif index == 12:
             # Last month: join the attributes from the cumulative file to create the final output
-            processing.run("native:joinattributestable", {
+            run_algorithm("native:joinattributestable", {
                 'INPUT': input_support_file_index_2_12,
                 'FIELD': 'ID',
                 'INPUT_2': output,
@@ -762,7 +1752,7 @@ def solar_radiation_photovoltaic_area(base_output_path, photovoltaic_area_path,
 
         else:
             # Intermediate months: continue joining attributes between months
-            processing.run("native:joinattributestable", {
+            run_algorithm("native:joinattributestable", {
                 'INPUT': input_support_file_index_2_12,
                 'FIELD': 'ID',
                 'INPUT_2': output,
@@ -775,6 +1765,7 @@ def solar_radiation_photovoltaic_area(base_output_path, photovoltaic_area_path,
             })
 
 
+@traced
 def wind_speed_farm_area(base_output_path, wind_area_path, province, output_file_name):
     """
     Process wind speed data by intersecting wind farm area data with monthly wind speed vector data for a given province.
@@ -842,14 +1833,14 @@ def wind_speed_farm_area(base_output_path, wind_area_path, province, output_file
         output_support_file = os.path.join(support_folder, f"wind_speed_vector_{province}_{month}.shp")
 
         # Perform intersection between the wind area and wind speed vector data
-        processing.run("native:intersection",
+        run_algorithm("native:intersection",
                        {'INPUT': wind_area_path,
                         'OVERLAY': input_support_file,
                         'INPUT_FIELDS': [],
                         'OVERLAY_FIELDS': ['Wind_speed'],
                         'OVERLAY_FIELDS_PREFIX': '',
                         'OUTPUT': output_support_file,
-                        'GRID_SIZE': None})
+                        'GRID_SIZE': overlay_grid_size})
 
         # Rename the "Wind_speed" field to the current month
         field_to_rename = 'Wind_speed'
@@ -869,7 +1860,7 @@ def wind_speed_farm_area(base_output_path, wind_area_path, province, output_file
 
         # Combine the data from all months into the final file
         if index == 1:
-            processing.run("native:joinattributestable",
+            run_algorithm("native:joinattributestable",
                            {'INPUT': wind_area_path,
                             'FIELD': 'ID',
                             'INPUT_2': output,
@@ -881,7 +1872,7 @@ def wind_speed_farm_area(base_output_path, wind_area_path, province, output_file
                             'OUTPUT': output_support_file_index})
 
         elif index == 12:
-            processing.run("native:joinattributestable",
+            run_algorithm("native:joinattributestable",
                            {'INPUT': input_support_file_index_2_12,
                             'FIELD': 'ID',
                             'INPUT_2': output,
@@ -892,7 +1883,7 @@ def wind_speed_farm_area(base_output_path, wind_area_path, province, output_file
                             'PREFIX': '',
                             'OUTPUT': output_finally_file})
         else:
-            processing.run("native:joinattributestable",
+            run_algorithm("native:joinattributestable",
                            {'INPUT': input_support_file_index_2_12,
                             'FIELD': 'ID',
                             'INPUT_2': output,
@@ -903,3 +1894,311 @@ def wind_speed_farm_area(base_output_path, wind_area_path, province, output_file
                             'PREFIX': '',
                             'OUTPUT': output_support_file_index})
 
+
+##MONTHLY CLIMATE STATISTICS##
+
+
+def raster_window(raster_path, mask_layer, margin=1):
+    """
+    Returns the pixel window of a raster covering a mask layer, looked up in the window index when it is enabled.
+
+    Parameters:
+    - raster_path (str): Any raster on the grid.
+    - mask_layer (str or QgsVectorLayer): Mask file, GeoPackage layer or layer handle.
+    - margin (int): Pixels added on every side of the window.
+
+    Returns:
+    list: [x offset, y offset, x size, y size] in pixels.
+    """
+    mask_source = mask_layer.source() if isinstance(mask_layer, QgsMapLayer) else mask_layer
+    if window_index is not None:
+        return window_index.window(raster_path, mask_source, lambda mask, projection: mask_bounding_box(mask_layer, projection),
+                                   margin=margin)
+
+    dataset = gdal.Open(raster_path)
+    if dataset is None:
+        raise ValueError(f"Cannot open raster: {raster_path}")
+    window = pixel_window(dataset.GetGeoTransform(), dataset.RasterXSize, dataset.RasterYSize,
+                          mask_bounding_box(mask_layer, dataset.GetProjection()), margin)
+    dataset = None
+    if window is None:
+        raise ValueError(f"Mask {mask_source} does not overlap raster {raster_path}")
+    return window
+
+
+def read_band_stack(raster_paths, window_mask=None):
+    """
+    Reads rasters sharing one grid into a single (bands, rows, columns) array; nodata becomes NaN.
+
+    Parameters:
+    - raster_paths (list or str): Paths to single-band rasters (e.g., the 12 national monthly rasters),
+      or the path to one multi-band raster (e.g., the output of clip_monthly_stack), read band by band.
+    - window_mask (str or QgsVectorLayer, optional): Read only the pixel window covering this mask (e.g., the
+      province buffer), see raster_window.
+
+    Returns:
+    tuple: (values array, geotransform, projection WKT) of the stack, or of the window with its own geotransform.
+    With enable_raster_memmap the values are a read-only float32 memmap of the sidecar of the whole stack (built
+    once and shared by every province), and a window is a view of it.
+    """
+    first_path = raster_paths if isinstance(raster_paths, str) else raster_paths[0]
+    window = raster_window(first_path, window_mask) if window_mask is not None else None
+
+    if raster_memmap_store is not None:
+        values, geotransform, projection = raster_memmap_store.open(raster_paths)
+        if window is None:
+            return values, geotransform, projection
+        x_offset, y_offset, x_size, y_size = window
+        return values[:, y_offset:y_offset + y_size, x_offset:x_offset + x_size], \
+            window_geotransform(geotransform, x_offset, y_offset), projection
+
+    if isinstance(raster_paths, str):
+        dataset = gdal.Open(raster_paths)
+        if dataset is None:
+            raise ValueError(f"Cannot open raster: {raster_paths}")
+        sources = [(dataset, band_number) for band_number in range(1, dataset.RasterCount + 1)]
+    else:
+        sources = []
+        for raster_path in raster_paths:
+            dataset = gdal.Open(raster_path)
+            if dataset is None:
+                raise ValueError(f"Cannot open raster: {raster_path}")
+            if sources and dataset.GetGeoTransform() != sources[0][0].GetGeoTransform():
+                raise ValueError(f"Raster {raster_path} is not on the grid of {raster_paths[0]}")
+            sources.append((dataset, 1))
+
+    bands = []
+    for dataset, band_number in sources:
+        band = dataset.GetRasterBand(band_number)
+        values = (band.ReadAsArray(*window) if window is not None else band.ReadAsArray()).astype(np.float64)
+        nodata = band.GetNoDataValue()
+        if nodata is not None:
+            values[values == nodata] = np.nan
+        bands.append(values)
+
+    geotransform, projection = sources[0][0].GetGeoTransform(), sources[0][0].GetProjection()
+    if window is not None:
+        geotransform = window_geotransform(geotransform, window[0], window[1])
+    sources = dataset = None
+    return np.stack(bands), geotransform, projection
+
+
+def window_geotransform(geotransform, x_offset, y_offset):
+    """Returns the geotransform of a pixel window starting at (x_offset, y_offset) of a grid."""
+    origin_x, pixel_width, row_rotation, origin_y, column_rotation, pixel_height = geotransform
+    return (origin_x + x_offset * pixel_width + y_offset * row_rotation, pixel_width, row_rotation,
+            origin_y + x_offset * column_rotation + y_offset * pixel_height, column_rotation, pixel_height)
+
+
+def pixel_weights(geometry, geotransform, rows, columns, subpixels=COVERAGE_SUBPIXELS):
+    """
+    Computes the pixels covered by a polygon and the covered area of every pixel.
+
+    The polygon is rasterized once over its window of the grid, at subpixels x subpixels cells per pixel; the
+    covered area of a pixel is its share of covered cells times the pixel area. A polygon too small to cover
+    any cell counts on every pixel it touches, with its area split equally.
+
+    Parameters:
+    - geometry (QgsGeometry): Polygon in the CRS of the raster grid.
+    - geotransform (tuple): GDAL geotransform of the grid (north-up).
+    - rows (int): Number of rows of the grid.
+    - columns (int): Number of columns of the grid.
+    - subpixels (int): Cells per pixel side of the coverage raster.
+
+    Returns:
+    tuple: (row indices, column indices, covered areas) as NumPy arrays.
+    """
+    origin_x, pixel_width, _, origin_y, _, pixel_height = geotransform
+    box = geometry.boundingBox()
+
+    first_column = max(int(np.floor((box.xMinimum() - origin_x) / pixel_width)), 0)
+    last_column = min(int(np.floor((box.xMaximum() - origin_x) / pixel_width)), columns - 1)
+    first_row = max(int(np.floor((box.yMaximum() - origin_y) / pixel_height)), 0)
+    last_row = min(int(np.floor((box.yMinimum() - origin_y) / pixel_height)), rows - 1)
+    if last_column < first_column or last_row < first_row:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    window_columns, window_rows = last_column - first_column + 1, last_row - first_row + 1
+
+    # The polygon as a one-feature OGR layer, rasterized by GDAL over the window
+    source = ogr.GetDriverByName('Memory').CreateDataSource('')
+    layer = source.CreateLayer('site')
+    feature = ogr.Feature(layer.GetLayerDefn())
+    feature.SetGeometry(ogr.CreateGeometryFromWkb(bytes(geometry.asWkb())))
+    layer.CreateFeature(feature)
+
+    def rasterize(factor, options):
+        coverage = gdal.GetDriverByName('MEM').Create('', window_columns * factor, window_rows * factor, 1, gdal.GDT_Byte)
+        coverage.SetGeoTransform((origin_x + first_column * pixel_width, pixel_width / factor, 0.0,
+                                  origin_y + first_row * pixel_height, 0.0, pixel_height / factor))
+        gdal.RasterizeLayer(coverage, [1], layer, burn_values=[1], options=options)
+        cells = coverage.ReadAsArray().astype(np.int64)
+        return cells.reshape(window_rows, factor, window_columns, factor).sum(axis=(1, 3))
+
+    covered = rasterize(subpixels, [])
+    if covered.any():
+        areas = covered * (abs(pixel_width * pixel_height) / subpixels ** 2)
+    else:
+        touched = rasterize(1, ['ALL_TOUCHED=TRUE'])
+        areas = touched * (geometry.area() / max(touched.sum(), 1))
+
+    window_rows_index, window_columns_index = np.nonzero(areas)
+    return (window_rows_index.astype(np.int64) + first_row, window_columns_index.astype(np.int64) + first_column,
+            areas[window_rows_index, window_columns_index].astype(np.float64))
+
+
+@traced
+def monthly_zonal_statistics(base_output_path, site_layer, raster_paths, months, output_file_name, statistics=('mean', 'min', 'max'),
+                             window_mask=None):
+    """
+    Computes monthly climate values of every site in one pass over the monthly rasters.
+
+    Replaces polygonizing the monthly rasters (process_tif_files) followed by 12 intersections, 12 renames
+    and 12 joins (solar_radiation_photovoltaic_area, wind_speed_farm_area). The pixels covered by each site,
+    and their covered areas, are computed once and applied to all monthly bands together.
+
+    Parameters:
+    - base_output_path (str): The base directory of the site layer (file name) and of the output file.
+    - site_layer (str or QgsVectorLayer): The site polygons (e.g., photovoltaic_area_{province}.shp), with an 'ID' field.
+    - raster_paths (list or str): Monthly rasters on one grid, in the order of months (e.g., MAP_JANUARY_CLIPPED.tif...),
+      or one multi-band raster with a band per month (see clip_monthly_stack).
+    - months (list): Month names used as column names (e.g., ["january", "february"]).
+    - output_file_name (str): The name of the output file, or TEMPORARY_OUTPUT.
+    - statistics (tuple): Any of 'mean' (area-weighted, column named after the month), 'min' and 'max'
+      (columns named e.g. 'jan_min', 'jan_max').
+    - window_mask (str or QgsVectorLayer, optional): Read only the window of national rasters covering this mask
+      (e.g., the province buffer) instead of clipping them first (see read_band_stack).
+
+    Returns:
+    str or QgsVectorLayer: The output file path, or the in-memory layer for TEMPORARY_OUTPUT.
+    Sites not covered by any valid pixel are left out, as with the joins they replace.
+    """
+    sites = open_vector_layer(base_output_path, site_layer)
+    values, geotransform, projection = read_band_stack(raster_paths, window_mask=window_mask)
+    bands, rows, columns = values.shape
+    if bands != len(months):
+        raise ValueError(f"{bands} monthly bands for {len(months)} months")
+
+    # Site geometries are reprojected to the raster grid, the output keeps the site CRS
+    raster_crs = QgsCoordinateReferenceSystem.fromWkt(projection)
+    transform = None
+    if raster_crs.isValid() and raster_crs != sites.crs():
+        transform = QgsCoordinateTransform(sites.crs(), raster_crs, QgsProject.instance())
+
+    # Output columns: site fields followed by the monthly values
+    month_columns = []
+    for month in months:
+        for statistic in statistics:
+            month_columns.append(month if statistic == 'mean' else f"{month[:3]}_{statistic}")
+    fields = QgsFields(sites.fields())
+    for column in month_columns:
+        fields.append(QgsField(column, QVariant.Double, len=10, prec=2))
+
+    output_features = []
+    site_count = sites.featureCount()
+    for done, site in enumerate(sites.getFeatures()):
+        report_step_progress(done, site_count)
+        geometry = QgsGeometry(site.geometry())
+        if transform is not None:
+            geometry.transform(transform)
+
+        pixel_rows, pixel_columns, areas = pixel_weights(geometry, geotransform, rows, columns)
+        site_values = values[:, pixel_rows, pixel_columns]  # (months, pixels)
+        valid = ~np.isnan(site_values)
+        if not valid.any():
+            continue
+
+        weights = np.where(valid, areas, 0.0)
+        weight_sums = weights.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            results = {
+                'mean': np.where(weight_sums > 0, np.nansum(site_values * weights, axis=1) / weight_sums, np.nan),
+                'min': np.where(valid.any(axis=1), np.nanmin(np.where(valid, site_values, np.inf), axis=1), np.nan),
+                'max': np.where(valid.any(axis=1), np.nanmax(np.where(valid, site_values, -np.inf), axis=1), np.nan),
+            }
+
+        attributes = list(site.attributes())
+        for month_index in range(len(months)):
+            for statistic in statistics:
+                value = results[statistic][month_index]
+                attributes.append(None if np.isnan(value) else float(value))
+
+        output_feature = QgsFeature(fields)
+        output_feature.setGeometry(site.geometry())
+        output_feature.setAttributes(attributes)
+        output_features.append(output_feature)
+
+    output = write_vector_layer(base_output_path, output_file_name, fields, sites.wkbType(), sites.crs(), output_features)
+
+    print(f"Monthly zonal statistics computed for {len(output_features)} sites.")
+    return output
+
+
+
+##SHARED ARTIFACTS##
+
+def province_artifact(province, name, inputs, producer, parameters=None):
+    """
+    Returns a named artifact of a province from the artifact store, producing it when missing or out of date.
+
+    Without an enabled store (see enable_artifact_store) the artifact is produced in memory on every call.
+
+    Parameters:
+    - province (str): The name of the province.
+    - name (str): The artifact name (layer name in the artifact GeoPackage of the province).
+    - inputs (list): The input files of the artifact; a change of any of them produces the artifact again.
+    - producer (callable): Called as producer(output) to write the artifact, returns the output.
+    - parameters (dict, optional): Producer parameters that change the artifact.
+
+    Returns:
+    str or QgsVectorLayer: The artifact GeoPackage layer, or the in-memory layer without a store.
+    """
+    if artifact_store is None:
+        return producer(TEMPORARY_OUTPUT)
+    return artifact_store.get(province, name, inputs, producer, parameters=parameters)
+
+
+def land_cover_artifact(province, layer_paths):
+    """
+    Returns the merged PTGN/PTRK/PTTR land cover of a province (artifact 'land_cover').
+
+    Parameters:
+    - province (str): The name of the province.
+    - layer_paths (list): The BDOT10k land cover layers to merge.
+
+    Returns:
+    str or QgsVectorLayer: The merged land cover layer.
+    """
+    return province_artifact(province, "land_cover", layer_paths,
+                             lambda output: merge_vector_layers(layer_paths=layer_paths, base_output_path="", output_file_name=output))
+
+
+def medium_power_line_artifact(province, power_line_path):
+    """
+    Returns the medium-voltage power lines of a province (artifact 'medium_power_line').
+
+    Parameters:
+    - province (str): The name of the province.
+    - power_line_path (str): The BDOT10k power line layer (OT_SULN_L).
+
+    Returns:
+    str or QgsVectorLayer: The medium-voltage power line layer.
+    """
+    return province_artifact(province, "medium_power_line", [power_line_path],
+                             lambda output: select_from_layer(base_output_path="", input_path=power_line_path, output_file_name=output))
+
+
+def mask_buffer_artifact(province, mask_path, distance):
+    """
+    Returns the buffered clipping mask of a province (artifact 'mask_buffer').
+
+    Parameters:
+    - province (str): The name of the province.
+    - mask_path (str): The mask shapefile of the province (MASK_TO_CUT).
+    - distance (float): The buffer distance.
+
+    Returns:
+    str or QgsVectorLayer: The buffered mask layer.
+    """
+    return province_artifact(province, "mask_buffer", [mask_path],
+                             lambda output: buffer(base_output_path="", input_path=mask_path, output_file=output, distance=distance),
+                             parameters={'distance': distance})
@@ -0,0 +1,173 @@
+import argparse
+import os
+import tempfile
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+# Final site layers of every site type: (site GeoPackage, site layer, monthly climate GeoPackage, monthly climate layer),
+# GeoPackage paths formatted with the province name
+SITE_LAYERS = {
+    "photovoltaic": ("D:/GEOWORLDLOOK/OZE/PILOT/Step_1_Photovoltaic_farm/{province}.gpkg", "photovoltaic_area",
+                     "D:/GEOWORLDLOOK/OZE/PILOT/Step_3_Solar_surface_radiation/solar_radiation_vector/{province}.gpkg",
+                     "solar_radiation_photovoltaic_area"),
+    "wind": ("D:/GEOWORLDLOOK/OZE/PILOT/Step_2_Wind_Farm/{province}.gpkg", "windfarm_area",
+             "D:/GEOWORLDLOOK/OZE/PILOT/Step_4_wind_speed_vector/wind_speed_vector/{province}.gpkg",
+             "wind_speed_wind_farm"),
+}
+
+# Exported site attributes (missing ones are written as nulls)
+SITE_ATTRIBUTES = ["AREA", "LINE_DISTANCE", "ROAD_DISTANCE"]
+
+MONTHS = [
+    "january", "february", "march", "april",
+    "may", "june", "july", "august",
+    "september", "october", "november", "december"
+]
+
+PROVINCES = [
+    "dolnoslaskie", "kujawsko_pomorskie", "lubelskie", "lubuskie",
+    "lodzkie", "malopolskie", "mazowieckie", "opolskie",
+    "podkarpackie", "podlaskie", "pomorskie", "slaskie",
+    "swietokrzyskie", "warminsko_mazurskie", "wielkopolskie", "zachodniopomorskie"
+]
+
+# Dataset written by the export stage
+SITE_DATASET_PATH = "D:/GEOWORLDLOOK/OZE/PILOT/SITE_ATTRIBUTES"
+
+
+# 1. Read a site layer
+def _read_layer(geopackage_path, layer_name, columns, geometry=False):
+    """
+    Reads the columns of a GeoPackage layer keyed by site ID.
+
+    Args:
+        geopackage_path (str): Path of the GeoPackage.
+        layer_name (str): Name of the layer.
+        columns (list): Field names to read (missing fields are read as None).
+        geometry (bool): Also read the geometry as WKB (key 'geometry').
+
+    Returns:
+        dict: ID -> {column: value}, or None when the layer does not exist.
+    """
+    # GDAL is only needed by the export, readers of the dataset (e.g. Site_scoring) import this module without it
+    from osgeo import ogr
+
+    dataset = ogr.Open(geopackage_path)
+    if dataset is None:
+        return None
+    layer = dataset.GetLayerByName(layer_name)
+    if layer is None:
+        return None
+
+    # Read only the needed fields (and the geometry only when asked)
+    definition = layer.GetLayerDefn()
+    present = [column for column in columns if definition.GetFieldIndex(column) != -1]
+    field_names = [definition.GetFieldDefn(index).GetName() for index in range(definition.GetFieldCount())]
+    ignored = [name for name in field_names if name not in present and name != "ID"]
+    layer.SetIgnoredFields(ignored if geometry else ignored + ["OGR_GEOMETRY"])
+
+    rows = {}
+    for feature in layer:
+        row = {column: feature.GetField(column) if column in present else None for column in columns}
+        if geometry:
+            feature_geometry = feature.GetGeometryRef()
+            row['geometry'] = bytes(feature_geometry.ExportToWkb()) if feature_geometry is not None else None
+        rows[feature.GetField("ID")] = row
+    return rows
+
+
+# 2. Table of one province and site type
+def site_table(site_type, province):
+    """
+    Builds the attribute table of the final sites of one province: ID, the site attributes, the 12 monthly
+    climate values (joined by ID) and the geometry as WKB.
+
+    Args:
+        site_type (str): Key of SITE_LAYERS ('photovoltaic' or 'wind').
+        province (str): Province name.
+
+    Returns:
+        pyarrow.Table or None: The table, or None when the province has no site layer yet.
+    """
+    site_path, site_layer, climate_path, climate_layer = SITE_LAYERS[site_type]
+    sites = _read_layer(site_path.format(province=province), site_layer, SITE_ATTRIBUTES, geometry=True)
+    if sites is None:
+        return None
+    climate = _read_layer(climate_path.format(province=province), climate_layer, MONTHS) or {}
+
+    identifiers = sorted(sites)
+    columns = {'ID': pa.array(identifiers, pa.int64())}
+    for column in SITE_ATTRIBUTES:
+        columns[column] = pa.array([sites[identifier][column] for identifier in identifiers], pa.float64())
+    for month in MONTHS:
+        columns[month] = pa.array([climate.get(identifier, {}).get(month) for identifier in identifiers], pa.float64())
+    columns['geometry'] = pa.array([sites[identifier]['geometry'] for identifier in identifiers], pa.binary())
+    return pa.table(columns)
+
+
+# 3. Export
+def export_site_attributes(provinces, dataset_path=SITE_DATASET_PATH, site_types=tuple(SITE_LAYERS)):
+    """
+    Writes the final site attributes of the provinces into one columnar Parquet dataset, partitioned by site
+    type and province (hive layout: <dataset>/site_type=<type>/province=<name>/sites.parquet).
+
+    A province partition is replaced when the province is exported again, the other partitions are kept.
+
+    Args:
+        provinces (iterable): Province names.
+        dataset_path (str): Root folder of the dataset.
+        site_types (iterable): Keys of SITE_LAYERS to export.
+
+    Returns:
+        int: Number of sites written.
+    """
+    written = 0
+    for site_type in site_types:
+        for province in provinces:
+            table = site_table(site_type, province)
+            if table is None:
+                print(f"No {site_type} sites for {province}, skipped.")
+                continue
+            partition = os.path.join(dataset_path, f"site_type={site_type}", f"province={province}")
+            os.makedirs(partition, exist_ok=True)
+            descriptor, temporary_path = tempfile.mkstemp(dir=partition, prefix="sites.parquet.", suffix='.tmp')
+            os.close(descriptor)
+            pq.write_table(table, temporary_path, compression='zstd')
+            os.replace(temporary_path, os.path.join(partition, "sites.parquet"))
+            written += table.num_rows
+
+    print(f"Site attribute export completed, {written} sites written.")
+    return written
+
+
+def read_site_attributes(columns=None, filter=None, dataset_path=SITE_DATASET_PATH):
+    """
+    Reads columns of the site dataset of all provinces.
+
+    Args:
+        columns (list, optional): Columns to read (e.g. ['province', 'ID', 'june']); default all.
+        filter (pyarrow.dataset.Expression, optional): Row filter, e.g. ds.field('site_type') == 'wind'.
+        dataset_path (str): Root folder of the dataset.
+
+    Returns:
+        pyarrow.Table: The selected columns and rows.
+    """
+    dataset = ds.dataset(dataset_path, format='parquet', partitioning='hive')
+    return dataset.to_table(columns=columns, filter=filter)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the final site attributes of all provinces to a Parquet dataset.")
+    parser.add_argument("--provinces", nargs="*", default=None, help="Province names to export (default: all).")
+    parser.add_argument("--site-types", nargs="+", default=sorted(SITE_LAYERS), choices=sorted(SITE_LAYERS))
+    parser.add_argument("--dataset", default=SITE_DATASET_PATH, help="Root folder of the dataset.")
+    args = parser.parse_args()
+
+    export_site_attributes(args.provinces or PROVINCES, dataset_path=args.dataset, site_types=args.site_types)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import warnings
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from Site_attribute_export import read_site_attributes, MONTHS, SITE_DATASET_PATH
+
+
+# Criteria of every site type: column -> (weight, 'max' when higher values are better or 'min' when lower are better).
+# MONTHLY_MEAN is the mean of the 12 monthly climate values (solar radiation or wind speed).
+CRITERIA = {
+    "photovoltaic": {
+        "MONTHLY_MEAN": (0.5, 'max'),
+        "AREA": (0.3, 'max'),
+        "LINE_DISTANCE": (0.2, 'min'),
+    },
+    "wind": {
+        "MONTHLY_MEAN": (0.6, 'max'),
+        "AREA": (0.2, 'max'),
+        "LINE_DISTANCE": (0.2, 'min'),
+    },
+}
+
+
+# 1. Scores
+def _column(table, name):
+    """Returns a column as a float array (nulls as NaN); MONTHLY_MEAN is the mean of the monthly columns."""
+    if name == "MONTHLY_MEAN":
+        months = np.column_stack([_column(table, month) for month in MONTHS])
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # sites without climate values stay NaN
+            return np.nanmean(months, axis=1)
+    return table.column(name).to_numpy(zero_copy_only=False).astype(np.float64)
+
+
+def score_sites(table, criteria):
+    """
+    Computes the weighted score of every site at once.
+
+    Every criterion is min-max normalized over all sites of the table (reversed for 'min' criteria), so
+    scores of different provinces are comparable; a site missing a value gets 0 for that criterion.
+    The score is the weighted mean of the normalized criteria, between 0 and 1.
+
+    Args:
+        table (pyarrow.Table): Site attributes (see Site_attribute_export.read_site_attributes).
+        criteria (dict): Column -> (weight, 'max' or 'min').
+
+    Returns:
+        numpy.ndarray: Score of every row of the table.
+    """
+    scores = np.zeros(table.num_rows)
+    total_weight = sum(weight for weight, _ in criteria.values())
+    for name, (weight, direction) in criteria.items():
+        values = _column(table, name)
+        valid = ~np.isnan(values)
+        if not valid.any():
+            continue
+        low, high = values[valid].min(), values[valid].max()
+        normalized = (values - low) / (high - low) if high > low else np.ones_like(values)
+        if direction == 'min':
+            normalized = 1 - normalized
+        scores += weight * np.where(valid, normalized, 0)
+    return scores / total_weight
+
+
+# 2. Top-k selection
+def top_k(scores, k, groups=None):
+    """
+    Selects the indices of the k highest scores, overall or per group, best first.
+
+    Overall selection is a partial sort (numpy.argpartition) followed by sorting only the k selected scores.
+    Per group, rows are sorted by group and descending score in one pass and the first k of every group kept.
+
+    Args:
+        scores (numpy.ndarray): Scores.
+        k (int): Number of rows to keep (per group with groups).
+        groups (numpy.ndarray, optional): Group of every row (e.g. province names).
+
+    Returns:
+        numpy.ndarray: Selected row indices (grouped by group with groups).
+    """
+    if groups is None:
+        if k < len(scores):
+            selected = np.argpartition(-scores, k)[:k]
+        else:
+            selected = np.arange(len(scores))
+        return selected[np.argsort(-scores[selected], kind='stable')]
+
+    _, group_codes = np.unique(groups, return_inverse=True)
+    order = np.lexsort((-scores, group_codes))
+    sorted_codes = group_codes[order]
+    group_starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    rank = np.arange(len(order)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(order)]))
+    return order[rank < k]
+
+
+def top_sites(site_type, k=100, per_province=False, criteria=None, dataset_path=SITE_DATASET_PATH):
+    """
+    Returns the best sites of a type nationally or per province.
+
+    Only the columns used by the criteria are read from the site dataset (written by Site_attribute_export).
+
+    Args:
+        site_type (str): 'photovoltaic' or 'wind'.
+        k (int): Number of sites (per province with per_province).
+        per_province (bool): Select the k best sites of every province instead of nationally.
+        criteria (dict, optional): Column -> (weight, 'max' or 'min'); defaults to CRITERIA[site_type].
+        dataset_path (str): Root folder of the site dataset.
+
+    Returns:
+        pyarrow.Table: province, ID, the criteria columns and SCORE of the selected sites, best first.
+    """
+    criteria = criteria or CRITERIA[site_type]
+    columns = ['province', 'ID']
+    for name in criteria:
+        columns.extend(MONTHS if name == "MONTHLY_MEAN" else [name])
+    table = read_site_attributes(columns=columns, filter=ds.field('site_type') == site_type, dataset_path=dataset_path)
+
+    scores = score_sites(table, criteria)
+    groups = table.column('province').to_numpy(zero_copy_only=False) if per_province else None
+    selected = top_k(scores, k, groups)
+
+    result = table.take(pa.array(selected, pa.int64()))
+    result = result.append_column('SCORE', pa.array(scores[selected], pa.float64()))
+    print(f"Site scoring completed: {len(selected)} of {table.num_rows} {site_type} sites selected.")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank the candidate sites of all provinces.")
+    parser.add_argument("site_type", choices=sorted(CRITERIA), help="Site type.")
+    parser.add_argument("--top", type=int, default=100, help="Number of sites (per province with --per-province).")
+    parser.add_argument("--per-province", action="store_true", help="Select the best sites of every province.")
+    parser.add_argument("--dataset", default=SITE_DATASET_PATH, help="Root folder of the site dataset.")
+    parser.add_argument("--output", default=None, help="CSV file of the selected sites (default: print them).")
+    args = parser.parse_args()
+
+    result = top_sites(args.site_type, k=args.top, per_province=args.per_province, dataset_path=args.dataset)
+    if args.output:
+        import pyarrow.csv as csv
+        csv.write_csv(result, args.output)
+    else:
+        for row in result.select(['province', 'ID', 'SCORE']).to_pylist():
+            print(f"{row['province']:<22}{row['ID']:>10}{row['SCORE']:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,23 @@ import sys
 sys.path.append('D:/GEOWORLDLOOK/OZE/Renewable_energy_optimum_location')
 
 from Renewable_energy_optimum_location_function import *
+from Pipeline_scheduler import Task, TaskResult, run_dag
 
 # Define base input and output paths
 base_input_path = "D:/GEOWORLDLOOK/OZE/PILOT/Data"
 base_output_path = "D:/GEOWORLDLOOK/OZE/PILOT/Step_1_Photovoltaic_farm"
 
-# Create the output folder if it does not exist
-create_directory_if_not_exists(base_output_path)
+# Reuse unchanged steps (terrain aspect, polygonize, ...) when the script is rerun
+enable_step_cache(os.path.join(base_output_path, "STEP_CACHE"))
+
+# Per-step timing, memory, I/O and feature counts (JSON lines in TRACE/)
+enable_trace(os.path.join(base_output_path, "TRACE"))
+
+# Intermediate layers shared with the other steps (merged land cover, medium-voltage lines, buffered mask)
+enable_artifact_store("D:/GEOWORLDLOOK/OZE/PILOT/ARTIFACTS")
+
+# Snap overlays to a 1 cm grid (EPSG:2180) and drop the slivers collapsing on it
+enable_precision_grid(0.01)
 
 # 1. Define layers used for identifying potential photovoltaic areas
 # Topographic Object Database (BDOT10k)
@@ -40,8 +50,29 @@ provinces = {
     "32": ("zachodniopomorskie", "339")
 }
 
-# Loop through each province to perform operations
-for key, (province, number) in provinces.items():
+# Progress and ETA of every province (learned from earlier runs); creating the STOP file cancels the run cleanly
+enable_progress(total_provinces=len(provinces), history_path=os.path.join(base_output_path, "PROGRESS.json"),
+                stop_file=os.path.join(base_output_path, "STOP"))
+
+
+@traced_province
+def process_photovoltaic_area_for_province(key, province, number, base_input_path=base_input_path, base_output_path=base_output_path):
+    """
+    Identifies potential photovoltaic areas for a single province.
+
+    Args:
+        key (str): Province key (TERYT code).
+        province (str): Name of the province.
+        number (str): BDOT10k package number of the province.
+        base_input_path (str): Folder with the input data.
+        base_output_path (str): Folder where the output files are saved.
+    """
+    # Create the output folder if it does not exist
+    create_directory_if_not_exists(base_output_path)
+
+    # Vector results of the province are written as layers of one GeoPackage
+    province_geopackage = f"{province}.gpkg"
+
     # Layer paths for each province
     layer_paths = [
         f"D:/GEOWORLDLOOK/OZE/PILOT/Data/BDOT/PL.PZGiK.{number}.BDOT10k.{key}__OT_PTGN_A.shp",
@@ -53,23 +84,21 @@ for key, (province, number) in provinces.items():
     print(layer_paths_2)
     print(layer_paths)
 
-    # Merge the layers for each province
-    merge_areas = f"Merge_layers_area_{province}.shp"
-    output_path_1 = os.path.join(base_output_path, merge_areas)
-    processing.run("native:mergevectorlayers", {
-        'LAYERS': layer_paths,
-        'CRS': QgsCoordinateReferenceSystem('EPSG:2180'),
-        'OUTPUT': output_path_1
-    })
+    # The steps below form a dependency graph: the BDOT branch (merge, repair, split) and the terrain branch
+    # (aspect, exposure) run at the same time; an interrupted run resumes from the last completed step
+    # Intermediate vector layers are kept in memory (TEMPORARY_OUTPUT); only the sinks below are written to disk
+    tasks = []
+
+    # Merge the layers for each province (shared artifact, Step 2 reuses it)
+    tasks.append(Task("land_cover", land_cover_artifact, args=(province, layer_paths)))
 
     # Repair the merged layer geometry
-    repair_layer_file = f"repair_layer_{province}.shp"
-    repair_geometry(base_output_path=base_output_path, base_layer=merge_areas,
-                    output_layer_name_repair=repair_layer_file)
+    tasks.append(Task("repair_geometry", repair_geometry, kwargs=dict(
+        base_output_path=base_output_path, base_layer=TaskResult("land_cover"), output_layer_name_repair=TEMPORARY_OUTPUT)))
 
     # Split the repaired geometry into individual parts
-    split_potencial_area_repair = f"repair_layer_split_{province}.shp"
-    split_into_single_parts(base_output_path=base_output_path, input_file_name=repair_layer_file, output_file_name=split_potencial_area_repair)
+    tasks.append(Task("split_land_cover", split_into_single_parts, kwargs=dict(
+        base_output_path=base_output_path, input_file_name=TaskResult("repair_geometry"), output_file_name=TEMPORARY_OUTPUT)))
 
     # 2. Terrain aspect calculation
     input_folder_aspect = base_input_path + "/NMT/"
@@ -77,9 +106,13 @@ for key, (province, number) in provinces.items():
     output_folder_aspect = base_output_path + "/TERRAIN_ASPECT/"
     output_file_aspect = f"{province}_aspect.tif"
 
-    # Calculate terrain aspect
-    calculate_terrain_aspect(input_folder=input_folder_aspect, input_file_name=input_file_aspect,
-                             output_folder=output_folder_aspect, output_file_name=output_file_aspect)
+    # Calculate terrain aspect (tiles of the high-resolution NMT computed in parallel); GDAL only, so it runs in
+    # a worker thread while the QGIS steps of the BDOT branch run on this thread
+    aspect_workers = max(thread_budget() // 2, 1)
+    tasks.append(Task("terrain_aspect", calculate_terrain_aspect, kwargs=dict(
+        input_folder=input_folder_aspect, input_file_name=input_file_aspect, output_folder=output_folder_aspect,
+        output_file_name=output_file_aspect, tile_size=4096, workers=aspect_workers), cores=aspect_workers,
+        thread_safe=True))
 
     # 3. Convert terrain aspect to vector data
     output_folder_raster = base_output_path + "/EXPOSURE_WS_S_ES/"
@@ -88,88 +121,47 @@ for key, (province, number) in provinces.items():
     output_vector_file = f"EXPOSURE_VECTOR_{province}.shp"
 
     # Raster to vector conversion
-    raster_to_vector_conversion(raster_input=output_folder_aspect + output_file_aspect, output_folder_raster=output_folder_raster,
-                                output_raster_filename=output_raster_file, output_vector_folder=output_vector_folder, output_vector_file=output_vector_file)
+    tasks.append(Task("exposure_vector", raster_to_vector_conversion, kwargs=dict(
+        raster_input=TaskResult("terrain_aspect"), output_folder_raster=output_folder_raster, output_raster_filename=output_raster_file,
+        output_vector_folder=output_vector_folder, output_vector_file=output_vector_file)))
 
     # 4. Filter areas that meet the specified criteria
     filter_value = '"DN" = 1'
-    output_file_filter = f"EXPOSURE_VECTOR_TRUE_{province}.shp"
-    filter_values_condition_1(filter_value=filter_value, base_input_path=output_vector_folder, input_filename=output_vector_file,
-                              base_output_path=base_output_path, output_file=output_file_filter)
-
-    # 5. Select areas that fit criteria and overlay them with BDOT data
-    output_potencial_area = f"POTENCIAL_PHOTOVOLTAIC_AREA_{province}.shp"
-    intersection_exposure_bdot(base_output_path=base_output_path, base_layer=output_file_filter, overlay_layer=split_potencial_area_repair,
-                               output_file_name=output_potencial_area)
-
-    # 6. Split potential areas into individual parts
-    split_potencial_area = f"SPLIT_POTENCIAL_AREA_{province}.shp"
-    split_into_single_parts(base_output_path=base_output_path, input_file_name=output_potencial_area, output_file_name=split_potencial_area)
+    tasks.append(Task("exposure_true", filter_values_condition_1, kwargs=dict(
+        filter_value=filter_value, base_input_path=output_vector_folder, input_filename=TaskResult("exposure_vector"),
+        base_output_path=base_output_path, output_file=TEMPORARY_OUTPUT)))
 
-    # 7. Calculate area of split parts
-    calculate_split_area = f"calculate_split_area_{province}.shp"
-    calculate_area(base_output_path=base_output_path, input_file=split_potencial_area, output_file=calculate_split_area)
+    # 5. Select areas that fit criteria and overlay them with BDOT data (5 km grid cells intersected in parallel)
+    tasks.append(Task("potencial_area", intersection_exposure_bdot, kwargs=dict(
+        base_output_path=base_output_path, base_layer=TaskResult("exposure_true"), overlay_layer=TaskResult("split_land_cover"),
+        output_file_name=TEMPORARY_OUTPUT, cell_size=5000)))
 
-    # 8. Filter areas larger than the given value
-    filter_area_more_than = f"filter_area_by_area_condition_{province}.shp"
-    condition = '"AREA" > 20000'
-    filter_areas(base_output_path=base_output_path, input_file=calculate_split_area, output_file=filter_area_more_than, variable=condition)
+    # 6. Split potential areas into individual parts, keep parts larger than 20000 m² and add an ID column
+    #    for future selections (one pass)
+    tasks.append(Task("areas_with_id", split_area_filter_id, kwargs=dict(
+        base_output_path=base_output_path, input_file=TaskResult("potencial_area"), output_file=TEMPORARY_OUTPUT, min_area=20000)))
 
-    # 9. Add ID column to the filtered areas for future selections
-    add_id_to_file = f"area_id_{province}.shp"
-    add_id(base_output_path=base_output_path, input_file=filter_area_more_than, output_file=add_id_to_file)
-
-    # 10. Select medium power lines from BDOT data
+    # 7. Select medium power lines from BDOT data (shared artifact, Step 2 reuses it)
     input_voltage_path_11 = base_input_path + f"/BDOT/PL.PZGiK.{number}.BDOT10k.{key}__OT_SULN_L.shp"
-    medium_power_line = f"medium_power_line_{province}.shp"
-    select_from_layer(base_output_path=base_output_path, input_path=input_voltage_path_11, output_file_name=medium_power_line)
-
-    # 11. Calculate distance to power lines
-    distance_to_line = f"distance_to_line_{province}.shp"
-    calculate_distance(base_output_path=base_output_path, source_layer=add_id_to_file, destination_layer=medium_power_line, output_file_name=distance_to_line)
-
-    # 12. Join calculated distances to area data by ID
-    field_1 = 'ID'
-    field_2 = 'ID'
-    field_to_copy = 'distance'
-    area_with_distance_to_power_line = f"area_with_distance_to_power_line_{province}.shp"
-    join_attributes_with_distances(base_output_path=base_output_path, field_1=field_1, field_2=field_2, field_to_copy=field_to_copy,
-                                   base_file=add_id_to_file, file_from_copy=distance_to_line, output_file_name=area_with_distance_to_power_line)
-
-    # 13. Filter areas based on distance criteria (distance < 500m)
-    variable_14 = '"distance" < 500'
-    area_in_distance_criterium_to_line = f"area_distance_criterium_line_{province}.shp"
-    filter_areas(base_output_path=base_output_path, input_file=area_with_distance_to_power_line, output_file=area_in_distance_criterium_to_line, variable=variable_14)
-
-    # 14. Rename distance column to LINE_DISTANCE
-    new_name = 'LINE_DISTANCE'
-    field_to_rename = 'distance'
-    area_distance_criterium_line_rename = f"area_distance_criterium_line_rename_{province}.shp"
-    rename_column(base_output_path=base_output_path, input_file=area_in_distance_criterium_to_line, output_file=area_distance_criterium_line_rename,
-                  current_field=field_to_rename, new_field=new_name)
-
-    # 16. Calculate distance to roads
-    distance_to_road = f"distance_to_road_{province}.shp"
-    road_file_path = base_input_path + f"/BDOT/PL.PZGiK.{number}.BDOT10k.{key}__OT_SKJZ_L.shp"
+    tasks.append(Task("medium_power_line", medium_power_line_artifact, args=(province, input_voltage_path_11)))
 
-    # Calculate the distance from areas to roads
-    calculate_distance(base_output_path=base_output_path,
-                       source_layer=area_distance_criterium_line_rename,
-                       destination_layer=road_file_path,
-                       output_file_name=distance_to_road)
-
-    # 17. Select and join the distance column by ID from the road distance data to the area data
-    select_column_distance_road = f"select_column_distance_to_road_{province}.shp"
-    field_1 = 'ID'
-    field_2 = 'ID'
-    field_to_copy = 'distance'
-
-    # Join the road distance column to the area layer
-    join_attributes_with_distances(field_1=field_1, field_2=field_2, field_to_copy=field_to_copy,
-                                   base_output_path=base_output_path, base_file=area_distance_criterium_line_rename,
-                                   file_from_copy=distance_to_road, output_file_name=select_column_distance_road)
-
-    # 18. Rename the distance column to 'ROAD_DISTANCE'
-    photovoltaic_area = f"photovoltaic_area_{province}.shp"
-    rename_column(base_output_path=base_output_path, file_to_rename=select_column_distance_road,
-                  field_to_rename='distance', new_name='ROAD_DISTANCE', output_file_name=photovoltaic_area)
+    # 8. Calculate distances to power lines and roads (one pass, written directly as LINE_DISTANCE and ROAD_DISTANCE),
+    #    keep areas closer than 500 m to a power line and write the final layer to disk
+    road_file_path = base_input_path + f"/BDOT/PL.PZGiK.{number}.BDOT10k.{key}__OT_SKJZ_L.shp"
+    destination_layers = {'LINE_DISTANCE': TaskResult("medium_power_line"), 'ROAD_DISTANCE': road_file_path}
+    photovoltaic_area = geopackage_layer(province_geopackage, "photovoltaic_area")
+    tasks.append(Task("photovoltaic_area", calculate_nearest_distances, kwargs=dict(
+        base_output_path=base_output_path, source_layer=TaskResult("areas_with_id"), destination_layers=destination_layers,
+        output_file_name=photovoltaic_area, max_distances={'LINE_DISTANCE': 500})))
+
+    # The state is kept only until the province succeeds: an interrupted run resumes, a completed one reruns in full
+    # (unchanged algorithms and artifacts are then reused by the step cache and the artifact store)
+    failed = run_dag(tasks, state_path=os.path.join(base_output_path, "DAG_STATE", f"{province}.json"), keep_state=False)
+    if failed:
+        raise RuntimeError(f"Photovoltaic area of {province} failed:\n" + "\n".join(failed.values()))
+
+
+if __name__ == "__main__":
+    # Loop through each province to perform operations
+    for key, (province, number) in provinces.items():
+        process_photovoltaic_area_for_province(key, province, number)
@@ -12,6 +12,18 @@ from Renewable_energy_optimum_location_function import *
 base_input_path = "D:/GEOWORLDLOOK/OZE/PILOT/Data"
 base_output_path = "D:/GEOWORLDLOOK/OZE/PILOT/Step_2_Wind_Farm"
 
+# Reuse unchanged steps when the script is rerun
+enable_step_cache(os.path.join(base_output_path, "STEP_CACHE"))
+
+# Per-step timing, memory, I/O and feature counts (JSON lines in TRACE/)
+enable_trace(os.path.join(base_output_path, "TRACE"))
+
+# Intermediate layers shared with the other steps (merged land cover, medium-voltage lines, buffered mask)
+enable_artifact_store("D:/GEOWORLDLOOK/OZE/PILOT/ARTIFACTS")
+
+# Snap overlays to a 1 cm grid (EPSG:2180) and drop the slivers collapsing on it
+enable_precision_grid(0.01)
+
 # Dictionary containing province codes, names, and identification numbers
 provinces = {
     "02": ("dolnoslaskie", "337"),
@@ -32,22 +44,36 @@ provinces = {
     "32": ("zachodniopomorskie", "339")
 }
 
-# Iterate through each province, performing geospatial operations for wind farm locations
-for key, (province, number) in provinces.items():
+# Progress and ETA of every province (learned from earlier runs); creating the STOP file cancels the run cleanly
+enable_progress(total_provinces=len(provinces), history_path=os.path.join(base_output_path, "PROGRESS.json"),
+                stop_file=os.path.join(base_output_path, "STOP"))
+
+
+@traced_province
+def process_wind_farm_for_province(key, province, number, base_input_path=base_input_path, base_output_path=base_output_path):
     """
-    Looping through each province to perform various operations like creating buffers, merging layers,
-    calculating areas, filtering, and calculating distances for optimal wind farm location.
+    Performs various operations like creating buffers, merging layers, calculating areas, filtering,
+    and calculating distances for optimal wind farm location in a single province.
+
+    Args:
+        key (str): Province key (TERYT code).
+        province (str): Name of the province.
+        number (str): BDOT10k package number of the province.
+        base_input_path (str): Folder with the input data.
+        base_output_path (str): Folder where the output files are saved.
     """
 
     # 1. Create output folder if it doesn't exist
     create_directory_if_not_exists(base_output_path)
 
     # 2. Create a buffer around areas of interest
+    # Intermediate vector layers are kept in memory (TEMPORARY_OUTPUT); only the final layer is written to disk
     distance = 800  # Buffer distance in meters
     input_path = os.path.join(base_input_path, f"BDOT/PL.PZGiK.{number}.BDOT10k.{key}__OT_BUBD_A.shp")
-    output_file_buffer = f"WIND_FARM_BUFFER_{province}.shp"
 
-    buffer(base_output_path=base_output_path, input_path=input_path, output_file=output_file_buffer, distance=distance)
+    # (buffered and dissolved per 10 km tile in parallel; the tiles are subtracted one by one in step 8)
+    wind_farm_buffer = buffer(base_output_path=base_output_path, input_path=input_path, output_file=TEMPORARY_OUTPUT, distance=distance,
+                              tile_size=10000)
 
     # 3. Define paths for layers to merge (potential wind farm areas)
     layer_paths = [
@@ -56,69 +82,38 @@ for key, (province, number) in provinces.items():
         f"D:/GEOWORLDLOOK/OZE/PILOT/Data/BDOT/PL.PZGiK.{number}.BDOT10k.{key}__OT_PTTR_A_ROSLINOSC_TRAWIASTA.shp"
     ]
 
-    # 4. Merge potential wind farm areas into one shapefile
-    merge_areas = os.path.join("D:/GEOWORLDLOOK/OZE/PILOT/Step_1_Photovoltaic_farm", f"Merge_layers_area_{province}.shp")
-    merge_vector_layers(layer_paths=layer_paths, base_output_path=base_output_path, output_file_name=merge_areas)
-
-    # 5. Split merged areas into individual parts
-    output_file_name_merge_area_split = f"merge_area_split_{province}.shp"
-    split_into_single_parts(base_output_path=base_output_path, input_file_name=merge_areas, output_file_name=output_file_name_merge_area_split)
-
-    # 6. Calculate the area of each part
-    output_file_3 = f"calculate_area_split_{province}.shp"
-    calculate_area(base_output_path=base_output_path, input_file=output_file_name_merge_area_split, output_file=output_file_3)
+    # 4. Merge potential wind farm areas into one layer (shared artifact, merged once by Step 1)
+    merge_areas = land_cover_artifact(province, layer_paths)
 
-    # 7. Filter areas larger than 10,000 square meters
-    output_file_4 = f"calculate_area_split_above_10000_{province}.shp"
-    variable = '"AREA" > 10000'
-    filter_areas(base_output_path=base_output_path, input_file=output_file_3, output_file=output_file_4, variable=variable)
+    # 5. Split merged areas into individual parts and keep parts larger than 10,000 square meters (one pass)
+    area_split_above_10000 = split_area_filter_id(base_output_path=base_output_path, input_file=merge_areas,
+                                                  output_file=TEMPORARY_OUTPUT, min_area=10000, id_field=None)
 
-    # 8. Group layers by common attributes
-    group_layer_file = f"grouping_layer_in_diff_{province}.shp"
-    group_layer(base_output_path=base_output_path, base_layer=output_file_4, output_layer_group=group_layer_file)
+    # 6. Group layers by common attributes
+    grouped_layer = group_layer(base_output_path=base_output_path, base_layer=area_split_above_10000, output_layer_group=TEMPORARY_OUTPUT)
 
-    # 9. Repair geometry of the grouped layers
-    repair_layer_file = f"repair_layer_in_diff_{province}.shp"
-    repair_geometry(base_output_path=base_output_path, base_layer=group_layer_file, output_layer_name_repair=repair_layer_file)
+    # 7. Repair geometry of the grouped layers
+    repair_layer = repair_geometry(base_output_path=base_output_path, base_layer=grouped_layer, output_layer_name_repair=TEMPORARY_OUTPUT)
 
-    # 10. Find the difference between buffered areas and repaired layers
-    wind_farm_area = f"wind_farm_area_{province}.shp"
+    # 8. Find the difference between buffered areas and repaired layers
     variable_to_area = '"AREA" > 10000'
-    difference_between_layers(base_output_path=base_output_path, base_layer=repair_layer_file,
-                              overlay_layer=output_file_buffer, output_file_name=wind_farm_area, variable_to_area=variable_to_area)
-
-    # 11. Split the resulting wind farm areas into single parts
-    split_layer = f"split_layer_in_diff_{province}.shp"
-    split_into_single_parts(base_output_path=base_output_path, input_file_name=wind_farm_area, output_file_name=split_layer)
-
-    # 12. Calculate the area of each part again
-    calculate_area_layer = f"calculate_area_in_diff_{province}.shp"
-    calculate_area(base_output_path=base_output_path, input_file=split_layer, output_file=calculate_area_layer)
-
-    # 13. Filter areas larger than 10,000 square meters again
-    filter_area_layer = f"filter_area_in_diff_{province}.shp"
-    filter_areas(base_output_path=base_output_path, input_file=calculate_area_layer, output_file=filter_area_layer, variable=variable_to_area)
-
-    # 14. Add unique ID to the areas for further processing
-    wind_farm_area_id = f"wind_farm_area_id_{province}.shp"
-    add_id(base_output_path=base_output_path, input_file=filter_area_layer, output_file=wind_farm_area_id)
-
-    # 15. Calculate the distance from wind farm areas to medium-voltage power lines
-    medium_voltage_path = f"D:/GEOWORLDLOOK/OZE/PILOT/Step_1_Photovoltaic_farm"
-    medium_power_line = f"medium_power_line_{province}.shp"
-    medium_voltage_line = os.path.join(medium_voltage_path, medium_power_line)
-    wind_farm_distance_to_line = f"distance_wind_farm_to_line_{province}.shp"
-    calculate_distance(base_output_path=base_output_path, source_layer=wind_farm_area_id, destination_layer=medium_voltage_line, output_file_name=wind_farm_distance_to_line)
-
-    # 16. Join calculated distances with wind farm areas by their unique IDs
-    field_1 = 'ID'
-    field_2 = 'ID'
-    field_to_copy = 'distance'
-    wind_farm_area_id_distance = f"wind_farm_area_id_distance_{province}.shp"
-    join_attributes_with_distances(base_output_path=base_output_path, field_1=field_1, field_2=field_2, field_to_copy=field_to_copy,
-                                   base_file=wind_farm_area_id, file_from_copy=wind_farm_distance_to_line, output_file_name=wind_farm_area_id_distance)
-
-    # 17. Filter wind farm areas based on distance from power lines (e.g., areas within 800 meters of power lines)
-    variable_wind_farm_line_distance = '"distance" < 800'
-    wind_farm_area_with_distance_criterium = f"windfarm_area_{province}.shp"
-    filter_areas(base_output_path=base_output_path, input_file=wind_farm_area_id_distance, output_file=wind_farm_area_with_distance_criterium, variable=variable_wind_farm_line_distance)
+    wind_farm_area = difference_between_layers(base_output_path=base_output_path, base_layer=repair_layer,
+                                               overlay_layer=wind_farm_buffer, output_file_name=TEMPORARY_OUTPUT, variable_to_area=variable_to_area)
+
+    # 9. Split the resulting wind farm areas into single parts, keep parts larger than 10,000 square meters
+    #    and add a unique ID for further processing (one pass)
+    wind_farm_area_id = split_area_filter_id(base_output_path=base_output_path, input_file=wind_farm_area,
+                                             output_file=TEMPORARY_OUTPUT, min_area=10000)
+
+    # 10. Calculate the distance from wind farm areas to medium-voltage power lines (written directly as LINE_DISTANCE),
+    #     keep areas within 800 meters of power lines and write the final layer to disk
+    medium_voltage_line = medium_power_line_artifact(province, os.path.join(base_input_path, f"BDOT/PL.PZGiK.{number}.BDOT10k.{key}__OT_SULN_L.shp"))
+    wind_farm_area_with_distance_criterium = geopackage_layer(f"{province}.gpkg", "windfarm_area")
+    calculate_nearest_distances(base_output_path=base_output_path, source_layer=wind_farm_area_id, destination_layers={'LINE_DISTANCE': medium_voltage_line},
+                                output_file_name=wind_farm_area_with_distance_criterium, max_distances={'LINE_DISTANCE': 800})
+
+
+if __name__ == "__main__":
+    # Iterate through each province, performing geospatial operations for wind farm locations
+    for key, (province, number) in provinces.items():
+        process_wind_farm_for_province(key, province, number)
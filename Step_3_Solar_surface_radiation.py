@@ -1,8 +1,8 @@
 import sys
 import os
-import processing
-from Renewable_energy_optimum_location_function import create_directory_if_not_exists, buffer, process_sunlight_data, \
-    process_tif_files, solar_radiation_photovoltaic_area
+from Renewable_energy_optimum_location_function import create_directory_if_not_exists, monthly_zonal_statistics, \
+    enable_step_cache, geopackage_layer, enable_trace, traced_province, enable_artifact_store, mask_buffer_artifact, \
+    enable_window_index, enable_raster_memmap, enable_progress
 
 # Add path to the folder containing modules
 sys.path.append('D:/GEOWORLDLOOK/OZE/Renewable_energy_optimum_location')
@@ -12,6 +12,21 @@ BASE_INPUT_PATH = "D:/GEOWORLDLOOK/OZE/PILOT/Data/"
 BASE_OUTPUT_PATH = "D:/GEOWORLDLOOK/OZE/PILOT/Step_3_Solar_surface_radiation/solar_radiation_vector"
 create_directory_if_not_exists(BASE_OUTPUT_PATH)
 
+# Reuse unchanged steps (clipping, polygonize, ...) when the script is rerun
+enable_step_cache(os.path.join(BASE_OUTPUT_PATH, "STEP_CACHE"))
+
+# Per-step timing, memory, I/O and feature counts (JSON lines in TRACE/)
+enable_trace(os.path.join(BASE_OUTPUT_PATH, "TRACE"))
+
+# Buffered masks shared with Step 4
+enable_artifact_store("D:/GEOWORLDLOOK/OZE/PILOT/ARTIFACTS")
+
+# Province windows of the national rasters, computed once and shared with Step 4
+enable_window_index("D:/GEOWORLDLOOK/OZE/PILOT/ARTIFACTS/province_windows.json")
+
+# National monthly rasters mapped once (memory-mapped sidecar shared by the workers), read by province window
+enable_raster_memmap("D:/GEOWORLDLOOK/OZE/PILOT/ARTIFACTS/RASTER_MEMMAP")
+
 # List of months to process
 MONTHS = [
     "january", "february", "march", "april",
@@ -39,7 +54,12 @@ PROVINCES = {
     "32": ("zachodniopomorskie", "339")
 }
 
+# Progress and ETA of every province (learned from earlier runs); creating the STOP file cancels the run cleanly
+enable_progress(total_provinces=len(PROVINCES), history_path=os.path.join(BASE_OUTPUT_PATH, "PROGRESS.json"),
+                stop_file=os.path.join(BASE_OUTPUT_PATH, "STOP"))
 
+
+@traced_province
 def process_province_data(key, province, number):
     """
     Process solar radiation data for a specific province.
@@ -50,33 +70,24 @@ def process_province_data(key, province, number):
         number (str): Number associated with the province.
     """
     # 1. Create a buffer for the shape to cut (since solar radiation vector data doesn't cover the whole area)
+    #    (shared artifact, Step 4 reuses it)
     distance = 1
     mask_shapefile = os.path.join(BASE_INPUT_PATH, f"MASK_TO_CUT/{province}.shp")
-    output_buffer_dir = os.path.join(BASE_OUTPUT_PATH, "MASK_TO_CUT_BUFFER")
-    create_directory_if_not_exists(output_buffer_dir)
-
-    output_buffer = os.path.join(output_buffer_dir, f"{province}_BUFFOR.shp")
-    buffer(base_output_path=BASE_OUTPUT_PATH, input_path=mask_shapefile, output_file=output_buffer, distance=distance)
+    output_buffer = mask_buffer_artifact(province, mask_shapefile, distance)
 
-    # 2. Process sunlight data
+    # 2. National monthly sunlight rasters, read only in the window of the province buffer (no clipping, the
+    #    photovoltaic areas are overlaid in step 3)
     input_folder = os.path.join(BASE_INPUT_PATH, "SURFACE_RADIATION_1991_2020")
-    output_folder = os.path.join(BASE_OUTPUT_PATH, "CLIP_RADIATION")
-    process_sunlight_data(months=MONTHS, input_folder=input_folder, output_folder=output_folder,
-                          mask_shapefile=output_buffer)
-
-    # 3. Convert raster to vector
-    output_file_name = f"solar_radiation_vector_{province}"
-    field_name = "Solar_surface_radiation_[Wm2]"
-    process_tif_files(base_input_path=output_folder, base_output_path=BASE_OUTPUT_PATH,
-                      output_file_name=output_file_name, field_name=field_name, months=MONTHS)
-
-    # 4. Create solar radiation to photovoltaic area for each month
-    photovoltaic_area_path = f"D:/GEOWORLDLOOK/OZE/PILOT/Step_1_Photovoltaic_farm/photovoltaic_area_{province}.shp"
-    solar_radiation_vector_file = f"solar_radiation_photovoltaic_area_{province}.shp"
-    solar_radiation_photovoltaic_area(base_output_path=BASE_OUTPUT_PATH, photovoltaic_area_path=photovoltaic_area_path,
-                                      province=province, output_file_name=solar_radiation_vector_file)
-
-
-# Iterate through all provinces and process data
-for key, (province, number) in PROVINCES.items():
-    process_province_data(key, province, number)
+    monthly_rasters = [f"{input_folder}/map_{month}.tif" for month in MONTHS]
+
+    # 3. Monthly solar radiation of every photovoltaic area (area-weighted mean, one pass over the 12 rasters)
+    photovoltaic_area_path = geopackage_layer(f"D:/GEOWORLDLOOK/OZE/PILOT/Step_1_Photovoltaic_farm/{province}.gpkg", "photovoltaic_area")
+    solar_radiation_vector_file = geopackage_layer(f"{province}.gpkg", "solar_radiation_photovoltaic_area")
+    monthly_zonal_statistics(base_output_path=BASE_OUTPUT_PATH, site_layer=photovoltaic_area_path, raster_paths=monthly_rasters,
+                             months=MONTHS, output_file_name=solar_radiation_vector_file, window_mask=output_buffer)
+
+
+if __name__ == "__main__":
+    # Iterate through all provinces and process data
+    for key, (province, number) in PROVINCES.items():
+        process_province_data(key, province, number)
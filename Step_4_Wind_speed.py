@@ -1,11 +1,62 @@
 import sys
 import os
-import processing
-from Renewable_energy_optimum_location_function import create_directory_if_not_exists, buffer, process_sunlight_data, process_tif_files, wind_speed_farm_area
+from Renewable_energy_optimum_location_function import create_directory_if_not_exists, monthly_zonal_statistics, \
+    enable_step_cache, geopackage_layer, enable_trace, traced_province, enable_artifact_store, mask_buffer_artifact, \
+    enable_window_index, enable_raster_memmap, enable_progress
 
 sys.path.append('D:/GEOWORLDLOOK/OZE/Renewable_energy_optimum_location')
 
-def process_wind_speed_for_province(province_code, province_name, mask_number, base_input_path, base_output_path, months, distance=1):
+BASE_INPUT_PATH = "D:/GEOWORLDLOOK/OZE/PILOT/Data"
+BASE_OUTPUT_PATH = "D:/GEOWORLDLOOK/OZE/PILOT/Step_4_wind_speed_vector/wind_speed_vector"
+
+# Reuse unchanged steps (clipping, polygonize, ...) when the script is rerun
+enable_step_cache(os.path.join(BASE_OUTPUT_PATH, "STEP_CACHE"))
+
+# Per-step timing, memory, I/O and feature counts (JSON lines in TRACE/)
+enable_trace(os.path.join(BASE_OUTPUT_PATH, "TRACE"))
+
+# Buffered masks shared with Step 3
+enable_artifact_store("D:/GEOWORLDLOOK/OZE/PILOT/ARTIFACTS")
+
+# Province windows of the national rasters, computed once and shared with Step 3
+enable_window_index("D:/GEOWORLDLOOK/OZE/PILOT/ARTIFACTS/province_windows.json")
+
+# National monthly rasters mapped once (memory-mapped sidecar shared by the workers), read by province window
+enable_raster_memmap("D:/GEOWORLDLOOK/OZE/PILOT/ARTIFACTS/RASTER_MEMMAP")
+
+MONTHS = [
+    "january", "february", "march", "april",
+    "may", "june", "july", "august",
+    "september", "october", "november", "december"
+]
+
+PROVINCES = {
+    "02": ("dolnoslaskie", "337"),
+    "04": ("kujawsko_pomorskie", "994"),
+    "06": ("lubelskie", "3700"),
+    "08": ("lubuskie", "333"),
+    "10": ("lodzkie", "340"),
+    "12": ("malopolskie", "283"),
+    "14": ("mazowieckie", "330"),
+    "16": ("opolskie", "1833"),
+    "18": ("podkarpackie", "332"),
+    "20": ("podlaskie", "335"),
+    "22": ("pomorskie", "336"),
+    "24": ("slaskie", "238"),
+    "26": ("swietokrzyskie", "370"),
+    "28": ("warminsko_mazurskie", "341"),
+    "30": ("wielkopolskie", "308"),
+    "32": ("zachodniopomorskie", "339")
+}
+
+# Progress and ETA of every province (learned from earlier runs); creating the STOP file cancels the run cleanly
+enable_progress(total_provinces=len(PROVINCES), history_path=os.path.join(BASE_OUTPUT_PATH, "PROGRESS.json"),
+                stop_file=os.path.join(BASE_OUTPUT_PATH, "STOP"))
+
+
+@traced_province
+def process_wind_speed_for_province(province_code, province_name, mask_number, base_input_path=BASE_INPUT_PATH,
+                                    base_output_path=BASE_OUTPUT_PATH, months=MONTHS, distance=1):
     """
     Process wind speed data for a given province.
 
@@ -13,74 +64,37 @@ def process_wind_speed_for_province(province_code, province_name, mask_number, b
         province_code (str): The code of the province.
         province_name (str): The name of the province.
         mask_number (str): The identifier number for the province mask.
-        base_input_path (str): The base path where input data is located.
-        base_output_path (str): The base path where output data will be saved.
-        months (list): List of months to process wind speed data for.
+        base_input_path (str, optional): The base path where input data is located. Defaults to BASE_INPUT_PATH.
+        base_output_path (str, optional): The base path where output data will be saved. Defaults to BASE_OUTPUT_PATH.
+        months (list, optional): List of months to process wind speed data for. Defaults to MONTHS.
         distance (int, optional): Buffer distance. Defaults to 1.
 
     Returns:
         None
     """
-    # Create buffer for shape to cut
+    # Create buffer for shape to cut (shared artifact, built once by Step 3 or Step 4)
     mask_shapefile = os.path.join(base_input_path, f"MASK_TO_CUT/{province_name}.shp")
-    buffer_output_directory = os.path.join(base_output_path, "MASK_TO_CUT_BUFFER")
-    create_directory_if_not_exists(buffer_output_directory)
+    buffer_output_file = mask_buffer_artifact(province_name, mask_shapefile, distance)
 
-    buffer_output_file = os.path.join(buffer_output_directory, f"{province_name}_BUFFER.shp")
-    buffer(base_output_path=base_output_path, input_path=mask_shapefile, output_file=buffer_output_file, distance=distance)
-
-    # Define input and output folders for wind speed data
+    # Define input and output paths for wind speed data
     wind_input_folder = os.path.join(base_input_path, "MEAN_WIND_SPEED")
-    wind_output_folder = os.path.join(base_output_path, "CLIP_WIND_SPEED")
-    create_directory_if_not_exists(wind_output_folder)
-
-    # Process wind speed data for each month
-    process_sunlight_data(months=months, input_folder=wind_input_folder, output_folder=wind_output_folder, mask_shapefile=buffer_output_file)
 
-    # Convert wind speed raster data to vector format
-    wind_speed_vector_output = f"wind_speed_vector_{province_name}"
-    process_tif_files(base_input_path=wind_output_folder, base_output_path=base_output_path,
-                      output_file_name=wind_speed_vector_output, field_name="Wind_speed", months=months)
+    # National wind speed rasters of all months, read only in the window of the province buffer (no clipping,
+    # the wind farm areas are overlaid below)
+    wind_monthly_rasters = [f"{wind_input_folder}/map_{month}.tif" for month in months]
 
-    # Combine wind speed data with wind farm area for the province
-    wind_farm_area_path = os.path.join(base_input_path, f"Step_2_Wind_Farm/windfarm_area_{province_name}.shp")
-    wind_speed_vector_file = f"wind_speed_wind_farm_{province_name}.shp"
-    wind_speed_farm_area(base_output_path=base_output_path, wind_area_path=wind_farm_area_path, province=province_name,
-                         output_file_name=wind_speed_vector_file)
+    # Combine monthly wind speed with the wind farm areas (area-weighted mean, one pass over the 12 rasters)
+    wind_farm_area_path = geopackage_layer(os.path.join(base_input_path, f"Step_2_Wind_Farm/{province_name}.gpkg"), "windfarm_area")
+    wind_speed_vector_file = geopackage_layer(f"{province_name}.gpkg", "wind_speed_wind_farm")
+    monthly_zonal_statistics(base_output_path=base_output_path, site_layer=wind_farm_area_path, raster_paths=wind_monthly_rasters,
+                             months=months, output_file_name=wind_speed_vector_file, window_mask=buffer_output_file)
 
 
 def main():
-    base_input_path = "D:/GEOWORLDLOOK/OZE/PILOT/Data"
-    base_output_path = "D:/GEOWORLDLOOK/OZE/PILOT/Step_4_wind_speed_vector/wind_speed_vector"
-    create_directory_if_not_exists(base_output_path)
-
-    months = [
-        "january", "february", "march", "april",
-        "may", "june", "july", "august",
-        "september", "october", "november", "december"
-    ]
-
-    provinces = {
-        "02": ("dolnoslaskie", "337"),
-        "04": ("kujawsko_pomorskie", "994"),
-        "06": ("lubelskie", "3700"),
-        "08": ("lubuskie", "333"),
-        "10": ("lodzkie", "340"),
-        "12": ("malopolskie", "283"),
-        "14": ("mazowieckie", "330"),
-        "16": ("opolskie", "1833"),
-        "18": ("podkarpackie", "332"),
-        "20": ("podlaskie", "335"),
-        "22": ("pomorskie", "336"),
-        "24": ("slaskie", "238"),
-        "26": ("swietokrzyskie", "370"),
-        "28": ("warminsko_mazurskie", "341"),
-        "30": ("wielkopolskie", "308"),
-        "32": ("zachodniopomorskie", "339")
-    }
-
-    for province_code, (province_name, mask_number) in provinces.items():
-        process_wind_speed_for_province(province_code, province_name, mask_number, base_input_path, base_output_path, months)
+    create_directory_if_not_exists(BASE_OUTPUT_PATH)
+
+    for province_code, (province_name, mask_number) in PROVINCES.items():
+        process_wind_speed_for_province(province_code, province_name, mask_number, BASE_INPUT_PATH, BASE_OUTPUT_PATH, MONTHS)
 
 
 if __name__ == "__main__":
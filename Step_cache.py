@@ -0,0 +1,274 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+
+# Files written next to a shapefile that belong to its content
+SHAPEFILE_SIDECARS = ('.shx', '.dbf', '.prj', '.cpg')
+
+# Read size used for hashing input files
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class StepCache:
+    """
+    Content-hash cache of processing steps.
+
+    A step is keyed on the algorithm id, its parameters and the content hashes of its input files.
+    When the key matches a stored entry, the stored output is restored instead of running the algorithm
+    again. Entries are evicted when they have not been used for max_age_days, and least recently used
+    entries are evicted while the cache is larger than max_bytes.
+
+    Only steps writing their 'OUTPUT' to a file can be cached; steps with in-memory inputs or outputs
+    (TEMPORARY_OUTPUT, memory layers) are always run.
+    """
+
+    def __init__(self, cache_folder, max_bytes=50 * 1024 ** 3, max_age_days=30):
+        """
+        Args:
+            cache_folder (str): Folder where cached outputs are stored.
+            max_bytes (int): Disk budget of the cache in bytes (default: 50 GB).
+            max_age_days (float): Entries not used for this many days are removed (default: 30).
+        """
+        self.cache_folder = cache_folder
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        os.makedirs(cache_folder, exist_ok=True)
+
+        # Hashes of input files, reused while file size and modification time are unchanged
+        self._hash_index_path = os.path.join(cache_folder, "file_hashes.json")
+        self._hash_index = self._read_json(self._hash_index_path, {})
+
+    # Keys
+
+    def key(self, algorithm_id, parameters):
+        """
+        Computes the cache key of a processing step.
+
+        Args:
+            algorithm_id (str): Processing algorithm id (e.g. 'native:buffer').
+            parameters (dict): Parameters passed to processing.run.
+
+        Returns:
+            str or None: Hex digest of the step, or None when the step cannot be cached.
+        """
+        output = parameters.get('OUTPUT')
+        if not isinstance(output, str) or '|' in output or not os.path.splitext(output)[1]:
+            # Only outputs that are whole files can be restored (not layers inside a GeoPackage)
+            return None
+
+        description = {'algorithm': algorithm_id, 'output_format': os.path.splitext(output)[1].lower()}
+        for name in sorted(parameters):
+            if name == 'OUTPUT':
+                continue
+            value = self._describe(parameters[name])
+            if value is None:
+                return None
+            description[name] = value
+
+        encoded = json.dumps(description, sort_keys=True).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _describe(self, value):
+        """Returns a JSON-serializable description of a parameter value, or None if it is not cacheable."""
+        if isinstance(value, (list, tuple)):
+            described = [self._describe(item) for item in value]
+            return None if any(item is None for item in described) else described
+        if isinstance(value, dict):
+            described = {str(k): self._describe(v) for k, v in value.items()}
+            return None if any(item is None for item in described.values()) else described
+        if value is None or isinstance(value, (bool, int, float)):
+            return repr(value)
+        if hasattr(value, 'authid'):
+            # QgsCoordinateReferenceSystem
+            return value.authid() or value.toWkt()
+        if hasattr(value, 'providerType'):
+            # QgsMapLayer: only layers backed by a file can be hashed
+            if value.providerType() in ('memory', 'virtual'):
+                return None
+            # Keep the layer options ('|layername=...', '|subset=...'): layers of one GeoPackage differ only by them
+            subset = value.subsetString() if hasattr(value, 'subsetString') else ''
+            value = value.source()
+            if subset and 'subset=' not in value:
+                value = f"{value}|subset={subset}"
+        if isinstance(value, str):
+            if value.startswith('memory:') or value == 'TEMPORARY_OUTPUT':
+                return None
+            # A layer inside a container (e.g. 'province.gpkg|layername=x') is keyed on the whole file
+            path, _, layer_options = value.partition('|')
+            if os.path.isfile(path):
+                return 'file:' + self.file_hash(path) + ('|' + layer_options if layer_options else '')
+            return value
+        return None
+
+    def file_hash(self, path):
+        """
+        Returns the content hash of a file, including the sidecar files of a shapefile.
+
+        Args:
+            path (str): Path to the file.
+
+        Returns:
+            str: Hex digest of the file content.
+        """
+        digest = hashlib.sha256()
+        for file_path in self._files_of(path, sidecars_only=True):
+            digest.update(os.path.splitext(file_path)[1].lower().encode('utf-8'))
+            digest.update(self._single_file_hash(file_path).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _single_file_hash(self, path):
+        absolute_path = os.path.abspath(path)
+        stat = os.stat(absolute_path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        known = self._hash_index.get(absolute_path)
+        if known is not None and known['signature'] == signature:
+            return known['hash']
+
+        digest = hashlib.sha256()
+        with open(absolute_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+
+        self._hash_index[absolute_path] = {'signature': signature, 'hash': digest.hexdigest()}
+        self._write_json(self._hash_index_path, self._hash_index)
+        return digest.hexdigest()
+
+    # Entries
+
+    def restore(self, key, output_path):
+        """
+        Restores the cached output of a step to output_path.
+
+        The output is not copied again when the files at output_path already hold the cached content.
+
+        Args:
+            key (str): Cache key returned by key().
+            output_path (str): Path where the step would write its output.
+
+        Returns:
+            bool: True if the output was restored, False on a cache miss.
+        """
+        entry_folder = os.path.join(self.cache_folder, key)
+        entry = self._read_json(os.path.join(entry_folder, "entry.json"), None)
+        if entry is None:
+            return False
+
+        try:
+            if not (os.path.isfile(output_path) and self.file_hash(output_path) == entry['output_hash']):
+                os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+                target_stem = os.path.splitext(output_path)[0]
+                for file_name in entry['files']:
+                    suffix = file_name[len(entry['stem']):]
+                    shutil.copy2(os.path.join(entry_folder, file_name), target_stem + suffix)
+        except OSError:
+            # Entry evicted by another process in the meantime
+            return False
+
+        entry['last_used'] = time.time()
+        self._write_json(os.path.join(entry_folder, "entry.json"), entry)
+        return True
+
+    def store(self, key, output_path, algorithm_id=''):
+        """
+        Stores the output of a step under its key and evicts old entries.
+
+        Args:
+            key (str): Cache key returned by key().
+            output_path (str): Path of the output written by the step.
+            algorithm_id (str): Algorithm id, stored for reference.
+
+        Returns:
+            None
+        """
+        entry_folder = os.path.join(self.cache_folder, key)
+        if not isinstance(output_path, str) or not os.path.isfile(output_path) or os.path.isdir(entry_folder):
+            return
+
+        stem = os.path.basename(os.path.splitext(output_path)[0])
+        files = self._files_of(output_path)
+
+        # Copy into a private folder first, so other processes never see a partial entry
+        partial_folder = tempfile.mkdtemp(dir=self.cache_folder, prefix=f"{key}.partial-")
+        for file_path in files:
+            shutil.copy2(file_path, partial_folder)
+
+        entry = {
+            'algorithm': algorithm_id,
+            'stem': stem,
+            'files': [os.path.basename(file_path) for file_path in files],
+            'output_hash': self.file_hash(output_path),
+            'size': sum(os.path.getsize(file_path) for file_path in files),
+            'created': time.time(),
+            'last_used': time.time(),
+        }
+        self._write_json(os.path.join(partial_folder, "entry.json"), entry)
+
+        try:
+            os.rename(partial_folder, entry_folder)
+        except OSError:
+            # Stored by another process at the same time
+            shutil.rmtree(partial_folder, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        """
+        Removes entries older than max_age_days, then least recently used entries until the cache fits max_bytes.
+
+        Returns:
+            int: Number of removed entries.
+        """
+        entries = []
+        for name in os.listdir(self.cache_folder):
+            if '.partial-' in name:
+                continue  # entry being stored
+            entry = self._read_json(os.path.join(self.cache_folder, name, "entry.json"), None)
+            if entry is not None:
+                entries.append((entry['last_used'], entry['size'], name))
+
+        removed = 0
+        oldest_allowed = time.time() - self.max_age_days * 24 * 3600
+        total_size = sum(size for _, size, _ in entries)
+        for last_used, size, name in sorted(entries):
+            if last_used >= oldest_allowed and total_size <= self.max_bytes:
+                break
+            shutil.rmtree(os.path.join(self.cache_folder, name), ignore_errors=True)
+            total_size -= size
+            removed += 1
+
+        if removed:
+            print(f"Step cache: removed {removed} entries, {total_size / 1024 ** 2:.1f} MB in use.")
+        return removed
+
+    # Files
+
+    @staticmethod
+    def _files_of(path, sidecars_only=False):
+        """Returns the file and the files written next to it under the same name (e.g. shapefile sidecars)."""
+        stem, extension = os.path.splitext(path)
+        if sidecars_only:
+            candidates = [stem + sidecar for sidecar in SHAPEFILE_SIDECARS] if extension.lower() == '.shp' else []
+        else:
+            folder = os.path.dirname(path) or '.'
+            prefix = os.path.basename(stem) + '.'
+            candidates = [os.path.join(folder, name) for name in os.listdir(folder) if name.startswith(prefix)]
+        return [path] + sorted(candidate for candidate in candidates if candidate != path and os.path.isfile(candidate))
+
+    @staticmethod
+    def _read_json(path, default):
+        try:
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return default
+
+    @staticmethod
+    def _write_json(path, content):
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            json.dump(content, file)
+        os.replace(temporary_path, path)
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import math
+import os
+import tempfile
+
+
+# Version of the index layout, an index of another version is started again
+INDEX_VERSION = 2
+
+
+def pixel_window(geotransform, columns, rows, box, margin=1):
+    """
+    Returns the pixel window of a raster grid covering a bounding box, with a margin, clamped to the grid.
+
+    Args:
+        geotransform (tuple): GDAL geotransform of the grid (north-up).
+        columns (int): Raster width in pixels.
+        rows (int): Raster height in pixels.
+        box (list): [xmin, ymin, xmax, ymax] in the CRS of the grid.
+        margin (int): Pixels added on every side of the window.
+
+    Returns:
+        list: [x offset, y offset, x size, y size] in pixels, or None when the box does not overlap the grid.
+    """
+    origin_x, pixel_width, _, origin_y, _, pixel_height = geotransform
+    xmin, ymin, xmax, ymax = box
+    first_column = max(math.floor((xmin - origin_x) / pixel_width) - margin, 0)
+    last_column = min(math.ceil((xmax - origin_x) / pixel_width) + margin, columns)
+    first_row = max(math.floor((ymax - origin_y) / pixel_height) - margin, 0)
+    last_row = min(math.ceil((ymin - origin_y) / pixel_height) + margin, rows)
+    if last_column <= first_column or last_row <= first_row:
+        return None
+    return [first_column, first_row, last_column - first_column, last_row - first_row]
+
+
+class WindowIndex:
+    """
+    Persisted index of province bounding boxes and of their pixel windows on raster grids.
+
+    A bounding box is computed once per mask layer (and target CRS), a pixel window once per bounding box
+    and raster grid (geotransform, size and projection). Both are stored in one JSON file and reused by
+    later runs, so raster consumers can read only the window of a province instead of scanning or clipping
+    the whole national raster.
+
+    A mask is identified by its file and layer and validated by a hash of its features, so writing another
+    layer of the same GeoPackage (which changes the file modification time) keeps its entry. When the
+    features change, the entry of the mask is replaced and the windows of its old boxes are removed. Masks
+    that are not file-backed (memory layers, layer handles) are not indexed.
+    """
+
+    def __init__(self, index_path):
+        """
+        Args:
+            index_path (str): Path of the JSON index file.
+        """
+        self.index_path = index_path
+        os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+        self._index = self._read_index()
+
+    def bounding_box(self, mask, projection, compute_box):
+        """
+        Returns the bounding box of a mask in the CRS of a raster grid.
+
+        Args:
+            mask (str or QgsVectorLayer): Mask file, GeoPackage layer ('<path>|layername=<name>') or layer handle.
+            projection (str): WKT of the target CRS.
+            compute_box (callable): Called as compute_box(mask, projection) when the box is not indexed,
+                returns [xmin, ymin, xmax, ymax].
+
+        Returns:
+            list: [xmin, ymin, xmax, ymax] in the target CRS.
+        """
+        identity = self._mask_identity(mask)
+        if identity is None:
+            return list(compute_box(mask, projection))
+
+        path, _, layer_options = mask.partition('|')
+        stat = os.stat(path)
+        file_state = [stat.st_size, stat.st_mtime_ns]
+        entry = self._index['masks'].get(identity)
+        if entry is None or entry['file_state'] != file_state:
+            # The file changed: the boxes are kept only when the features of the mask did not
+            signature = self._feature_signature(path, layer_options)
+            if entry is None or entry['signature'] != signature:
+                entry = {'signature': signature, 'boxes': {}}
+            entry['file_state'] = file_state
+            self._index['masks'][identity] = entry
+            self._save()
+
+        projection_key = self._digest(projection)
+        if projection_key not in entry['boxes']:
+            entry['boxes'][projection_key] = list(compute_box(mask, projection))
+            self._save()
+        return entry['boxes'][projection_key]
+
+    def window(self, raster_path, mask, compute_box, margin=1):
+        """
+        Returns the pixel window of a raster grid covering a mask, with a margin.
+
+        Args:
+            raster_path (str): Any raster on the grid (e.g. a national monthly raster).
+            mask (str or QgsVectorLayer): Mask file, GeoPackage layer or layer handle.
+            compute_box (callable): See bounding_box.
+            margin (int): Pixels added on every side of the window.
+
+        Returns:
+            list: [x offset, y offset, x size, y size] in pixels.
+        """
+        from osgeo import gdal
+
+        dataset = gdal.Open(raster_path)
+        if dataset is None:
+            raise ValueError(f"Cannot open raster: {raster_path}")
+        geotransform, projection = dataset.GetGeoTransform(), dataset.GetProjection()
+        columns, rows = dataset.RasterXSize, dataset.RasterYSize
+        dataset = None
+
+        box = self.bounding_box(mask, projection, compute_box)
+        key = self._digest([box, list(geotransform), columns, rows, projection, margin])
+        if key in self._index['windows']:
+            return self._index['windows'][key]['window']
+
+        window = pixel_window(geotransform, columns, rows, box, margin)
+        if window is None:
+            raise ValueError(f"Mask {mask} does not overlap raster {raster_path}")
+        if self._mask_identity(mask) is not None:
+            self._index['windows'][key] = {'box': box, 'window': window}
+            self._save()
+        return window
+
+    @staticmethod
+    def _mask_identity(mask):
+        """Index key of a file-backed mask (absolute path and layer options), None for other masks."""
+        if not isinstance(mask, str):
+            return None
+        path, _, layer_options = mask.partition('|')
+        if not os.path.isfile(path):
+            return None
+        return json.dumps([os.path.abspath(path), layer_options])
+
+    @staticmethod
+    def _feature_signature(path, layer_options):
+        """Hash of the CRS and the geometries of the mask layer."""
+        from osgeo import ogr
+
+        dataset = ogr.Open(path)
+        if dataset is None:
+            raise ValueError(f"Cannot open mask: {path}")
+        layer_name = layer_options.split('layername=', 1)[1].split('|')[0] if 'layername=' in layer_options else None
+        layer = dataset.GetLayerByName(layer_name) if layer_name else dataset.GetLayer(0)
+        if layer is None:
+            raise ValueError(f"Mask layer {layer_name} not found in {path}")
+
+        digest = hashlib.sha256()
+        spatial_reference = layer.GetSpatialRef()
+        digest.update((spatial_reference.ExportToWkt() if spatial_reference is not None else '').encode('utf-8'))
+        for feature in layer:
+            geometry = feature.GetGeometryRef()
+            if geometry is not None:
+                digest.update(bytes(geometry.ExportToWkb()))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _digest(value):
+        return hashlib.sha256(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _read_index(self):
+        index = self._read_json(self.index_path, None)
+        if not isinstance(index, dict) or index.get('version') != INDEX_VERSION:
+            index = {'version': INDEX_VERSION, 'masks': {}, 'windows': {}}
+        return index
+
+    def _save(self):
+        # Merge with entries added by other processes since the index was read, this process wins for its masks
+        stored = self._read_index()
+        stored['masks'].update(self._index['masks'])
+        stored['windows'].update(self._index['windows'])
+
+        # Drop the windows of boxes no mask uses any more
+        boxes = {json.dumps(box) for entry in stored['masks'].values() for box in entry['boxes'].values()}
+        stored['windows'] = {key: window for key, window in stored['windows'].items() if json.dumps(window['box']) in boxes}
+        self._index = stored
+
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.index_path)), suffix='.tmp')
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            json.dump(stored, file)
+        os.replace(temporary_path, self.index_path)
+
+    @staticmethod
+    def _read_json(path, default):
+        try:
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return default
@@ -0,0 +1,38 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from Parameter_sweep import sweep_thresholds
+
+
+METRICS = {
+    "AREA": np.array([5000.0, 15000.0, 25000.0, 60000.0]),
+    "LINE_DISTANCE": np.array([100.0, 600.0, 400.0, np.inf]),
+    "ROAD_DISTANCE": np.array([50.0, 50.0, 50.0, 50.0]),
+    "BUILDING_DISTANCE": np.array([900.0, 1200.0, 700.0, 2000.0]),
+}
+
+
+def test_sweep_counts_every_combination():
+    grid = {"min_area": [10000, 20000], "max_line_distance": [500, None]}
+    rows = sweep_thresholds(METRICS, grid)
+    results = {(row["min_area"], row["max_line_distance"]): (row["SITES"], row["TOTAL_AREA"]) for row in rows}
+    assert results == {
+        (10000, 500): (1, 25000.0),
+        (10000, None): (3, 100000.0),
+        (20000, 500): (1, 25000.0),
+        (20000, None): (2, 85000.0),
+    }
+
+
+def test_sweep_uses_the_comparison_of_each_threshold():
+    rows = sweep_thresholds(METRICS, {"min_building_distance": [900], "max_road_distance": [50]})
+    # BUILDING_DISTANCE >= 900 keeps three parts, ROAD_DISTANCE < 50 keeps none
+    assert rows == [{"min_building_distance": 900, "max_road_distance": 50, "SITES": 0, "TOTAL_AREA": 0.0}]
+    rows = sweep_thresholds(METRICS, {"min_building_distance": [900]})
+    assert rows[0]["SITES"] == 3
+
+
+def test_missing_distances_never_pass_a_maximum():
+    rows = sweep_thresholds(METRICS, {"max_line_distance": [10 ** 9]})
+    assert rows[0]["SITES"] == 3
@@ -0,0 +1,107 @@
+import json
+import os
+
+import pytest
+
+from Pipeline_scheduler import Task, TaskResult, run_dag, topological_order
+
+
+calls = []
+
+
+def record(name, *values):
+    calls.append(name)
+    return f"{name}({', '.join(str(value) for value in values)})"
+
+
+def write_file(text, output_path):
+    calls.append(os.path.basename(output_path))
+    with open(output_path, 'w', encoding='utf-8') as file:
+        file.write(text)
+    return output_path
+
+
+def fail():
+    raise ValueError("failed on purpose")
+
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+
+def test_topological_order_puts_dependencies_first():
+    tasks = {task.name: task for task in [
+        Task("c", record, args=("c", TaskResult("a"), TaskResult("b"))),
+        Task("b", record, args=("b", TaskResult("a"))),
+        Task("a", record, args=("a",)),
+    ]}
+    order = topological_order(tasks)
+    assert order.index("a") < order.index("b") < order.index("c")
+
+
+def test_topological_order_rejects_unknown_dependencies_and_cycles():
+    with pytest.raises(ValueError, match="unknown"):
+        topological_order({"a": Task("a", record, after=["missing"])})
+    with pytest.raises(ValueError, match="cycle"):
+        topological_order({"a": Task("a", record, after=["b"]), "b": Task("b", record, after=["a"])})
+
+
+def test_run_dag_passes_results_and_blocks_dependents_of_failed_tasks():
+    tasks = [
+        Task("a", record, args=("a", 1)),
+        Task("b", record, args=("b", TaskResult("a"))),
+        Task("broken", fail),
+        Task("blocked", record, args=("blocked", TaskResult("broken"))),
+    ]
+    failed = run_dag(tasks, max_cores=2)
+    assert list(failed) == ["broken"]
+    assert "blocked" not in calls
+    assert sorted(calls) == ["a", "b"]
+
+
+def test_run_dag_resumes_persisted_tasks_and_reruns_changed_inputs(tmp_path):
+    source = tmp_path / "source.txt"
+    source.write_text("v1")
+    state_path = str(tmp_path / "state.json")
+
+    def tasks():
+        return [
+            Task("copy", write_file, args=("copy",), kwargs={'output_path': str(tmp_path / "copy.txt")}),
+            Task("derived", write_file, args=(TaskResult("copy"),), kwargs={'output_path': str(tmp_path / "derived.txt")}),
+            Task("from_source", record, args=("from_source", str(source))),
+        ]
+
+    assert run_dag(tasks(), state_path=state_path) == {}
+    assert sorted(calls) == ["copy.txt", "derived.txt", "from_source"]
+
+    # Persisted results with unchanged signatures are skipped (writing an output does not change a signature)
+    calls.clear()
+    run_dag(tasks(), state_path=state_path)
+    assert calls == []
+
+    # A changed input file gives the task a new signature
+    calls.clear()
+    source.write_text("v2, longer")
+    run_dag(tasks(), state_path=state_path)
+    assert calls == ["from_source"]
+
+    # A deleted output is produced again; its dependents are kept, its signature did not change
+    calls.clear()
+    os.remove(tmp_path / "copy.txt")
+    run_dag(tasks(), state_path=state_path)
+    assert calls == ["copy.txt"]
+
+    with open(state_path, encoding='utf-8') as file:
+        state = json.load(file)
+    assert all(entry['status'] == 'done' and entry['signature'] for entry in state.values())
+
+
+def test_run_dag_removes_the_state_after_success_without_keep_state(tmp_path):
+    state_path = tmp_path / "state.json"
+    run_dag([Task("a", write_file, args=("a",), kwargs={'output_path': str(tmp_path / "a.txt")})], state_path=str(state_path),
+            keep_state=False)
+    assert not state_path.exists()
+
+    run_dag([Task("broken", fail)], state_path=str(state_path), keep_state=False)
+    assert state_path.exists()
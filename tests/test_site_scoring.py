@@ -0,0 +1,26 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pa = pytest.importorskip("pyarrow")
+
+from Site_scoring import score_sites, top_k
+
+
+def test_top_k_overall_is_sorted_best_first():
+    scores = np.array([0.2, 0.9, 0.5, 0.7, 0.1])
+    assert top_k(scores, 3).tolist() == [1, 3, 2]
+    assert top_k(scores, 10).tolist() == [1, 3, 2, 0, 4]
+
+
+def test_top_k_per_group_keeps_k_best_of_every_group():
+    scores = np.array([0.2, 0.9, 0.5, 0.7, 0.1, 0.8])
+    groups = np.array(["b", "a", "b", "a", "a", "b"])
+    assert top_k(scores, 2, groups).tolist() == [1, 3, 5, 2]
+    assert top_k(scores, 1, groups).tolist() == [1, 5]
+
+
+def test_score_sites_normalizes_criteria_and_ignores_missing_values():
+    table = pa.table({'AREA': [10.0, 20.0, 30.0], 'LINE_DISTANCE': [100.0, None, 300.0]})
+    scores = score_sites(table, {'AREA': (1, 'max'), 'LINE_DISTANCE': (1, 'min')})
+    # AREA normalized to 0, 0.5, 1; LINE_DISTANCE reversed to 1, missing (0), 0
+    assert scores.tolist() == pytest.approx([0.5, 0.25, 0.5])
@@ -0,0 +1,105 @@
+import json
+import os
+import time
+
+from Step_cache import StepCache
+
+
+def write(path, text):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(text)
+    return str(path)
+
+
+def test_key_depends_on_input_content_and_parameters(tmp_path):
+    cache = StepCache(str(tmp_path / "cache"))
+    source = write(tmp_path / "input.csv", "a")
+    parameters = {'INPUT': source, 'DISTANCE': 10, 'OUTPUT': str(tmp_path / "out.shp")}
+
+    key = cache.key('native:buffer', parameters)
+    assert key == cache.key('native:buffer', dict(parameters))
+    assert key != cache.key('native:buffer', dict(parameters, DISTANCE=20))
+    assert key != cache.key('native:dissolve', parameters)
+
+    write(tmp_path / "input.csv", "changed")
+    assert key != cache.key('native:buffer', parameters)
+
+
+def test_key_is_none_for_uncacheable_steps(tmp_path):
+    cache = StepCache(str(tmp_path / "cache"))
+    assert cache.key('native:buffer', {'INPUT': 'x.shp', 'OUTPUT': 'TEMPORARY_OUTPUT'}) is None
+    assert cache.key('native:buffer', {'INPUT': 'x.shp', 'OUTPUT': 'province.gpkg|layername=x'}) is None
+    assert cache.key('native:buffer', {'INPUT': 'memory:layer', 'OUTPUT': str(tmp_path / "out.shp")}) is None
+
+
+def test_store_and_restore_with_shapefile_sidecars(tmp_path):
+    cache = StepCache(str(tmp_path / "cache"))
+    output = write(tmp_path / "out.shp", "geometry")
+    write(tmp_path / "out.dbf", "attributes")
+    key = cache.key('native:buffer', {'INPUT': 'x', 'OUTPUT': output})
+    cache.store(key, output, 'native:buffer')
+
+    assert not cache.restore("unknown", str(tmp_path / "other.shp"))
+
+    restored = str(tmp_path / "restored" / "copy.shp")
+    assert cache.restore(key, restored)
+    with open(restored, encoding='utf-8') as file:
+        assert file.read() == "geometry"
+    with open(os.path.splitext(restored)[0] + ".dbf", encoding='utf-8') as file:
+        assert file.read() == "attributes"
+    assert not any('.partial-' in name for name in os.listdir(cache.cache_folder))
+
+
+def test_evict_removes_old_then_least_recently_used_entries(tmp_path):
+    cache = StepCache(str(tmp_path / "cache"), max_bytes=25, max_age_days=1)
+    keys = []
+    for number in range(4):
+        output = write(tmp_path / f"out{number}.tif", "0123456789")
+        keys.append(cache.key('gdal:translate', {'INPUT': str(number), 'OUTPUT': output}))
+        cache.store(keys[-1], output)
+
+    # Stored entries: the budget keeps the two most recently stored ones
+    assert sorted(name for name in os.listdir(cache.cache_folder) if name in keys) == sorted(keys[2:])
+
+    # An entry unused for longer than max_age_days is removed whatever the budget
+    entry_path = os.path.join(cache.cache_folder, keys[2], "entry.json")
+    with open(entry_path, encoding='utf-8') as file:
+        entry = json.load(file)
+    entry['last_used'] = time.time() - 2 * 24 * 3600
+    with open(entry_path, 'w', encoding='utf-8') as file:
+        json.dump(entry, file)
+    assert cache.evict() == 1
+    assert os.path.isdir(os.path.join(cache.cache_folder, keys[3]))
+    assert not os.path.exists(os.path.join(cache.cache_folder, keys[2]))
+
+
+class FileLayer:
+    """Stand-in of a file-backed QgsVectorLayer."""
+
+    def __init__(self, source, subset=''):
+        self._source = source
+        self._subset = subset
+
+    def providerType(self):
+        return 'ogr'
+
+    def source(self):
+        return self._source
+
+    def subsetString(self):
+        return self._subset
+
+
+def test_key_of_layer_objects_keeps_the_layer_name_and_subset(tmp_path):
+    cache = StepCache(str(tmp_path / "cache"))
+    geopackage = write(tmp_path / "province.gpkg", "layers")
+    output = str(tmp_path / "out.shp")
+
+    def key_of(layer):
+        return cache.key('native:buffer', {'INPUT': layer, 'OUTPUT': output})
+
+    layer_a = key_of(FileLayer(f"{geopackage}|layername=a"))
+    assert layer_a != key_of(FileLayer(f"{geopackage}|layername=b"))
+    assert layer_a != key_of(FileLayer(f"{geopackage}|layername=a", subset='"ID" > 5'))
+    # A layer object and its source string are the same input
+    assert layer_a == key_of(f"{geopackage}|layername=a")
@@ -0,0 +1,31 @@
+from Window_index import WindowIndex, pixel_window
+
+
+# 10 m pixels, 100 x 100 grid with its top-left corner at (0, 1000)
+GEOTRANSFORM = (0.0, 10.0, 0.0, 1000.0, 0.0, -10.0)
+
+
+def test_pixel_window_covers_the_box_with_a_margin():
+    assert pixel_window(GEOTRANSFORM, 100, 100, [100, 500, 200, 600], margin=0) == [10, 40, 10, 10]
+    assert pixel_window(GEOTRANSFORM, 100, 100, [100, 500, 200, 600]) == [9, 39, 12, 12]
+    # Partial pixels are included
+    assert pixel_window(GEOTRANSFORM, 100, 100, [105, 505, 195, 595], margin=0) == [10, 40, 10, 10]
+
+
+def test_pixel_window_is_clamped_to_the_grid():
+    assert pixel_window(GEOTRANSFORM, 100, 100, [-50, 950, 30, 1100]) == [0, 0, 4, 6]
+    assert pixel_window(GEOTRANSFORM, 100, 100, [2000, 0, 3000, 10]) is None
+
+
+def test_masks_that_are_not_files_are_computed_every_time(tmp_path):
+    index = WindowIndex(str(tmp_path / "windows.json"))
+    calls = []
+
+    def compute_box(mask, projection):
+        calls.append(mask)
+        return [0, 0, 10, 10]
+
+    assert index.bounding_box("memory?geometry=Polygon", "WKT", compute_box) == [0, 0, 10, 10]
+    assert index.bounding_box("memory?geometry=Polygon", "WKT", compute_box) == [0, 0, 10, 10]
+    assert len(calls) == 2
+    assert index._index['masks'] == {}